@@ -1,19 +1,40 @@
 import os
 from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
 
+from cache import cache_key_builder, get_invalidated, get_write_tags
+from cache.coalescing import CoalescingMiddleware, CoalescingStore
+from cache.etag import ETagMiddleware
+from cache.memory import TaggedMemoryStore
+from cache.sqlite import TaggedSQLiteStore
 from controllers import (
     BrowseController,
     DataController,
     MiscController,
+    RunsController,
     SearchController,
 )
 from db import CONFIG
+from db.snapshots import COUNT_POOL
+from ingest.jobs import IngestJobRunner
 from litestar import Litestar, Request, get
 from litestar.config.response_cache import ResponseCacheConfig
 from litestar.contrib.sqlalchemy.plugins import SQLAlchemyInitPlugin
-from litestar.stores.memory import MemoryStore
+from litestar.datastructures import State
+from llm import create_client
+from llm.registry import ModelRegistry
+from llm.summaries import SummaryJobRunner
+from runs.comparison import ComparisonPool
 
-CACHE_STORE = MemoryStore()
+if TYPE_CHECKING:
+    from db.schema import ORMIngestJob
+
+# the sqlite store is shared by all workers on a host
+CACHE_STORE = CoalescingStore(
+    TaggedSQLiteStore()
+    if os.environ.get("CACHE_BACKEND", "memory") == "sqlite"
+    else TaggedMemoryStore()
+)
 CACHE_EXPIRATION_DURATION = int(os.environ["CACHE_EXPIRATION_DURATION"])
 CACHE_DELETE_EXPIRED_INTERVAL = int(os.environ["CACHE_DELETE_EXPIRED_INTERVAL"])
 
@@ -22,18 +43,20 @@ async def after_response(request: Request) -> None:
     """After-response hook.
 
     Remove expired items from the cache in a set interval.
-    Invalidate the entire cache if data was added or removed in the request.
+    Invalidate the cached responses that depend on the corpus or dataset if the route
+    handler modifies data (see `get_invalidated`).
 
     :param request: The request.
     """
-    route_name = str(request.route_handler).split(".")[-1]
-    if (
-        route_name.startswith("create")
-        or route_name.startswith("add")
-        or route_name.startswith("remove")
-    ):
-        request.logger.info("clearing all items from cache")
-        await CACHE_STORE.delete_all()
+    invalidated = get_invalidated(request)
+    if invalidated is not None:
+        corpus_name, dataset_name = invalidated
+        if corpus_name is None:
+            request.logger.info("clearing all items from cache")
+            await CACHE_STORE.delete_all()
+        else:
+            request.logger.info("clearing items of corpus %s from cache", corpus_name)
+            await CACHE_STORE.delete_tags(get_write_tags(corpus_name, dataset_name))
         return
 
     now = datetime.now()
@@ -45,6 +68,50 @@ async def after_response(request: Request) -> None:
         request.app.state["cache_last_delete_expired"] = now
 
 
+async def after_ingest_batch(job: "ORMIngestJob") -> None:
+    """Ingest job hook.
+
+    Invalidate the cached responses that depend on the corpus or dataset after each
+    batch committed by an ingest job.
+
+    :param job: The ingest job.
+    """
+    await CACHE_STORE.delete_tags(get_write_tags(job.corpus_name, job.dataset_name))
+
+
+INGEST_JOB_RUNNER = IngestJobRunner(on_commit=after_ingest_batch)
+COMPARISON_POOL = ComparisonPool()
+MODEL_REGISTRY = ModelRegistry()
+SUMMARY_JOB_RUNNER = SummaryJobRunner()
+
+
+async def start_llm_services(app: Litestar) -> None:
+    """Startup hook.
+
+    Create the client for the OpenAI API, which is shared by all requests, and start
+    the model registry and the summary job runner.
+
+    :param app: The app.
+    """
+    app.state.openai_client = create_client()
+    await MODEL_REGISTRY.start(app.state.openai_client)
+    await SUMMARY_JOB_RUNNER.start(app.state.openai_client)
+
+
+async def stop_llm_services(app: Litestar) -> None:
+    """Shutdown hook.
+
+    Stop the model registry and the summary job runner and close the connections of
+    the client.
+
+    :param app: The app.
+    """
+    await MODEL_REGISTRY.stop()
+    await SUMMARY_JOB_RUNNER.stop()
+    if app.state.openai_client is not None:
+        await app.state.openai_client.close()
+
+
 @get(path="/ready")
 def ready() -> bool:
     """Perform a simple health check.
@@ -60,15 +127,44 @@ app = Litestar(
         DataController,
         SearchController,
         MiscController,
+        RunsController,
         ready,
     ],
     plugins=[SQLAlchemyInitPlugin(CONFIG)],
-    stores={"cache": CACHE_STORE},
+    # search rankings and QRels arrays are stored without coalescing, but are evicted
+    # with responses
+    stores={
+        "cache": CACHE_STORE,
+        "rankings": CACHE_STORE.store,
+        "qrels": CACHE_STORE.store,
+    },
     # configure caching for successful responses
     response_cache_config=ResponseCacheConfig(
         default_expiration=CACHE_EXPIRATION_DURATION,
         cache_response_filter=lambda _, status_code: 200 <= status_code < 300,
         store="cache",
+        key_builder=cache_key_builder,
     ),
+    middleware=[ETagMiddleware(CACHE_STORE), CoalescingMiddleware(CACHE_STORE)],
     after_response=after_response,
+    state=State(
+        {
+            "ingest_job_runner": INGEST_JOB_RUNNER,
+            "comparison_pool": COMPARISON_POOL,
+            "model_registry": MODEL_REGISTRY,
+            "summary_job_runner": SUMMARY_JOB_RUNNER,
+        }
+    ),
+    on_startup=[
+        INGEST_JOB_RUNNER.start,
+        COMPARISON_POOL.start,
+        COUNT_POOL.start,
+        start_llm_services,
+    ],
+    on_shutdown=[
+        INGEST_JOB_RUNNER.stop,
+        COMPARISON_POOL.stop,
+        COUNT_POOL.stop,
+        stop_llm_services,
+    ],
 )
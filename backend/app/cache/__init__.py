@@ -0,0 +1,182 @@
+"""Module for response caching.
+
+Cached responses are tagged with the corpora and datasets they depend on, so that
+writes only evict the affected responses. The tags are encoded in the cache key.
+"""
+
+from abc import abstractmethod
+from typing import TYPE_CHECKING
+
+from litestar.config.response_cache import default_cache_key_builder
+from litestar.stores.base import Store
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from litestar import Request
+    from models import CacheStatistics
+
+GLOBAL_TAG = "global"
+# the option of route handlers that modify a corpus or dataset
+INVALIDATES = "invalidates"
+
+# separators that do not occur in corpus or dataset names
+_TAG_SEPARATOR = "\x1f"
+_KEY_SEPARATOR = "\x1e"
+
+
+def get_corpus_tag(corpus_name: str) -> str:
+    """Return the cache tag of a corpus.
+
+    :param corpus_name: The name of the corpus.
+    :return: The tag.
+    """
+    return f"corpus:{corpus_name}"
+
+
+def get_dataset_tag(corpus_name: str, dataset_name: str) -> str:
+    """Return the cache tag of a dataset.
+
+    :param corpus_name: The name of the corpus the dataset belongs to.
+    :param dataset_name: The name of the dataset.
+    :return: The tag.
+    """
+    return f"dataset:{corpus_name}:{dataset_name}"
+
+
+def get_read_tags(corpus_names: "Iterable[str]", dataset_name: str | None) -> list[str]:
+    """Return the tags of a response, i.e., what the response depends on.
+
+    Responses for a single dataset depend only on that dataset. Responses for one or
+    more corpora depend on those corpora, including the QRels of all their datasets.
+    Anything else depends on all data.
+
+    :param corpus_names: The corpora requested.
+    :param dataset_name: The dataset requested, if any.
+    :return: The tags.
+    """
+    corpus_names = list(corpus_names)
+    if dataset_name is not None and len(corpus_names) == 1:
+        return [get_dataset_tag(corpus_names[0], dataset_name)]
+    if corpus_names:
+        return [get_corpus_tag(corpus_name) for corpus_name in corpus_names]
+    return [GLOBAL_TAG]
+
+
+def get_write_tags(corpus_name: str, dataset_name: str | None) -> list[str]:
+    """Return the tags to evict after a corpus or dataset has been modified.
+
+    :param corpus_name: The modified corpus, or the corpus of the modified dataset.
+    :param dataset_name: The modified dataset, if any.
+    :return: The tags.
+    """
+    tags = [GLOBAL_TAG, get_corpus_tag(corpus_name)]
+    if dataset_name is not None:
+        tags.append(get_dataset_tag(corpus_name, dataset_name))
+    return tags
+
+
+def get_key_tags(key: str) -> list[str]:
+    """Return the tags encoded in a cache key.
+
+    :param key: The cache key.
+    :return: The tags.
+    """
+    tags, _, _ = key.partition(_KEY_SEPARATOR)
+    return tags.split(_TAG_SEPARATOR) if tags else []
+
+
+def build_key(tags: "Iterable[str]", key: str) -> str:
+    """Build a cache key that includes the tags of its value.
+
+    :param tags: The tags of the value.
+    :param key: The key, without tags.
+    :return: The cache key.
+    """
+    return _TAG_SEPARATOR.join(tags) + _KEY_SEPARATOR + key
+
+
+def cache_key_builder(request: "Request") -> str:
+    """Build the cache key of a request, including the tags of its response.
+
+    :param request: The request.
+    :return: The cache key.
+    """
+    tags = get_read_tags(
+        request.query_params.getall("corpus_name", []),
+        request.query_params.get("dataset_name"),
+    )
+    return build_key(tags, default_cache_key_builder(request))
+
+
+def set_invalidated(
+    request: "Request", corpus_name: str, dataset_name: str | None = None
+) -> None:
+    """Record the corpus or dataset modified by a request.
+
+    This is only required for handlers that receive the names in the request body,
+    see `get_invalidated`.
+
+    :param request: The request.
+    :param corpus_name: The modified corpus, or the corpus of the modified dataset.
+    :param dataset_name: The modified dataset, if any.
+    """
+    request.state[INVALIDATES] = (corpus_name, dataset_name)
+
+
+def get_invalidated(request: "Request") -> tuple[str | None, str | None] | None:
+    """Return the corpus and dataset modified by a request.
+
+    Only the route handlers with the option `INVALIDATES` modify data. The names are
+    recorded by the handler (see `set_invalidated`) or taken from the `corpus_name`
+    and `dataset_name` query parameters.
+
+    :param request: The request.
+    :return: The corpus (None if unknown) and dataset, or None if nothing has been
+        modified.
+    """
+    if not request.route_handler.opt.get(INVALIDATES, False):
+        return None
+    invalidated = request.state.get(INVALIDATES)
+    if invalidated is not None:
+        return invalidated
+    return (
+        request.query_params.get("corpus_name"),
+        request.query_params.get("dataset_name"),
+    )
+
+
+class TaggedStore(Store):
+    """Store that can delete all values with specific tags.
+
+    The tags of a value are encoded in its key, see `cache_key_builder`.
+    """
+
+    @abstractmethod
+    async def delete_tags(self, tags: "Iterable[str]") -> None:
+        """Delete all values with any of the given tags.
+
+        :param tags: The tags.
+        """
+
+    @abstractmethod
+    async def get_tags_version(self, tags: "Iterable[str]") -> str:
+        """Return the version of the given tags.
+
+        The version changes whenever the values with any of the tags are deleted, i.e.,
+        whenever the data they depend on is modified.
+
+        :param tags: The tags.
+        :return: The version.
+        """
+
+    @abstractmethod
+    async def delete_expired(self) -> None:
+        """Delete expired values."""
+
+    @abstractmethod
+    async def get_statistics(self) -> "CacheStatistics":
+        """Return the current usage and counters.
+
+        :return: The cache statistics.
+        """
@@ -0,0 +1,269 @@
+import asyncio
+import os
+import struct
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from litestar.enums import ScopeType
+from litestar.middleware import ASGIMiddleware
+
+from cache import TaggedStore
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from datetime import timedelta
+
+    from litestar.types import ASGIApp, Message, Receive, Scope, Send
+    from models import CacheStatistics
+
+CACHE_STALE_DURATION = int(os.environ.get("CACHE_STALE_DURATION", "0"))
+CACHE_COALESCE_TIMEOUT = int(os.environ.get("CACHE_COALESCE_TIMEOUT", "60"))
+
+# scope keys defined by the ASGI specification
+_ASGI_SCOPE_KEYS = (
+    "type",
+    "asgi",
+    "http_version",
+    "method",
+    "scheme",
+    "path",
+    "raw_path",
+    "root_path",
+    "query_string",
+    "headers",
+    "client",
+    "server",
+)
+_FRESH_UNTIL = struct.Struct("<d")
+
+
+@dataclass
+class _RequestState:
+    # set for background refreshes, which must not be served from the cache
+    revalidate: bool = False
+    # the key this request computes a response for, other requests wait for it
+    leader_key: str | None = None
+    # the key of a stale response that is refreshed after this request
+    stale_key: str | None = None
+
+
+_REQUEST_STATE: ContextVar[_RequestState | None] = ContextVar(
+    "cache_request_state", default=None
+)
+
+
+class CoalescingStore(TaggedStore):
+    """Store that coalesces concurrent misses of the same key.
+
+    Only the first request that misses computes the response, all other requests for
+    the same key wait for it (up to `CACHE_COALESCE_TIMEOUT` seconds). Optionally,
+    expired values are kept for a while and served while a single background request
+    refreshes them (stale-while-revalidate).
+
+    Requests are only coalesced within a process. `CoalescingMiddleware` is required.
+    """
+
+    def __init__(
+        self, store: TaggedStore, stale_duration: int = CACHE_STALE_DURATION
+    ) -> None:
+        """Wrap a store.
+
+        :param store: The store that holds the values.
+        :param stale_duration: How many seconds expired values may be served while
+            they are refreshed.
+        """
+        self.store = store
+        self.stale_duration = stale_duration
+        self._in_flight: dict[str, asyncio.Event] = {}
+
+    def _acquire(self, key: str) -> bool:
+        if key in self._in_flight:
+            return False
+        self._in_flight[key] = asyncio.Event()
+        return True
+
+    def release(self, key: str) -> None:
+        """Wake up all requests that wait for a key.
+
+        :param key: The key.
+        """
+        event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    async def get(
+        self, key: str, renew_for: "int | timedelta | None" = None
+    ) -> bytes | None:
+        """Get a value, or wait for it if another request is computing it.
+
+        :param key: The key.
+        :param renew_for: Renew the expiry time of the value (if it has one).
+        :return: The value (which may be stale), or None if the request should compute
+            it.
+        """
+        state = _REQUEST_STATE.get()
+        if state is not None and state.revalidate:
+            return None
+
+        value = await self.store.get(key, renew_for)
+        if value is None:
+            event = self._in_flight.get(key)
+            if event is None:
+                if state is not None and self._acquire(key):
+                    state.leader_key = key
+                return None
+            try:
+                await asyncio.wait_for(event.wait(), CACHE_COALESCE_TIMEOUT)
+            except asyncio.TimeoutError:
+                return None
+            # if the response was not cached (e.g., an error), all waiting requests
+            # compute it concurrently instead of one after another
+            value = await self.store.get(key, renew_for)
+            if value is None:
+                return None
+
+        (fresh_until,) = _FRESH_UNTIL.unpack_from(value)
+        if fresh_until < time.time() and state is not None and self._acquire(key):
+            state.stale_key = key
+        return value[_FRESH_UNTIL.size :]
+
+    async def set(
+        self, key: str, value: str | bytes, expires_in: "int | timedelta | None" = None
+    ) -> None:
+        """Set a value and wake up all requests that wait for it.
+
+        Values that expire are kept for the stale duration after they have expired.
+
+        :param key: The key.
+        :param value: The value.
+        :param expires_in: Time in seconds before the value expires.
+        """
+        if isinstance(value, str):
+            value = value.encode()
+        if expires_in is None:
+            fresh_until = float("inf")
+        else:
+            if not isinstance(expires_in, int):
+                expires_in = int(expires_in.total_seconds())
+            fresh_until = time.time() + expires_in
+            expires_in += self.stale_duration
+        await self.store.set(key, _FRESH_UNTIL.pack(fresh_until) + value, expires_in)
+        self.release(key)
+
+    async def delete(self, key: str) -> None:
+        """Delete a value, if it exists.
+
+        :param key: The key.
+        """
+        await self.store.delete(key)
+
+    async def delete_tags(self, tags: "Iterable[str]") -> None:
+        """Delete all values with any of the given tags.
+
+        :param tags: The tags.
+        """
+        await self.store.delete_tags(tags)
+
+    async def get_tags_version(self, tags: "Iterable[str]") -> str:
+        """Return the version of the given tags.
+
+        :param tags: The tags.
+        :return: The version.
+        """
+        return await self.store.get_tags_version(tags)
+
+    async def delete_all(self) -> None:
+        """Delete all values."""
+        await self.store.delete_all()
+
+    async def delete_expired(self) -> None:
+        """Delete values that are expired and no longer served as stale."""
+        await self.store.delete_expired()
+
+    async def exists(self, key: str) -> bool:
+        """Check whether a value exists.
+
+        :param key: The key.
+        :return: Whether the value exists.
+        """
+        return await self.store.exists(key)
+
+    async def expires_in(self, key: str) -> int | None:
+        """Return the time in seconds until a value is removed (including staleness).
+
+        :param key: The key.
+        :return: The time, or None if the value does not exist or does not expire.
+        """
+        return await self.store.expires_in(key)
+
+    async def get_statistics(self) -> "CacheStatistics":
+        """Return the current usage and counters of the wrapped store.
+
+        :return: The cache statistics.
+        """
+        return await self.store.get_statistics()
+
+
+class CoalescingMiddleware(ASGIMiddleware):
+    """Middleware that completes requests for a `CoalescingStore`.
+
+    Once a request has finished, requests waiting for it are woken up (even if its
+    response was not cached). If the request was served a stale response, the response
+    is refreshed in the background.
+    """
+
+    scopes = (ScopeType.HTTP,)
+
+    def __init__(self, store: CoalescingStore) -> None:
+        """Create the middleware.
+
+        :param store: The response cache store.
+        """
+        self.store = store
+        self._refresh_tasks: set[asyncio.Task] = set()
+
+    async def handle(
+        self, scope: "Scope", receive: "Receive", send: "Send", next_app: "ASGIApp"
+    ) -> None:
+        """Handle a request.
+
+        :param scope: The ASGI scope.
+        :param receive: The ASGI receive function.
+        :param send: The ASGI send function.
+        :param next_app: The next ASGI application.
+        """
+        if scope["method"] != "GET":  # pyright: ignore[reportTypedDictNotRequiredAccess]
+            await next_app(scope, receive, send)
+            return
+
+        state = _REQUEST_STATE.get() or _RequestState()
+        token = _REQUEST_STATE.set(state)
+        try:
+            await next_app(scope, receive, send)
+        finally:
+            _REQUEST_STATE.reset(token)
+            if state.leader_key is not None:
+                self.store.release(state.leader_key)
+
+        if state.stale_key is not None:
+            task = asyncio.create_task(self._refresh(scope, state.stale_key))
+            self._refresh_tasks.add(task)
+            task.add_done_callback(self._refresh_tasks.discard)
+
+    async def _refresh(self, scope: "Scope", key: str) -> None:
+        async def receive() -> "Message":
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(_: "Message") -> None:
+            pass
+
+        # run the entire app again for a copy of the request, which is not served from
+        # the cache, so that the response cache stores the fresh response
+        _REQUEST_STATE.set(_RequestState(revalidate=True))
+        refresh_scope = {k: scope[k] for k in _ASGI_SCOPE_KEYS if k in scope}
+        try:
+            await scope["app"](refresh_scope, receive, send)  # pyright: ignore[reportArgumentType]
+        finally:
+            self.store.release(key)
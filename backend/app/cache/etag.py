@@ -0,0 +1,97 @@
+import hashlib
+from typing import TYPE_CHECKING
+
+from litestar import Request
+from litestar.enums import MediaType, ScopeType
+from litestar.middleware import ASGIMiddleware
+from litestar.status_codes import HTTP_200_OK, HTTP_304_NOT_MODIFIED
+
+from cache import cache_key_builder, get_key_tags
+
+if TYPE_CHECKING:
+    from litestar.types import ASGIApp, Message, Receive, Scope, Send
+
+    from cache import TaggedStore
+
+
+def _parse_if_none_match(value: str) -> set[str]:
+    # weak and strong validators are compared in the same way
+    return {tag.strip().removeprefix("W/") for tag in value.split(",")}
+
+
+class ETagMiddleware(ASGIMiddleware):
+    """Middleware for conditional requests of cached GET endpoints that return JSON.
+
+    The ETag of a response is derived from the request and the current versions of its
+    cache tags, which change whenever the corresponding data is modified. Requests with
+    a matching `If-None-Match` header are answered with 304 Not Modified before the
+    handler is called. Streamed responses (server-sent events) are excluded, as clients
+    of event streams do not revalidate them.
+
+    The tag versions must be shared by all workers (i.e., the `sqlite` cache backend
+    with more than one worker), otherwise workers answer with 304 for data that
+    another worker has modified.
+    """
+
+    scopes = (ScopeType.HTTP,)
+
+    def __init__(self, store: "TaggedStore") -> None:
+        """Create the middleware.
+
+        :param store: The response cache store that keeps the tag versions.
+        """
+        self.store = store
+
+    def should_bypass_for_scope(self, scope: "Scope") -> bool:
+        """Skip requests that are not cached or do not return JSON.
+
+        :param scope: The ASGI scope.
+        :return: Whether to skip the request.
+        """
+        route_handler = scope["route_handler"]  # pyright: ignore[reportTypedDictNotRequiredAccess]
+        return (
+            scope["method"] != "GET"  # pyright: ignore[reportTypedDictNotRequiredAccess]
+            or not route_handler.cache  # pyright: ignore[reportAttributeAccessIssue]
+            or route_handler.media_type != MediaType.JSON  # pyright: ignore[reportAttributeAccessIssue]
+        )
+
+    async def handle(
+        self, scope: "Scope", receive: "Receive", send: "Send", next_app: "ASGIApp"
+    ) -> None:
+        """Handle a request.
+
+        :param scope: The ASGI scope.
+        :param receive: The ASGI receive function.
+        :param send: The ASGI send function.
+        :param next_app: The next ASGI application.
+        """
+        request = Request(scope)
+        key = cache_key_builder(request)
+        version = await self.store.get_tags_version(get_key_tags(key))
+        digest = hashlib.blake2b(f"{version}\n{key}".encode(), digest_size=16)
+        etag = f'"{digest.hexdigest()}"'
+        headers = [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and (
+            if_none_match.strip() == "*" or etag in _parse_if_none_match(if_none_match)
+        ):
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": HTTP_304_NOT_MODIFIED,
+                    "headers": headers,
+                }
+            )
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        async def send_with_etag(message: "Message") -> None:
+            if (
+                message["type"] == "http.response.start"
+                and message["status"] == HTTP_200_OK
+            ):
+                message["headers"] = [*message.get("headers", []), *headers]
+            await send(message)
+
+        await next_app(scope, receive, send_with_etag)
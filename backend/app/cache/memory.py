@@ -0,0 +1,188 @@
+import os
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+import anyio
+from litestar.stores.base import StorageObject
+from models import CacheStatistics
+
+from cache import TaggedStore, get_key_tags
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from datetime import timedelta
+
+CACHE_MAX_SIZE = int(os.environ.get("CACHE_MAX_SIZE", str(256 * 1024 * 1024)))
+
+
+class TaggedMemoryStore(TaggedStore):
+    """In-memory store with a size limit that can delete all values with specific tags.
+
+    The size of an entry is the size of its key and value. When the size limit is
+    exceeded, the least recently used entries are evicted.
+
+    The entries and tag versions belong to a single process. With multiple workers, a
+    modification handled by one worker neither evicts the entries nor changes the
+    ETags (see `ETagMiddleware`) of the others, use `TaggedSQLiteStore` instead.
+    """
+
+    def __init__(self, max_size: int = CACHE_MAX_SIZE) -> None:
+        """Create an empty store.
+
+        :param max_size: The maximum total size of all entries in bytes.
+        """
+        self.max_size = max_size
+        self._store: OrderedDict[str, StorageObject] = OrderedDict()
+        self._keys_by_tag: dict[str, set[str]] = {}
+        self._tag_versions: dict[str, int] = {}
+        self._epoch = uuid.uuid4().hex
+        self._size = 0
+        self._lock = anyio.Lock()
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+
+    @staticmethod
+    def _get_entry_size(key: str, storage_obj: StorageObject) -> int:
+        return len(key.encode()) + len(storage_obj.data)
+
+    def _insert(self, key: str, storage_obj: StorageObject) -> None:
+        self._remove(key)
+        self._store[key] = storage_obj
+        self._size += self._get_entry_size(key, storage_obj)
+        for tag in get_key_tags(key):
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+
+    def _remove(self, key: str) -> None:
+        storage_obj = self._store.pop(key, None)
+        if storage_obj is None:
+            return
+        self._size -= self._get_entry_size(key, storage_obj)
+        for tag in get_key_tags(key):
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    async def set(
+        self, key: str, value: str | bytes, expires_in: "int | timedelta | None" = None
+    ) -> None:
+        """Set a value and evict the least recently used entries if necessary.
+
+        Values that exceed the size limit by themselves are not stored.
+
+        :param key: The key, see `cache_key_builder`.
+        :param value: The value.
+        :param expires_in: Time in seconds before the value expires.
+        """
+        if isinstance(value, str):
+            value = value.encode()
+        storage_obj = StorageObject.new(data=value, expires_in=expires_in)
+        async with self._lock:
+            if self._get_entry_size(key, storage_obj) > self.max_size:
+                self._remove(key)
+                return
+            self._insert(key, storage_obj)
+            while self._size > self.max_size:
+                self._remove(next(iter(self._store)))
+                self.num_evictions += 1
+
+    async def get(
+        self, key: str, renew_for: "int | timedelta | None" = None
+    ) -> bytes | None:
+        """Get a value and mark it as recently used.
+
+        :param key: The key.
+        :param renew_for: Renew the expiry time of the value (if it has one).
+        :return: The value, or None if it does not exist or has expired.
+        """
+        async with self._lock:
+            storage_obj = self._store.get(key)
+            if storage_obj is None or storage_obj.expired:
+                self._remove(key)
+                self.num_misses += 1
+                return None
+
+            if renew_for and storage_obj.expires_at:
+                storage_obj = StorageObject.new(
+                    data=storage_obj.data, expires_in=renew_for
+                )
+                self._store[key] = storage_obj
+            self._store.move_to_end(key)
+            self.num_hits += 1
+            return storage_obj.data
+
+    async def delete(self, key: str) -> None:
+        """Delete a value, if it exists.
+
+        :param key: The key.
+        """
+        async with self._lock:
+            self._remove(key)
+
+    async def delete_tags(self, tags: "Iterable[str]") -> None:
+        """Delete all values with any of the given tags and increment their versions.
+
+        :param tags: The tags.
+        """
+        async with self._lock:
+            for tag in tags:
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._remove(key)
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+
+    async def get_tags_version(self, tags: "Iterable[str]") -> str:
+        """Return the version of the given tags in this process.
+
+        :param tags: The tags.
+        :return: The version.
+        """
+        versions = (str(self._tag_versions.get(tag, 0)) for tag in tags)
+        return f"{self._epoch}:{','.join(versions)}"
+
+    async def delete_all(self) -> None:
+        """Delete all values and change the versions of all tags."""
+        async with self._lock:
+            self._store.clear()
+            self._keys_by_tag.clear()
+            self._size = 0
+            self._epoch = uuid.uuid4().hex
+
+    async def delete_expired(self) -> None:
+        """Delete expired values."""
+        async with self._lock:
+            for key in [key for key, obj in self._store.items() if obj.expired]:
+                self._remove(key)
+
+    async def exists(self, key: str) -> bool:
+        """Check whether a value exists.
+
+        :param key: The key.
+        :return: Whether the value exists.
+        """
+        return key in self._store
+
+    async def expires_in(self, key: str) -> int | None:
+        """Return the time in seconds until a value expires.
+
+        :param key: The key.
+        :return: The time, or None if the value does not exist or does not expire.
+        """
+        storage_obj = self._store.get(key)
+        return None if storage_obj is None else storage_obj.expires_in
+
+    async def get_statistics(self) -> CacheStatistics:
+        """Return the current usage and counters.
+
+        :return: The cache statistics.
+        """
+        return CacheStatistics(
+            num_entries=len(self._store),
+            size=self._size,
+            max_size=self.max_size,
+            num_hits=self.num_hits,
+            num_misses=self.num_misses,
+            num_evictions=self.num_evictions,
+        )
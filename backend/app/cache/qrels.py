@@ -0,0 +1,113 @@
+import struct
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+from msgspec.json import Decoder, Encoder
+
+from cache import build_key, get_read_tags
+
+if TYPE_CHECKING:
+    from litestar.stores.base import Store
+
+_HEADER = struct.Struct("<iIII")
+_ENCODER = Encoder()
+_IDS_DECODER = Decoder(tuple[list[str], list[str]])
+
+
+@dataclass
+class Qrels:
+    """The QRels of a dataset, stored as arrays for evaluation.
+
+    Queries and documents are numbered by their position in the ID lists. The QRels
+    are sorted by query and document number.
+    """
+
+    relevance_threshold: int
+    query_ids: list[str]
+    document_ids: list[str]
+    document_pkeys: np.ndarray
+    # one entry per QRel
+    query_numbers: np.ndarray
+    document_numbers: np.ndarray
+    relevances: np.ndarray
+
+    def encode(self) -> bytes:
+        """Serialize the QRels.
+
+        :return: The serialized QRels.
+        """
+        return b"".join(
+            [
+                _HEADER.pack(
+                    self.relevance_threshold,
+                    len(self.query_ids),
+                    len(self.document_ids),
+                    len(self.relevances),
+                ),
+                self.document_pkeys.astype(np.int32).tobytes(),
+                self.query_numbers.astype(np.int32).tobytes(),
+                self.document_numbers.astype(np.int32).tobytes(),
+                self.relevances.astype(np.int32).tobytes(),
+                _ENCODER.encode((self.query_ids, self.document_ids)),
+            ]
+        )
+
+    @classmethod
+    def decode(cls, value: bytes) -> "Qrels":
+        """Deserialize QRels created by `encode`.
+
+        The arrays are read-only views of the value.
+
+        :param value: The serialized QRels.
+        :return: The QRels.
+        """
+        relevance_threshold, num_queries, num_documents, num_qrels = (
+            _HEADER.unpack_from(value)
+        )
+        arrays = []
+        offset = _HEADER.size
+        for size in (num_documents, num_qrels, num_qrels, num_qrels):
+            arrays.append(np.frombuffer(value, np.int32, size, offset))
+            offset += size * 4
+        query_ids, document_ids = _IDS_DECODER.decode(value[offset:])
+        return cls(relevance_threshold, query_ids, document_ids, *arrays)
+
+
+def get_qrels_key(corpus_name: str, dataset_name: str) -> str:
+    """Return the cache key of the QRels of a dataset.
+
+    The key is tagged with the dataset, so that it is evicted when it is modified.
+
+    :param corpus_name: The name of the corpus.
+    :param dataset_name: The name of the dataset.
+    :return: The cache key.
+    """
+    return build_key(
+        get_read_tags([corpus_name], dataset_name),
+        "qrels\x00" + "\x00".join([corpus_name, dataset_name]),
+    )
+
+
+async def get_qrels(store: "Store", key: str) -> Qrels | None:
+    """Return cached QRels.
+
+    :param store: The store.
+    :param key: The cache key, see `get_qrels_key`.
+    :return: The QRels, or None if they are not cached.
+    """
+    value = await store.get(key)
+    return None if value is None else Qrels.decode(value)
+
+
+async def set_qrels(
+    store: "Store", key: str, qrels: Qrels, expires_in: int | None = None
+) -> None:
+    """Cache QRels.
+
+    :param store: The store.
+    :param key: The cache key, see `get_qrels_key`.
+    :param qrels: The QRels.
+    :param expires_in: Time in seconds before the QRels expire.
+    """
+    await store.set(key, qrels.encode(), expires_in)
@@ -0,0 +1,107 @@
+import os
+import struct
+from array import array
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from cache import build_key, get_read_tags
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from litestar.stores.base import Store
+
+# enough for the maximum number of search result pages in the frontend
+SEARCH_RANKING_SIZE = int(os.environ.get("SEARCH_RANKING_SIZE", "1000"))
+
+_HEADER = struct.Struct("<qI")
+
+
+@dataclass
+class Ranking:
+    """The top documents for a search query, stored as compact arrays.
+
+    The total number of hits includes the hits that are not part of the ranking, it
+    is only stored once it has been counted exactly.
+    """
+
+    total_num_hits: int | None
+    # primary keys and partition keys of the documents, ordered by score
+    pkeys: array
+    corpus_pkeys: array
+    scores: array
+
+    def encode(self) -> bytes:
+        """Serialize the ranking.
+
+        :return: The serialized ranking.
+        """
+        return (
+            _HEADER.pack(
+                -1 if self.total_num_hits is None else self.total_num_hits,
+                len(self.pkeys),
+            )
+            + self.pkeys.tobytes()
+            + self.corpus_pkeys.tobytes()
+            + self.scores.tobytes()
+        )
+
+    @classmethod
+    def decode(cls, value: bytes) -> "Ranking":
+        """Deserialize a ranking created by `encode`.
+
+        :param value: The serialized ranking.
+        :return: The ranking.
+        """
+        total_num_hits, size = _HEADER.unpack_from(value)
+        arrays = []
+        offset = _HEADER.size
+        for typecode in ("i", "i", "f"):
+            a = array(typecode)
+            a.frombytes(value[offset : offset + size * a.itemsize])
+            offset += size * a.itemsize
+            arrays.append(a)
+        return cls(None if total_num_hits < 0 else total_num_hits, *arrays)
+
+
+def get_ranking_key(q: str, corpus_names: "Iterable[str] | None") -> str:
+    """Return the cache key of the ranking for a search query.
+
+    The query is normalized (case and whitespace) in the same way as by the tokenizer,
+    so that equivalent queries share a ranking. The key is tagged with the corpora, so
+    that it is evicted when any of them is modified.
+
+    :param q: The search query.
+    :param corpus_names: The corpora searched, or None for all corpora.
+    :return: The cache key.
+    """
+    corpus_names = sorted(set(corpus_names or []))
+    normalized_q = " ".join(q.lower().split())
+    return build_key(
+        get_read_tags(corpus_names, None),
+        "ranking\x00" + "\x00".join([normalized_q, *corpus_names]),
+    )
+
+
+async def get_ranking(store: "Store", key: str) -> Ranking | None:
+    """Return a cached ranking.
+
+    :param store: The store.
+    :param key: The cache key, see `get_ranking_key`.
+    :return: The ranking, or None if it is not cached.
+    """
+    value = await store.get(key)
+    return None if value is None else Ranking.decode(value)
+
+
+async def set_ranking(
+    store: "Store", key: str, ranking: Ranking, expires_in: int | None = None
+) -> None:
+    """Cache a ranking.
+
+    :param store: The store.
+    :param key: The cache key, see `get_ranking_key`.
+    :param ranking: The ranking.
+    :param expires_in: Time in seconds before the ranking expires.
+    """
+    await store.set(key, ranking.encode(), expires_in)
@@ -0,0 +1,334 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import anyio
+from models import CacheStatistics
+
+from cache import TaggedStore, get_key_tags
+from cache.memory import CACHE_MAX_SIZE
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+CACHE_SQLITE_PATH = Path(
+    os.environ.get(
+        "CACHE_SQLITE_PATH",
+        str(Path(tempfile.gettempdir()) / "ir-explorer-cache.sqlite3"),
+    )
+)
+# the access time of an entry is only updated after this many seconds, so that most
+# reads do not write
+CACHE_SQLITE_ACCESS_INTERVAL = float(
+    os.environ.get("CACHE_SQLITE_ACCESS_INTERVAL", "10")
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS entry_tags (
+    tag TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (tag, key)
+);
+CREATE INDEX IF NOT EXISTS ix_entry_tags_key ON entry_tags (key);
+CREATE TABLE IF NOT EXISTS tag_versions (
+    tag TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO counters VALUES
+    ('size', 0), ('num_evictions', 0), ('epoch', abs(random()));
+CREATE TRIGGER IF NOT EXISTS tr_entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE counters SET value = value + NEW.size WHERE name = 'size';
+END;
+CREATE TRIGGER IF NOT EXISTS tr_entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE counters SET value = value - OLD.size WHERE name = 'size';
+    DELETE FROM entry_tags WHERE key = OLD.key;
+END;
+"""
+
+
+def _get_expires_at(expires_in: "int | timedelta | None") -> float | None:
+    if expires_in is None:
+        return None
+    if isinstance(expires_in, timedelta):
+        expires_in = int(expires_in.total_seconds())
+    return time.time() + expires_in
+
+
+class TaggedSQLiteStore(TaggedStore):
+    """SQLite-based store with a size limit that can delete all values with tags.
+
+    All processes that use the same database file share the entries, the size, and
+    invalidations, so that multiple workers on a host use a single cache. When the
+    size limit is exceeded, the least recently used entries are evicted.
+
+    Reads only write to the database when an entry has expired or its access time is
+    older than the access interval, so that processes do not wait for each other. The
+    hit and miss counters are kept by each process.
+    """
+
+    def __init__(
+        self,
+        path: Path = CACHE_SQLITE_PATH,
+        max_size: int = CACHE_MAX_SIZE,
+        access_interval: float = CACHE_SQLITE_ACCESS_INTERVAL,
+    ) -> None:
+        """Open (or create) a store.
+
+        :param path: The database file.
+        :param max_size: The maximum total size of all entries in bytes.
+        :param access_interval: Time in seconds after which the access time of an
+            entry is updated (and its expiry time renewed) when it is read.
+        """
+        self.path = path
+        self.max_size = max_size
+        self.access_interval = access_interval
+        self.num_hits = 0
+        self.num_misses = 0
+        # the connection is used by worker threads, one at a time
+        self._connection = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+            self._connection.executescript(_SCHEMA)
+
+    async def _run(self, fn: "Callable[..., Any]", *args: Any) -> Any:  # noqa: ANN401
+        def run() -> Any:  # noqa: ANN401
+            with self._lock:
+                # take the write lock right away, upgrading a read lock can fail
+                self._connection.execute("BEGIN IMMEDIATE")
+                try:
+                    result = fn(*args)
+                except BaseException:
+                    self._connection.execute("ROLLBACK")
+                    raise
+                self._connection.execute("COMMIT")
+                return result
+
+        return await anyio.to_thread.run_sync(run)
+
+    def _increment(self, name: str, value: int = 1) -> None:
+        self._connection.execute(
+            "UPDATE counters SET value = value + ? WHERE name = ?", (value, name)
+        )
+
+    def _set(self, key: str, value: bytes, expires_at: float | None) -> None:
+        size = len(key.encode()) + len(value)
+        self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+        if size > self.max_size:
+            return
+        self._connection.execute(
+            "INSERT INTO entries VALUES (?, ?, ?, ?, ?)",
+            (key, value, size, expires_at, time.time()),
+        )
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO entry_tags VALUES (?, ?)",
+            ((tag, key) for tag in get_key_tags(key)),
+        )
+
+        (total_size,) = self._connection.execute(
+            "SELECT value FROM counters WHERE name = 'size'"
+        ).fetchone()
+        if total_size <= self.max_size:
+            return
+        excess = total_size - self.max_size
+        evicted = []
+        for lru_key, lru_size in self._connection.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        ):
+            evicted.append((lru_key,))
+            excess -= lru_size
+            if excess <= 0:
+                break
+        self._connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self._increment("num_evictions", len(evicted))
+
+    async def _read(self, sql: str, parameters: tuple) -> Any:  # noqa: ANN401
+        # single statements in autocommit mode do not lock out other processes
+        def read() -> Any:  # noqa: ANN401
+            with self._lock:
+                return self._connection.execute(sql, parameters).fetchone()
+
+        return await anyio.to_thread.run_sync(read)
+
+    async def set(
+        self, key: str, value: str | bytes, expires_in: "int | timedelta | None" = None
+    ) -> None:
+        """Set a value and evict the least recently used entries if necessary.
+
+        Values that exceed the size limit by themselves are not stored.
+
+        :param key: The key, see `cache_key_builder`.
+        :param value: The value.
+        :param expires_in: Time in seconds before the value expires.
+        """
+        if isinstance(value, str):
+            value = value.encode()
+        await self._run(self._set, key, value, _get_expires_at(expires_in))
+
+    async def get(
+        self, key: str, renew_for: "int | timedelta | None" = None
+    ) -> bytes | None:
+        """Get a value and mark it as recently used.
+
+        :param key: The key.
+        :param renew_for: Renew the expiry time of the value (if it has one).
+        :return: The value, or None if it does not exist or has expired.
+        """
+        row = await self._read(
+            "SELECT value, expires_at, last_access FROM entries WHERE key = ?", (key,)
+        )
+        now = time.time()
+        if row is None:
+            self.num_misses += 1
+            return None
+
+        value, expires_at, last_access = row
+        if expires_at is not None and expires_at <= now:
+            self.num_misses += 1
+            # the entry may have been set again in the meantime
+            await self._run(
+                self._connection.execute,
+                "DELETE FROM entries WHERE key = ? AND expires_at <= ?",
+                (key, now),
+            )
+            return None
+
+        self.num_hits += 1
+        if now - last_access >= self.access_interval:
+            if renew_for and expires_at is not None:
+                expires_at = _get_expires_at(renew_for)
+            await self._run(
+                self._connection.execute,
+                "UPDATE entries SET last_access = ?, expires_at = ? WHERE key = ?",
+                (now, expires_at, key),
+            )
+        return value
+
+    async def delete(self, key: str) -> None:
+        """Delete a value, if it exists.
+
+        :param key: The key.
+        """
+        await self._run(
+            self._connection.execute, "DELETE FROM entries WHERE key = ?", (key,)
+        )
+
+    async def delete_tags(self, tags: "Iterable[str]") -> None:
+        """Delete all values with any of the given tags and increment their versions.
+
+        Values and versions are shared by all processes.
+
+        :param tags: The tags.
+        """
+        tags = list(tags)
+
+        def delete_tags() -> None:
+            self._connection.execute(
+                "DELETE FROM entries WHERE key IN ("
+                "SELECT key FROM entry_tags WHERE tag IN "
+                f"({', '.join('?' for _ in tags)}))",
+                tags,
+            )
+            self._connection.executemany(
+                "INSERT INTO tag_versions VALUES (?, 1) "
+                "ON CONFLICT (tag) DO UPDATE SET version = version + 1",
+                ((tag,) for tag in tags),
+            )
+
+        await self._run(delete_tags)
+
+    async def get_tags_version(self, tags: "Iterable[str]") -> str:
+        """Return the version of the given tags, shared by all processes.
+
+        :param tags: The tags.
+        :return: The version.
+        """
+        # a single statement, so that it does not take the write lock
+        tags = list(tags)
+        epoch, *versions = await self._read(
+            "SELECT (SELECT value FROM counters WHERE name = 'epoch')"
+            + "".join(
+                ", (SELECT version FROM tag_versions WHERE tag = ?)" for _ in tags
+            ),
+            tuple(tags),
+        )
+        return f"{epoch}:{','.join(str(version or 0) for version in versions)}"
+
+    async def delete_all(self) -> None:
+        """Delete all values and change the versions of all tags, in all processes."""
+
+        def delete_all() -> None:
+            self._connection.execute("DELETE FROM entries")
+            self._connection.execute(
+                "UPDATE counters SET value = abs(random()) WHERE name = 'epoch'"
+            )
+
+        await self._run(delete_all)
+
+    async def delete_expired(self) -> None:
+        """Delete expired values."""
+        await self._run(
+            self._connection.execute,
+            "DELETE FROM entries WHERE expires_at <= ?",
+            (time.time(),),
+        )
+
+    async def exists(self, key: str) -> bool:
+        """Check whether a value exists.
+
+        :param key: The key.
+        :return: Whether the value exists.
+        """
+        row = await self._read("SELECT 1 FROM entries WHERE key = ?", (key,))
+        return row is not None
+
+    async def expires_in(self, key: str) -> int | None:
+        """Return the time in seconds until a value expires.
+
+        :param key: The key.
+        :return: The time, or None if the value does not exist or does not expire.
+        """
+        row = await self._read("SELECT expires_at FROM entries WHERE key = ?", (key,))
+        if row is None or row[0] is None:
+            return None
+        return int(row[0] - time.time())
+
+    async def get_statistics(self) -> CacheStatistics:
+        """Return the usage and evictions of all processes and the hits of this process.
+
+        :return: The cache statistics.
+        """
+        num_entries, size, num_evictions = await self._read(
+            "SELECT (SELECT count(*) FROM entries), "
+            "(SELECT value FROM counters WHERE name = 'size'), "
+            "(SELECT value FROM counters WHERE name = 'num_evictions')",
+            (),
+        )
+        return CacheStatistics(
+            num_entries=num_entries,
+            size=size,
+            max_size=self.max_size,
+            num_hits=self.num_hits,
+            num_misses=self.num_misses,
+            num_evictions=num_evictions,
+        )
@@ -3,6 +3,13 @@
 from controllers.browse import BrowseController
 from controllers.data import DataController
 from controllers.misc import MiscController
+from controllers.runs import RunsController
 from controllers.search import SearchController
 
-__all__ = ["BrowseController", "SearchController", "DataController", "MiscController"]
+__all__ = [
+    "BrowseController",
+    "SearchController",
+    "DataController",
+    "MiscController",
+    "RunsController",
+]
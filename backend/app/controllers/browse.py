@@ -1,13 +1,19 @@
 from typing import TYPE_CHECKING, Literal
 
-from db import provide_transaction
+from db import provide_read_transaction
+from db.pagination import decode_cursor, encode_cursor, get_sort_key, seek_predicate
+from db.partitions import corpus_pkey_subquery, dataset_pkey_subquery
 from db.schema import (
     ORMCorpus,
+    ORMCorpusStatistics,
     ORMDataset,
+    ORMDatasetRelevanceCount,
+    ORMDatasetStatistics,
     ORMDocument,
     ORMQRel,
     ORMQuery,
 )
+from db.snapshots import CountMode, execute_with_count
 from litestar import Controller, get
 from litestar.di import Provide
 from litestar.exceptions import HTTPException
@@ -18,6 +24,11 @@ from litestar.status_codes import (
     HTTP_500_INTERNAL_SERVER_ERROR,
 )
 from llm import ensure_model_available, provide_client
+from llm.registry import (
+    ModelRegistry,  # noqa: TC002
+    provide_model_registry,
+)
+from llm.summaries import get_stored_summary, iter_summary_chunks
 from llm.util import get_summary_prompt
 from models import (
     Corpus,
@@ -40,51 +51,46 @@ from sqlalchemy import (
     desc,
     func,
     select,
-    text,
 )
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.orm import joinedload
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from sqlalchemy import ColumnElement, Row
     from sqlalchemy.ext.asyncio import AsyncSession
-    from sqlalchemy.sql.selectable import Subquery
 
 # TODO: remove pyright ignores once sqlalchemy-paradedb matures
 
 
-def _dataset_statistics_subquery() -> "Subquery":
-    return (
-        select(
-            ORMQuery.dataset_pkey,
-            func.count(func.distinct(ORMQuery.pkey)).label("num_queries"),
-            func.min(ORMQRel.relevance).label("min_relevance"),
-            func.max(ORMQRel.relevance).label("max_relevance"),
-        )
-        .outerjoin(ORMQRel)
-        .group_by(ORMQuery.dataset_pkey)
-        .subquery()
-    )
-
-
-def _dataset_relevance_range_subquery() -> "Subquery":
-    return (
-        select(
-            ORMQuery.dataset_pkey,
-            func.min(ORMQRel.relevance).label("min_relevance"),
-            func.max(ORMQRel.relevance).label("max_relevance"),
+def _seek_predicate_or_400(
+    order_by_clause: "Sequence[ColumnElement]", cursor: str, order: str
+) -> "ColumnElement[bool]":
+    try:
+        return seek_predicate(order_by_clause, decode_cursor(cursor, order))
+    except ValueError as e:
+        raise HTTPException(
+            str(e), status_code=HTTP_400_BAD_REQUEST, extra={"cursor": cursor}
         )
-        .join(ORMQRel)
-        .group_by(ORMQuery.dataset_pkey)
-        .subquery()
-    )
+
+
+def _get_next_cursor(
+    result: "Sequence[Row]", num_results: int, order: str, key_size: int
+) -> str | None:
+    # the sort key columns are selected last
+    if len(result) == 0 or len(result) < num_results:
+        return None
+    return encode_cursor(order, result[-1][-key_size:])
 
 
 class BrowseController(Controller):
     """Controller that handles browse-related API endpoints."""
 
     dependencies = {
-        "db_transaction": Provide(provide_transaction),
+        "db_transaction": Provide(provide_read_transaction),
         "openai_client": Provide(provide_client),
+        "model_registry": Provide(provide_model_registry),
     }
 
     @get(path="/get_corpora", cache=True)
@@ -96,25 +102,9 @@ class BrowseController(Controller):
         :param db_transaction: A DB transaction.
         :return: The list of corpora.
         """
-        sq_documents = (
-            select(ORMDocument.corpus_pkey, func.count().label("count"))
-            .group_by(ORMDocument.corpus_pkey)
-            .subquery()
-        )
-        sq_datasets = (
-            select(ORMDataset.corpus_pkey, func.count().label("count"))
-            .group_by(ORMDataset.corpus_pkey)
-            .subquery()
-        )
-
         sql = (
-            select(
-                ORMCorpus,
-                func.coalesce(sq_documents.c.count, 0),
-                func.coalesce(sq_datasets.c.count, 0),
-            )
-            .outerjoin(sq_documents)
-            .outerjoin(sq_datasets)
+            select(ORMCorpus, ORMCorpusStatistics)
+            .join(ORMCorpusStatistics)
             .order_by(ORMCorpus.name.asc())
         )
 
@@ -123,10 +113,11 @@ class BrowseController(Controller):
             Corpus(
                 name=corpus.name,
                 language=corpus.language,
-                num_datasets=num_datasets,
-                num_documents=num_documents,
+                num_datasets=statistics.num_datasets,
+                num_documents=statistics.num_documents,
+                text_size=statistics.text_size,
             )
-            for corpus, num_documents, num_datasets in result
+            for corpus, statistics in result
         ]
 
     @get(path="/get_datasets", cache=True)
@@ -141,32 +132,43 @@ class BrowseController(Controller):
         :param corpus_name: The name of the corpus.
         :return: The list of datasets.
         """
-        sq_dataset_statistics = _dataset_statistics_subquery()
-
         sql = (
             select(
                 ORMDataset,
-                func.coalesce(sq_dataset_statistics.c.num_queries, 0),
+                ORMDatasetStatistics,
                 func.least(
                     ORMDataset.relevance_threshold - 1,
                     func.coalesce(
-                        sq_dataset_statistics.c.min_relevance,
+                        ORMDatasetStatistics.min_relevance,
                         ORMDataset.relevance_threshold - 1,
                     ),
                 ),
                 func.greatest(
                     ORMDataset.relevance_threshold - 1,
                     func.coalesce(
-                        sq_dataset_statistics.c.max_relevance,
+                        ORMDatasetStatistics.max_relevance,
                         ORMDataset.relevance_threshold,
                     ),
                 ),
             )
-            .outerjoin(sq_dataset_statistics)
+            .join(ORMDatasetStatistics)
             .join(ORMCorpus)
             .where(ORMCorpus.name == corpus_name)
             .order_by(ORMDataset.name.asc())
         )
+        sql_histograms = (
+            select(ORMDatasetRelevanceCount)
+            .join(ORMDataset)
+            .join(ORMCorpus)
+            .where(ORMCorpus.name == corpus_name)
+            .order_by(ORMDatasetRelevanceCount.relevance.asc())
+        )
+
+        histograms: dict[int, dict[int, int]] = {}
+        for count in (await db_transaction.execute(sql_histograms)).scalars():
+            histograms.setdefault(count.dataset_pkey, {})[count.relevance] = (
+                count.num_qrels
+            )
 
         result = (await db_transaction.execute(sql)).all()
         return [
@@ -176,9 +178,11 @@ class BrowseController(Controller):
                 relevance_threshold=dataset.relevance_threshold,
                 min_relevance=min_relevance,
                 max_relevance=max_relevance,
-                num_queries=num_queries,
+                num_queries=statistics.num_queries,
+                num_qrels=statistics.num_qrels,
+                relevance_histogram=histograms.get(dataset.pkey, {}),
             )
-            for dataset, num_queries, min_relevance, max_relevance in result
+            for dataset, statistics, min_relevance, max_relevance in result
         ]
 
     @get(path="/get_queries", cache=True)
@@ -190,6 +194,8 @@ class BrowseController(Controller):
         match: str | None = None,
         num_results: int = 10,
         offset: int = 0,
+        cursor: str | None = None,
+        count_mode: CountMode = "exact",
         order_by: Literal["relevant_documents", "length", "match_score"] | None = None,
         order_by_desc: bool = True,
     ) -> Paginated[Query]:
@@ -200,7 +206,10 @@ class BrowseController(Controller):
         :param dataset_name: Return only queries in this dataset.
         :param match: Return only queries matching this.
         :param num_results: How many queries to return.
-        :param offset: Offset for pagination.
+        :param offset: Offset for pagination (relative to the cursor, if any).
+        :param cursor: Return queries after this cursor (from a previous page).
+        :param count_mode: How to count all queries, "estimate" and "capped"
+            are exact only up to a limit, "none" skips the count.
         :param order_by: In what order to return the queries.
         :param order_by_desc: Whether to order in a descending or ascending fashion.
         :return: Paginated list of queries.
@@ -212,7 +221,11 @@ class BrowseController(Controller):
                 extra={"order_by": order_by, "match": match},
             )
 
-        where_clause = [ORMCorpus.name == corpus_name, ORMDataset.name == dataset_name]
+        where_clause = [
+            ORMCorpus.name == corpus_name,
+            ORMDataset.name == dataset_name,
+            ORMQuery.dataset_pkey == dataset_pkey_subquery(corpus_name, dataset_name),
+        ]
         if match is not None:
             where_clause.append(
                 search.match_any(
@@ -231,25 +244,22 @@ class BrowseController(Controller):
 
         order_by_op = desc if order_by_desc else asc
         if order_by == "relevant_documents":
-            order_by_clause = (order_by_op(text("count")), ORMQuery.pkey)
+            # the ties are ordered in the same direction, so that the index can be used
+            order_by_clause = (
+                order_by_op(ORMQuery.num_relevant_documents),
+                order_by_op(ORMQuery.pkey),
+            )
         elif order_by == "length":
             order_by_clause = (
                 order_by_op(func.length(ORMQuery.text)),
-                ORMQuery.pkey,
+                asc(ORMQuery.pkey),
             )
         else:
-            order_by_clause = (ORMQuery.pkey,)
+            order_by_clause = (asc(ORMQuery.pkey),)
 
         select_from = ORMQuery
-        group_by_clause = [
-            ORMQuery.pkey,
-            ORMQuery.id,
-            ORMQuery.description,
-            ORMQuery.text,
-            ORMDataset.name,
-        ]
 
-        # compute score before qrel joins/grouping so paradedb keeps the search context
+        # compute score in a subquery so paradedb keeps the search context
         if order_by == "match_score":
             sq_query_scores = (
                 select(
@@ -265,32 +275,39 @@ class BrowseController(Controller):
             select_from = sq_query_scores.join(
                 ORMQuery, onclause=ORMQuery.pkey == sq_query_scores.c.pkey
             )
-            group_by_clause.append(sq_query_scores.c.score)
-            order_by_clause = (order_by_op(sq_query_scores.c.score), ORMQuery.pkey)
+            order_by_clause = (
+                order_by_op(sq_query_scores.c.score),
+                asc(ORMQuery.pkey),
+            )
+
+        order = f"queries:{order_by}:{order_by_desc}"
+        seek_clause = []
+        if cursor is not None:
+            seek_clause.append(_seek_predicate_or_400(order_by_clause, cursor, order))
+        sort_key = get_sort_key(order_by_clause)
 
         sql = (
             select(
                 ORMQuery.id,
                 ORMQuery.text,
                 ORMQuery.description,
-                func.count()
-                .filter(ORMQRel.relevance >= ORMDataset.relevance_threshold)
-                .label("count"),
+                ORMQuery.num_relevant_documents,
                 ORMDataset.name,
+                *(column for column, _ in sort_key),
             )
             .select_from(select_from)
             .join(ORMDataset, onclause=ORMQuery.dataset_pkey == ORMDataset.pkey)
-            .outerjoin(ORMQRel)
             .join(ORMCorpus, onclause=ORMDataset.corpus_pkey == ORMCorpus.pkey)
-            .where(*where_clause)
-            .group_by(*group_by_clause)
+            .where(*where_clause, *seek_clause)
             .order_by(*order_by_clause)
             .limit(num_results)
             .offset(offset)
         )
 
-        total_num_results = (await db_transaction.execute(sql_count)).scalar_one()
-        result = (await db_transaction.execute(sql)).all()
+        result, total_num_results, is_exact = await execute_with_count(
+            db_transaction, sql, sql_count, count_mode
+        )
+        result = result.all()
         return Paginated[Query](
             items=[
                 Query(
@@ -301,10 +318,12 @@ class BrowseController(Controller):
                     description=description,
                     num_relevant_documents=num_rel_docs,
                 )
-                for id, text, description, num_rel_docs, dataset_name in result
+                for id, text, description, num_rel_docs, dataset_name, *_ in result
             ],
             offset=offset,
             total_num_items=total_num_results,
+            is_exact=is_exact,
+            next_cursor=_get_next_cursor(result, num_results, order, len(sort_key)),
         )
 
     @get(path="/get_query", cache=True)
@@ -325,27 +344,22 @@ class BrowseController(Controller):
         :return: The query object.
         """
         sql = (
-            select(
-                ORMQuery,
-                func.count(ORMQRel.document_pkey).filter(
-                    ORMQRel.relevance >= ORMDataset.relevance_threshold
-                ),
-            )
+            select(ORMQuery)
             .join(ORMDataset)
             .join(ORMCorpus)
-            .outerjoin(ORMQRel)
             .where(
                 and_(
                     ORMQuery.id == query_id,
                     ORMCorpus.name == corpus_name,
                     ORMDataset.name == dataset_name,
+                    ORMQuery.dataset_pkey
+                    == dataset_pkey_subquery(corpus_name, dataset_name),
                 )
             )
-            .group_by(ORMQuery.pkey)
         )
 
         try:
-            db_query, num_rel_docs = (await db_transaction.execute(sql)).one()
+            db_query = (await db_transaction.execute(sql)).scalar_one()
         except NoResultFound:
             raise HTTPException(
                 "Could not find the requested query.",
@@ -362,7 +376,7 @@ class BrowseController(Controller):
             dataset_name=dataset_name,
             text=db_query.text,
             description=db_query.description,
-            num_relevant_documents=num_rel_docs,
+            num_relevant_documents=db_query.num_relevant_documents,
         )
 
     @get(path="/get_document", cache=True)
@@ -378,21 +392,17 @@ class BrowseController(Controller):
         :return: The document object.
         """
         sql = (
-            select(
-                ORMDocument,
-                func.count(ORMQRel.query_pkey).filter(
-                    ORMQRel.relevance >= ORMDataset.relevance_threshold
-                ),
-            )
+            select(ORMDocument)
             .join(ORMCorpus)
-            .outerjoin(ORMQRel)
-            .outerjoin(ORMQuery)
-            .outerjoin(ORMDataset)
-            .where(ORMCorpus.name == corpus_name, ORMDocument.id == document_id)
-        ).group_by(ORMDocument.pkey)
+            .where(
+                ORMCorpus.name == corpus_name,
+                ORMDocument.corpus_pkey == corpus_pkey_subquery(corpus_name),
+                ORMDocument.id == document_id,
+            )
+        )
 
         try:
-            db_document, num_rel_queries = (await db_transaction.execute(sql)).one()
+            db_document = (await db_transaction.execute(sql)).scalar_one()
         except NoResultFound as e:
             raise HTTPException(
                 "Could not find the requested document.",
@@ -408,7 +418,7 @@ class BrowseController(Controller):
             title=db_document.title,
             text=db_document.text,
             corpus_name=corpus_name,
-            num_relevant_queries=num_rel_queries,
+            num_relevant_queries=db_document.num_relevant_queries,
         )
 
     @get(path="/get_documents", cache=True)
@@ -419,6 +429,8 @@ class BrowseController(Controller):
         match: str | None = None,
         num_results: int = 10,
         offset: int = 0,
+        cursor: str | None = None,
+        count_mode: CountMode = "exact",
         order_by: Literal["relevant_queries", "length", "match_score"] | None = None,
         order_by_desc: bool = True,
     ) -> Paginated[Document]:
@@ -428,7 +440,10 @@ class BrowseController(Controller):
         :param corpus_name: The name of the corpus.
         :param match: Return only documents matching this.
         :param num_results: How many documents to return.
-        :param offset: Offset for pagination.
+        :param offset: Offset for pagination (relative to the cursor, if any).
+        :param cursor: Return documents after this cursor (from a previous page).
+        :param count_mode: How to count all documents, "estimate" and "capped"
+            are exact only up to a limit, "none" skips the count.
         :param order_by: In what order to return the documents.
         :param order_by_desc: Whether to order in a descending or ascending fashion.
         :return: Paginated list of documents.
@@ -440,7 +455,11 @@ class BrowseController(Controller):
                 extra={"order_by": order_by, "match": match},
             )
 
-        where_clause = [ORMCorpus.name == corpus_name]
+        corpus_pkey = corpus_pkey_subquery(corpus_name)
+        where_clause = [
+            ORMCorpus.name == corpus_name,
+            ORMDocument.corpus_pkey == corpus_pkey,
+        ]
         if match is not None:
             where_clause.append(
                 search.match_any(
@@ -461,7 +480,7 @@ class BrowseController(Controller):
         select_from = ORMDocument
         sq_where_clause = where_clause
 
-        # compute score before qrel joins/grouping so paradedb keeps the search context
+        # compute score in a subquery so paradedb keeps the search context
         if order_by == "match_score":
             sq_document_scores = (
                 select(
@@ -478,64 +497,74 @@ class BrowseController(Controller):
             select_from = sq_document_scores.join(
                 ORMDocument, onclause=ORMDocument.pkey == document_pkey
             )
-            sq_where_clause = []
-
-        select_clause_sq = [
-            document_pkey,
-            func.count()
-            .filter(ORMQRel.relevance >= ORMDataset.relevance_threshold)
-            .label("count"),
-        ]
-        group_by_clause = [document_pkey]
+            sq_where_clause = [ORMDocument.corpus_pkey == corpus_pkey]
 
         order_by_op = desc if order_by_desc else asc
         if order_by == "relevant_queries":
-            order_by_clause = [order_by_op(text("count"))]
+            # the ties are ordered in the same direction, so that the index can be used
+            order_by_clause = [
+                order_by_op(ORMDocument.num_relevant_queries),
+                order_by_op(document_pkey),
+            ]
         elif order_by == "length":
-            select_clause_sq.append(ORMDocument.text_length.label("text_length"))
-            order_by_clause = [order_by_op(text("text_length"))]
+            order_by_clause = [order_by_op(ORMDocument.text_length), asc(document_pkey)]
         elif score is not None:
-            select_clause_sq.append(score)
-            group_by_clause.append(score)
-            order_by_clause = [order_by_op(text("score"))]
+            order_by_clause = [order_by_op(score), asc(document_pkey)]
         else:
-            order_by_clause = []
-
-        # select pkeys of matching documents in correct order
-        sq_document_pkeys = (
-            select(*select_clause_sq)
+            order_by_clause = [asc(document_pkey)]
+
+        order = f"documents:{order_by}:{order_by_desc}"
+        if cursor is not None:
+            sq_where_clause = [
+                *sq_where_clause,
+                _seek_predicate_or_400(order_by_clause, cursor, order),
+            ]
+        sort_key = get_sort_key(order_by_clause)
+
+        # select sort keys (ending with the pkey) of matching documents in correct order
+        sq_document_keys = (
+            select(
+                *(column.label(f"key_{i}") for i, (column, _) in enumerate(sort_key))
+            )
             .select_from(select_from)
             .join(ORMCorpus, onclause=ORMDocument.corpus_pkey == ORMCorpus.pkey)
-            .outerjoin(ORMQRel)
-            .outerjoin(ORMQuery)
-            .outerjoin(ORMDataset)
             .where(*sq_where_clause)
-            .group_by(*group_by_clause)
-            .order_by(*order_by_clause, document_pkey)
+            .order_by(*order_by_clause)
             .limit(num_results)
             .offset(offset)
         ).subquery()
-
-        select_clause = [
-            ORMDocument.id,
-            ORMDocument.title,
-            ORMDocument.text,
-            sq_document_pkeys.c.count,
+        sort_key_columns = [
+            sq_document_keys.c[f"key_{i}"] for i in range(len(sort_key))
         ]
 
-        if "text_length" in sq_document_pkeys.c:
-            select_clause.append(sq_document_pkeys.c.text_length)
-        if "score" in sq_document_pkeys.c:
-            select_clause.append(sq_document_pkeys.c.score)
         sql = (
-            select(*select_clause)
-            .select_from(sq_document_pkeys)
-            .join(ORMDocument, onclause=sq_document_pkeys.c.pkey == ORMDocument.pkey)
-            .order_by(*order_by_clause, ORMDocument.pkey)
+            select(
+                ORMDocument.id,
+                ORMDocument.title,
+                ORMDocument.text,
+                ORMDocument.num_relevant_queries,
+                *sort_key_columns,
+            )
+            .select_from(sq_document_keys)
+            .join(
+                ORMDocument,
+                onclause=and_(
+                    sort_key_columns[-1] == ORMDocument.pkey,
+                    ORMDocument.corpus_pkey == corpus_pkey,
+                ),
+            )
+            .order_by(
+                *(
+                    (desc if descending else asc)(column)
+                    for column, (_, descending) in zip(sort_key_columns, sort_key)
+                )
+            )
         )
 
-        total_num_results = (await db_transaction.execute(sql_count)).scalar_one()
-        result = (await db_transaction.execute(sql)).all()
+        result, total_num_results, is_exact = await execute_with_count(
+            db_transaction, sql, sql_count, count_mode
+        )
+        result = result.all()
         return Paginated[Document](
             items=[
                 Document(
@@ -549,6 +578,8 @@ class BrowseController(Controller):
             ],
             offset=offset,
             total_num_items=total_num_results,
+            is_exact=is_exact,
+            next_cursor=_get_next_cursor(result, num_results, order, len(sort_key)),
         )
 
     @get(path="/get_qrels", cache=True)
@@ -563,6 +594,8 @@ class BrowseController(Controller):
         match_document: str | None = None,
         num_results: int = 10,
         offset: int = 0,
+        cursor: str | None = None,
+        count_mode: CountMode = "exact",
         order_by: Literal[
             "relevance",
             "query_length",
@@ -583,7 +616,10 @@ class BrowseController(Controller):
         :param match_query: Return only queries matching this.
         :param match_document: Return only documents matching this.
         :param num_results: How many QRels to return.
-        :param offset: Offset for pagination.
+        :param offset: Offset for pagination (relative to the cursor, if any).
+        :param cursor: Return QRels after this cursor (from a previous page).
+        :param count_mode: How to count all QRels, "estimate" and "capped"
+            are exact only up to a limit, "none" skips the count.
         :param order_by: In what order to return the QRels.
         :param order_by_desc: Whether to order in a descending or ascending fashion.
         :return: Paginated list of QRels, ordered by relevance.
@@ -611,12 +647,19 @@ class BrowseController(Controller):
 
         where_clause = [
             ORMCorpus.name == corpus_name,
+            ORMDocument.corpus_pkey == corpus_pkey_subquery(corpus_name),
             ORMQRel.relevance >= ORMDataset.relevance_threshold,
         ]
         if document_id is not None:
             where_clause.append(ORMDocument.id == document_id)
         if dataset_name is not None:
-            where_clause.append(ORMDataset.name == dataset_name)
+            where_clause.extend(
+                (
+                    ORMDataset.name == dataset_name,
+                    ORMQuery.dataset_pkey
+                    == dataset_pkey_subquery(corpus_name, dataset_name),
+                )
+            )
         if query_id is not None:
             where_clause.append(ORMQuery.id == query_id)
         if match_query is not None:
@@ -644,63 +687,45 @@ class BrowseController(Controller):
             .where(and_(*where_clause))
         )
 
-        order_by_op = desc if order_by_desc else asc
-        if order_by == "relevance":
-            order_by_clause = (
-                order_by_op(ORMQRel.relevance),
-                ORMQRel.query_pkey,
-                ORMQRel.document_pkey,
-            )
-        elif order_by == "query_length":
-            order_by_clause = (
-                order_by_op(func.length(ORMQuery.text)),
-                ORMQRel.query_pkey,
-                ORMQRel.document_pkey,
-            )
-        elif order_by == "document_length":
-            order_by_clause = (
-                order_by_op(func.length(ORMDocument.text)),
-                ORMQRel.query_pkey,
-                ORMQRel.document_pkey,
-            )
-        elif order_by == "query_match_score":
-            order_by_clause = (
-                order_by_op(pdb.score(ORMQuery.pkey)),  # pyright: ignore[reportArgumentType]
-                ORMQRel.query_pkey,
-                ORMQRel.document_pkey,
-            )
-        elif order_by == "document_match_score":
+        order_by_columns = {
+            "relevance": ORMQRel.relevance,
+            "query_length": func.length(ORMQuery.text),
+            "document_length": func.length(ORMDocument.text),
+            "query_match_score": pdb.score(ORMQuery.pkey),  # pyright: ignore[reportArgumentType]
+            "document_match_score": pdb.score(ORMDocument.pkey),  # pyright: ignore[reportArgumentType]
+        }
+        order_by_clause = (asc(ORMQRel.query_pkey), asc(ORMQRel.document_pkey))
+        if order_by is not None:
+            order_by_op = desc if order_by_desc else asc
             order_by_clause = (
-                order_by_op(pdb.score(ORMDocument.pkey)),  # pyright: ignore[reportArgumentType]
-                ORMQRel.query_pkey,
-                ORMQRel.document_pkey,
+                order_by_op(order_by_columns[order_by]),
+                *order_by_clause,
             )
-        else:
-            order_by_clause = (ORMQRel.query_pkey, ORMQRel.document_pkey)
 
-        sq_dataset_relevance_range = _dataset_relevance_range_subquery()
+        order = f"qrels:{order_by}:{order_by_desc}"
+        if cursor is not None:
+            where_clause.append(_seek_predicate_or_400(order_by_clause, cursor, order))
+        sort_key = get_sort_key(order_by_clause)
 
         sql = (
             select(
                 ORMQRel,
                 func.least(
                     ORMDataset.relevance_threshold - 1,
-                    sq_dataset_relevance_range.c.min_relevance,
+                    ORMDatasetStatistics.min_relevance,
                 ),
                 func.greatest(
                     ORMDataset.relevance_threshold - 1,
-                    sq_dataset_relevance_range.c.max_relevance,
+                    ORMDatasetStatistics.max_relevance,
                 ),
+                *(column for column, _ in sort_key),
             )
             .select_from(ORMQRel)
             .join(ORMQuery)
             .join(ORMDocument)
             .join(ORMDataset)
             .join(ORMCorpus)
-            .join(
-                sq_dataset_relevance_range,
-                ORMDataset.pkey == sq_dataset_relevance_range.c.dataset_pkey,
-            )
+            .join(ORMDatasetStatistics)
             .options(
                 joinedload(ORMQRel.document),
                 joinedload(ORMQRel.query)
@@ -713,8 +738,10 @@ class BrowseController(Controller):
             .limit(num_results)
         )
 
-        total_num_results = (await db_transaction.execute(sql_count)).scalar_one()
-        result = (await db_transaction.execute(sql)).all()
+        result, total_num_results, is_exact = await execute_with_count(
+            db_transaction, sql, sql_count, count_mode
+        )
+        result = result.all()
         return Paginated[QRel](
             items=[
                 QRel(
@@ -737,10 +764,12 @@ class BrowseController(Controller):
                     ),
                     relevance=qrel.relevance,
                 )
-                for qrel, min_relevance, max_relevance in result
+                for qrel, min_relevance, max_relevance, *_ in result
             ],
             offset=offset,
             total_num_items=total_num_results,
+            is_exact=is_exact,
+            next_cursor=_get_next_cursor(result, num_results, order, len(sort_key)),
         )
 
     @get(path="/get_document_summary", cache=True, media_type="text/event-stream")
@@ -748,14 +777,19 @@ class BrowseController(Controller):
         self,
         db_transaction: "AsyncSession",
         openai_client: AsyncOpenAI | None,
+        model_registry: ModelRegistry,
         corpus_name: str,
         document_id: str,
         model_name: str,
     ) -> Stream:
         """Stream a generated summary of a single document.
 
+        Summaries are stored once they are complete (for each model and prompt
+        template) and served from the database afterwards.
+
         :param db_transaction: A DB transaction.
         :param openai_client: An OpenAI client.
+        :param model_registry: The available models.
         :param corpus_name: The corpus name.
         :param document_id: The document ID.
         :param model_name: The model to use.
@@ -767,7 +801,11 @@ class BrowseController(Controller):
         sql = (
             select(ORMDocument)
             .join(ORMCorpus)
-            .where(ORMCorpus.name == corpus_name, ORMDocument.id == document_id)
+            .where(
+                ORMCorpus.name == corpus_name,
+                ORMDocument.corpus_pkey == corpus_pkey_subquery(corpus_name),
+                ORMDocument.id == document_id,
+            )
         )
 
         try:
@@ -783,14 +821,30 @@ class BrowseController(Controller):
                 },
             )
 
-        openai_client = await ensure_model_available(openai_client, model_name)
+        summary = await get_stored_summary(db_transaction, db_document.pkey, model_name)
+        if summary is not None:
+            return Stream([summary])
+
+        openai_client = await ensure_model_available(
+            openai_client, model_registry, model_name
+        )
+        # the transaction ends before the response, so the pool is used directly
+        engine = (await db_transaction.connection()).engine
         try:
             stream = await openai_client.completions.create(
                 model=model_name,
                 prompt=get_summary_prompt(db_document.text, db_document.title),
                 stream=True,
             )
-            return Stream(chunk.choices[0].text async for chunk in stream)
+            return Stream(
+                iter_summary_chunks(
+                    stream,
+                    engine,
+                    db_document.pkey,
+                    db_document.corpus_pkey,
+                    model_name,
+                )
+            )
         except Exception as e:
             raise HTTPException(
                 "Failed to summarize document.",
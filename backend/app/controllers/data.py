@@ -1,8 +1,47 @@
+import time
+from contextlib import asynccontextmanager, nullcontext
 from typing import TYPE_CHECKING
 
+from asyncpg.exceptions import IntegrityConstraintViolationError
+from cache import INVALIDATES, set_invalidated
 from db import provide_transaction
-from db.schema import ORMCorpus, ORMDataset, ORMDocument, ORMQRel, ORMQuery
-from litestar import Controller, delete, post
+from db.partitions import create_partition, drop_partition
+from db.schema import (
+    ORMCorpus,
+    ORMDataset,
+    ORMDocument,
+    ORMIngestJob,
+    ORMQRel,
+    ORMQuery,
+    ORMSummaryJob,
+)
+from db.statistics import (
+    create_corpus_statistics,
+    create_dataset_statistics,
+    update_corpus_statistics,
+    update_num_relevant_queries,
+)
+from ingest import (
+    copy_documents,
+    copy_queries,
+    get_corpus_pkey,
+    get_dataset_pkeys,
+    get_ingest_result,
+    get_qrel_ingest_result,
+    resolve_staged_qrels,
+    stage_qrels,
+)
+from ingest.indexes import attach_partition, detach_partition, is_partition_empty
+from ingest.indexes import get_index_status as get_index_status_
+from ingest.jobs import (
+    IngestJobError,
+    IngestJobKind,  # noqa: TC002
+    IngestJobRunner,  # noqa: TC002
+    get_ingest_job_info,
+    provide_ingest_job_runner,
+)
+from ingest.ndjson import InvalidLineError, iter_ndjson_batches
+from litestar import Controller, Request, delete, get, post
 from litestar.di import Provide
 from litestar.exceptions import HTTPException
 from litestar.status_codes import (
@@ -10,41 +49,127 @@ from litestar.status_codes import (
     HTTP_404_NOT_FOUND,
     HTTP_409_CONFLICT,
 )
+from llm import ensure_model_available, provide_client
+from llm.registry import (
+    ModelRegistry,  # noqa: TC002
+    provide_model_registry,
+)
+from llm.summaries import (
+    SUMMARY_CONCURRENCY,
+    SummaryJobRunner,  # noqa: TC002
+    get_summary_job_info,
+    provide_summary_job_runner,
+)
 
 # litestar needs these outside of the type checking block
 from models import (
     CorpusInfo,  # noqa: TC002
     DatasetInfo,  # noqa: TC002
-    DocumentInfo,  # noqa: TC002
-    QRelInfo,  # noqa: TC002
-    QueryInfo,  # noqa: TC002
+    DocumentInfo,
+    IndexStatus,  # noqa: TC002
+    IngestJob,  # noqa: TC002
+    IngestResult,  # noqa: TC002
+    QRelInfo,
+    QRelIngestResult,  # noqa: TC002
+    QueryInfo,
+    SummaryJob,  # noqa: TC002
 )
+from openai import AsyncOpenAI  # noqa: TC002
+from sqlalchemy import delete as delete_
 from sqlalchemy import (
-    and_,
+    func,
     insert,
     select,
 )
-from sqlalchemy import delete as delete_
 from sqlalchemy.exc import IntegrityError, NoResultFound, ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
 if TYPE_CHECKING:
-    from collections.abc import Sequence
+    from collections.abc import AsyncIterator, Sequence
+
+
+async def _get_corpus_pkey_or_404(
+    db_transaction: "AsyncSession", corpus_name: str
+) -> int:
+    corpus_pkey = await get_corpus_pkey(db_transaction, corpus_name)
+    if corpus_pkey is None:
+        raise HTTPException(
+            "Could not find the requested corpus.",
+            status_code=HTTP_404_NOT_FOUND,
+            extra={"corpus_name": corpus_name},
+        )
+    return corpus_pkey
+
+
+async def _get_dataset_pkeys_or_404(
+    db_transaction: "AsyncSession", corpus_name: str, dataset_name: str
+) -> tuple[int, int]:
+    dataset_pkeys = await get_dataset_pkeys(db_transaction, corpus_name, dataset_name)
+    if dataset_pkeys is None:
+        raise HTTPException(
+            "Could not find the requested dataset.",
+            status_code=HTTP_404_NOT_FOUND,
+            extra={"corpus_name": corpus_name, "dataset_name": dataset_name},
+        )
+    return dataset_pkeys
+
+
+@asynccontextmanager
+async def _defer_partition_indexes(
+    db_transaction: "AsyncSession", table_name: str, key: int
+) -> "AsyncIterator[None]":
+    # the partitioned table is locked exclusively while a partition is detached, so
+    # this is committed right away in a separate transaction, the partition is owned
+    # by the connection of the request, which attaches it again
+    engine = (await db_transaction.connection()).engine
+    owner_pid = (
+        await db_transaction.execute(select(func.pg_backend_pid()))
+    ).scalar_one()
+    async with AsyncSession(engine) as session, session.begin():
+        if not (
+            await is_partition_empty(session, table_name, key)
+            and await detach_partition(session, table_name, key, owner_pid)
+        ):
+            raise HTTPException(
+                "Indexes can only be deferred when adding to an empty partition.",
+                status_code=HTTP_409_CONFLICT,
+                extra={"table_name": table_name},
+            )
 
-    from sqlalchemy.ext.asyncio import AsyncSession
+    try:
+        # on failure, the partition is emptied by rolling back to the savepoint, so
+        # that it can be attached again separately
+        async with db_transaction.begin_nested():
+            yield
+            # the indexes of the partition are created when it is attached
+            await attach_partition(db_transaction, table_name, key)
+    except BaseException:
+        async with AsyncSession(engine) as session, session.begin():
+            await attach_partition(session, table_name, key)
+        raise
 
 
 class DataController(Controller):
     """Controller that handles data-related API endpoints."""
 
-    dependencies = {"db_transaction": Provide(provide_transaction)}
+    dependencies = {
+        "db_transaction": Provide(provide_transaction),
+        "ingest_job_runner": Provide(provide_ingest_job_runner),
+        "summary_job_runner": Provide(provide_summary_job_runner),
+        "openai_client": Provide(provide_client),
+        "model_registry": Provide(provide_model_registry),
+    }
 
-    @post(path="/create_corpus")
+    @post(path="/create_corpus", opt={INVALIDATES: True})
     async def create_corpus(
-        self, db_transaction: "AsyncSession", data: "CorpusInfo"
+        self, request: "Request", db_transaction: "AsyncSession", data: "CorpusInfo"
     ) -> None:
         """Create a new corpus in the database.
 
+        The documents of the corpus are stored in their own partition.
+
+        :param request: The request.
         :param db_transaction: A DB transaction.
         :param data: The corpus.
         :raises HTTPException: When the corpus cannot be added to the database.
@@ -57,39 +182,57 @@ class DataController(Controller):
                 extra={"language": data.language},
             )
 
-        sql = insert(ORMCorpus).values({"name": data.name, "language": data.language})
+        sql = (
+            insert(ORMCorpus)
+            .values({"name": data.name, "language": data.language})
+            .returning(ORMCorpus.pkey)
+        )
 
         try:
-            await db_transaction.execute(sql)
+            corpus_pkey = (await db_transaction.execute(sql)).scalar_one()
         except (IntegrityError, ProgrammingError) as e:
             raise HTTPException(
                 "Failed to add corpus.",
                 status_code=HTTP_409_CONFLICT,
                 extra={"corpus_name": data.name, "error_code": e.code},
             )
+        await create_partition(
+            db_transaction,
+            ORMDocument.__table__,  # pyright: ignore[reportArgumentType]
+            corpus_pkey,
+        )
+        await create_corpus_statistics(db_transaction, corpus_pkey)
+        set_invalidated(request, data.name)
 
-    @post(path="/create_dataset")
+    @post(path="/create_dataset", opt={INVALIDATES: True})
     async def create_dataset(
-        self, db_transaction: "AsyncSession", data: "DatasetInfo"
+        self, request: "Request", db_transaction: "AsyncSession", data: "DatasetInfo"
     ) -> None:
         """Create a new dataset in the database.
 
+        The queries of the dataset are stored in their own partition.
+
+        :param request: The request.
         :param db_transaction: A DB transaction.
         :param data: The dataset.
         :raises HTTPException: When the dataset cannot be added to the database.
         """
-        sql = insert(ORMDataset).values(
-            {
-                "name": data.name,
-                "corpus_pkey": select(ORMCorpus.pkey)
-                .filter_by(name=data.corpus_name)
-                .scalar_subquery(),
-                "relevance_threshold": data.relevance_threshold,
-            }
+        sql = (
+            insert(ORMDataset)
+            .values(
+                {
+                    "name": data.name,
+                    "corpus_pkey": select(ORMCorpus.pkey)
+                    .filter_by(name=data.corpus_name)
+                    .scalar_subquery(),
+                    "relevance_threshold": data.relevance_threshold,
+                }
+            )
+            .returning(ORMDataset.pkey, ORMDataset.corpus_pkey)
         )
 
         try:
-            await db_transaction.execute(sql)
+            dataset_pkey, corpus_pkey = (await db_transaction.execute(sql)).one()
         except IntegrityError as e:
             raise HTTPException(
                 "Failed to add dataset.",
@@ -100,187 +243,604 @@ class DataController(Controller):
                     "error_code": e.code,
                 },
             )
+        await create_partition(
+            db_transaction,
+            ORMQuery.__table__,  # pyright: ignore[reportArgumentType]
+            dataset_pkey,
+        )
+        await create_dataset_statistics(db_transaction, dataset_pkey)
+        await update_corpus_statistics(db_transaction, corpus_pkey, num_datasets=1)
+        set_invalidated(request, data.corpus_name, data.name)
 
-    @post(path="/add_queries")
+    @post(path="/add_queries", opt={INVALIDATES: True})
     async def add_queries(
         self,
         db_transaction: "AsyncSession",
         dataset_name: str,
         corpus_name: str,
         data: "Sequence[QueryInfo]",
-    ) -> None:
+    ) -> IngestResult:
         """Insert new queries into the database.
 
+        The queries are streamed into the database using the COPY protocol.
+
         :param db_transaction: A DB transaction.
         :param dataset_name: The dataset the queries belong to.
         :param corpus_name: The corpus the dataset belongs to.
         :param data: The queries to insert.
+        :raises HTTPException: When the dataset does not exist.
         :raises HTTPException: When the queries cannot be added to the database.
+        :return: The number of inserted queries and the throughput.
         """
+        start_time = time.perf_counter()
         if not data:
-            return
-
-        dataset_cte = (
-            select(ORMDataset)
-            .join(ORMCorpus)
-            .where(
-                and_(
-                    ORMDataset.name == dataset_name,
-                    ORMCorpus.name == corpus_name,
-                )
-            )
-        ).cte()
-        sql = insert(ORMQuery).values(
-            [
-                {
-                    "id": q.id,
-                    "dataset_pkey": select(dataset_cte.c.pkey),
-                    "text": q.text,
-                    "description": q.description,
-                }
-                for q in data
-            ]
+            return get_ingest_result(0, start_time)
+
+        dataset_pkey, _ = await _get_dataset_pkeys_or_404(
+            db_transaction, corpus_name, dataset_name
         )
 
         try:
-            await db_transaction.execute(sql)
-        except IntegrityError as e:
+            num_queries = await copy_queries(db_transaction, dataset_pkey, data)
+        except IntegrityConstraintViolationError as e:
             raise HTTPException(
                 "Failed to add queries.",
                 status_code=HTTP_409_CONFLICT,
-                extra={"error_code": e.code},
+                extra={"error_code": e.sqlstate},
             )
+        return get_ingest_result(num_queries, start_time)
 
-    @post(path="/add_documents")
+    @post(path="/add_documents", opt={INVALIDATES: True})
     async def add_documents(
         self,
         db_transaction: "AsyncSession",
         corpus_name: str,
         data: "Sequence[DocumentInfo]",
-    ) -> None:
+    ) -> IngestResult:
         """Insert new documents into the database.
 
+        The documents are streamed into the database using the COPY protocol.
+
         :param db_transaction: A DB transaction.
         :param corpus_name: The corpus the documents belong to.
         :param data: The documents to insert.
+        :raises HTTPException: When the corpus does not exist.
         :raises HTTPException: When the documents cannot be added to the database.
+        :return: The number of inserted documents and the throughput.
         """
+        start_time = time.perf_counter()
         if not data:
-            return
+            return get_ingest_result(0, start_time)
 
-        corpus_cte = select(ORMCorpus).where(ORMCorpus.name == corpus_name).cte()
-        sql = insert(ORMDocument).values(
-            [
-                {
-                    "id": doc.id,
-                    "corpus_pkey": select(corpus_cte.c.pkey),
-                    "title": doc.title,
-                    "text": doc.text,
-                }
-                for doc in data
-            ]
-        )
+        corpus_pkey = await _get_corpus_pkey_or_404(db_transaction, corpus_name)
 
         try:
-            await db_transaction.execute(sql)
-        except IntegrityError as e:
+            num_documents = await copy_documents(db_transaction, corpus_pkey, data)
+        except IntegrityConstraintViolationError as e:
             raise HTTPException(
                 "Failed to add documents.",
                 status_code=HTTP_409_CONFLICT,
-                extra={"error_code": e.code},
+                extra={"error_code": e.sqlstate},
             )
+        return get_ingest_result(num_documents, start_time)
 
-    @post(path="/add_qrels")
+    @post(path="/add_qrels", opt={INVALIDATES: True})
     async def add_qrels(
         self,
         db_transaction: "AsyncSession",
         dataset_name: str,
         corpus_name: str,
         data: "Sequence[QRelInfo]",
-    ) -> None:
+    ) -> QRelIngestResult:
         """Insert QRels into the database.
 
+        The QRels are staged using the COPY protocol and their query and document IDs
+        are resolved in a single join. QRels whose query or document does not exist
+        are skipped and counted as unresolved.
+
         :param db_transaction: A DB transaction.
         :param dataset_name: The dataset the QRels belong to.
         :param corpus_name: The corpus the dataset belongs to.
         :param data: The QRels to insert.
+        :raises HTTPException: When the dataset does not exist.
         :raises HTTPException: When the QRels cannot be added to the database.
+        :return: The number of inserted and unresolved QRels and the throughput.
         """
+        start_time = time.perf_counter()
         if not data:
-            return
-
-        dataset_cte = (
-            select(ORMDataset)
-            .join(ORMCorpus)
-            .where(
-                and_(
-                    ORMDataset.name == dataset_name,
-                    ORMCorpus.name == corpus_name,
-                )
+            return get_qrel_ingest_result(0, 0, start_time)
+
+        dataset_pkey, corpus_pkey = await _get_dataset_pkeys_or_404(
+            db_transaction, corpus_name, dataset_name
+        )
+
+        try:
+            num_staged = await stage_qrels(db_transaction, data)
+            num_qrels = await resolve_staged_qrels(
+                db_transaction, dataset_pkey, corpus_pkey
             )
-        ).cte()
-        sql = insert(ORMQRel).values(
-            [
-                {
-                    "query_pkey": select(ORMQuery.pkey)
-                    .where(
-                        ORMQuery.id == qrel.query_id,
-                        ORMQuery.dataset_pkey == dataset_cte.c.pkey,
+        except IntegrityError as e:
+            raise HTTPException(
+                "Failed to add QRels.",
+                status_code=HTTP_409_CONFLICT,
+                extra={"error_code": e.code},
+            )
+        return get_qrel_ingest_result(num_qrels, num_staged - num_qrels, start_time)
+
+    @post(
+        path="/add_documents_ndjson",
+        request_max_body_size=None,
+        opt={INVALIDATES: True},
+    )
+    async def add_documents_ndjson(
+        self,
+        request: "Request",
+        db_transaction: "AsyncSession",
+        corpus_name: str,
+        defer_indexes: bool = False,
+    ) -> IngestResult:
+        """Insert new documents from a streamed NDJSON request body.
+
+        Each line of the body is a document. The body is read incrementally and the
+        documents are inserted in fixed-size batches.
+
+        Deferring the indexes speeds up large loads into an empty corpus. The
+        partition of the corpus is detached while the documents are inserted and
+        its indexes are built once it is attached again, other corpora remain
+        available.
+
+        :param request: The request.
+        :param db_transaction: A DB transaction.
+        :param corpus_name: The corpus the documents belong to.
+        :param defer_indexes: Build the deferrable document indexes of the corpus once
+            at the end.
+        :raises HTTPException: When the corpus does not exist.
+        :raises HTTPException: When indexes are deferred for a corpus that is not
+            empty.
+        :raises HTTPException: When a line cannot be decoded.
+        :raises HTTPException: When the documents cannot be added to the database.
+        :return: The number of inserted documents and the throughput.
+        """
+        start_time = time.perf_counter()
+        corpus_pkey = await _get_corpus_pkey_or_404(db_transaction, corpus_name)
+
+        num_documents = 0
+        try:
+            async with (
+                _defer_partition_indexes(db_transaction, "documents", corpus_pkey)
+                if defer_indexes
+                else nullcontext()
+            ):
+                async for batch in iter_ndjson_batches(request.stream(), DocumentInfo):
+                    num_documents += await copy_documents(
+                        db_transaction, corpus_pkey, batch, detached=defer_indexes
                     )
-                    .scalar_subquery(),
-                    "document_pkey": select(ORMDocument.pkey)
-                    .where(
-                        ORMDocument.id == qrel.document_id,
-                        ORMDocument.corpus_pkey == dataset_cte.c.corpus_pkey,
+        except InvalidLineError as e:
+            raise HTTPException(
+                "Failed to decode documents.",
+                status_code=HTTP_400_BAD_REQUEST,
+                extra={"line_number": e.line_number, "error": e.error},
+            )
+        except IntegrityConstraintViolationError as e:
+            raise HTTPException(
+                "Failed to add documents.",
+                status_code=HTTP_409_CONFLICT,
+                extra={"error_code": e.sqlstate},
+            )
+        return get_ingest_result(num_documents, start_time)
+
+    @post(
+        path="/add_queries_ndjson", request_max_body_size=None, opt={INVALIDATES: True}
+    )
+    async def add_queries_ndjson(
+        self,
+        request: "Request",
+        db_transaction: "AsyncSession",
+        dataset_name: str,
+        corpus_name: str,
+        defer_indexes: bool = False,
+    ) -> IngestResult:
+        """Insert new queries from a streamed NDJSON request body.
+
+        Each line of the body is a query. The body is read incrementally and the
+        queries are inserted in fixed-size batches.
+
+        Deferring the indexes speeds up large loads into an empty dataset. The
+        partition of the dataset is detached while the queries are inserted and its
+        indexes are built once it is attached again, other datasets remain available.
+
+        :param request: The request.
+        :param db_transaction: A DB transaction.
+        :param dataset_name: The dataset the queries belong to.
+        :param corpus_name: The corpus the dataset belongs to.
+        :param defer_indexes: Build the deferrable query indexes of the dataset once at
+            the end.
+        :raises HTTPException: When the dataset does not exist.
+        :raises HTTPException: When indexes are deferred for a dataset that is not
+            empty.
+        :raises HTTPException: When a line cannot be decoded.
+        :raises HTTPException: When the queries cannot be added to the database.
+        :return: The number of inserted queries and the throughput.
+        """
+        start_time = time.perf_counter()
+        dataset_pkey, _ = await _get_dataset_pkeys_or_404(
+            db_transaction, corpus_name, dataset_name
+        )
+
+        num_queries = 0
+        try:
+            async with (
+                _defer_partition_indexes(db_transaction, "queries", dataset_pkey)
+                if defer_indexes
+                else nullcontext()
+            ):
+                async for batch in iter_ndjson_batches(request.stream(), QueryInfo):
+                    num_queries += await copy_queries(
+                        db_transaction, dataset_pkey, batch, detached=defer_indexes
                     )
-                    .scalar_subquery(),
-                    "relevance": qrel.relevance,
-                }
-                for qrel in data
-            ]
+        except InvalidLineError as e:
+            raise HTTPException(
+                "Failed to decode queries.",
+                status_code=HTTP_400_BAD_REQUEST,
+                extra={"line_number": e.line_number, "error": e.error},
+            )
+        except IntegrityConstraintViolationError as e:
+            raise HTTPException(
+                "Failed to add queries.",
+                status_code=HTTP_409_CONFLICT,
+                extra={"error_code": e.sqlstate},
+            )
+        return get_ingest_result(num_queries, start_time)
+
+    @post(path="/add_qrels_ndjson", request_max_body_size=None, opt={INVALIDATES: True})
+    async def add_qrels_ndjson(
+        self,
+        request: "Request",
+        db_transaction: "AsyncSession",
+        dataset_name: str,
+        corpus_name: str,
+    ) -> QRelIngestResult:
+        """Insert QRels from a streamed NDJSON request body.
+
+        Each line of the body is a QRel. The body is read incrementally and the QRels
+        are staged in fixed-size batches. Once the body has been read, all QRels are
+        resolved at once. QRels whose query or document does not exist are skipped
+        and counted as unresolved.
+
+        :param request: The request.
+        :param db_transaction: A DB transaction.
+        :param dataset_name: The dataset the QRels belong to.
+        :param corpus_name: The corpus the dataset belongs to.
+        :raises HTTPException: When the dataset does not exist.
+        :raises HTTPException: When a line cannot be decoded.
+        :raises HTTPException: When the QRels cannot be added to the database.
+        :return: The number of inserted and unresolved QRels and the throughput.
+        """
+        start_time = time.perf_counter()
+        dataset_pkey, corpus_pkey = await _get_dataset_pkeys_or_404(
+            db_transaction, corpus_name, dataset_name
         )
 
+        num_staged = 0
         try:
-            await db_transaction.execute(sql)
+            async for batch in iter_ndjson_batches(request.stream(), QRelInfo):
+                num_staged += await stage_qrels(db_transaction, batch)
+            if num_staged == 0:
+                return get_qrel_ingest_result(0, 0, start_time)
+            num_qrels = await resolve_staged_qrels(
+                db_transaction, dataset_pkey, corpus_pkey
+            )
+        except InvalidLineError as e:
+            raise HTTPException(
+                "Failed to decode QRels.",
+                status_code=HTTP_400_BAD_REQUEST,
+                extra={"line_number": e.line_number, "error": e.error},
+            )
         except IntegrityError as e:
             raise HTTPException(
                 "Failed to add QRels.",
                 status_code=HTTP_409_CONFLICT,
                 extra={"error_code": e.code},
             )
+        return get_qrel_ingest_result(num_qrels, num_staged - num_qrels, start_time)
+
+    @post(path="/ingest_jobs", request_max_body_size=None)
+    async def create_ingest_job(
+        self,
+        request: "Request",
+        db_transaction: "AsyncSession",
+        ingest_job_runner: "IngestJobRunner",
+        kind: "IngestJobKind",
+        corpus_name: str,
+        dataset_name: str | None = None,
+        defer_indexes: bool = False,
+    ) -> IngestJob:
+        """Create a background job that ingests items from a streamed NDJSON body.
+
+        The items are validated and spooled before this returns, the job is then run
+        in the background. Use the returned job ID to check its progress.
+
+        Deferring the indexes speeds up large loads of documents or queries into an
+        empty corpus or dataset, which is unavailable until the job has finished.
+
+        :param request: The request.
+        :param db_transaction: A DB transaction.
+        :param ingest_job_runner: The ingest job runner.
+        :param kind: What kind of items to ingest.
+        :param corpus_name: The corpus to ingest into.
+        :param dataset_name: The dataset to ingest into (queries and QRels only).
+        :param defer_indexes: Detach the (empty) target partition while the job runs
+            and build its deferrable indexes once at the end.
+        :raises HTTPException: When the dataset name is missing for queries or QRels.
+        :raises HTTPException: When the corpus or dataset does not exist.
+        :raises HTTPException: When a line cannot be decoded.
+        :return: The created job.
+        """
+        if kind == "documents":
+            await _get_corpus_pkey_or_404(db_transaction, corpus_name)
+        elif dataset_name is None:
+            raise HTTPException(
+                "A dataset is required to ingest queries or QRels.",
+                status_code=HTTP_400_BAD_REQUEST,
+                extra={"kind": kind, "dataset_name": dataset_name},
+            )
+        else:
+            await _get_dataset_pkeys_or_404(db_transaction, corpus_name, dataset_name)
+
+        try:
+            return await ingest_job_runner.create_job(
+                kind, corpus_name, dataset_name, request.stream(), defer_indexes
+            )
+        except InvalidLineError as e:
+            raise HTTPException(
+                "Failed to decode items.",
+                status_code=HTTP_400_BAD_REQUEST,
+                extra={"line_number": e.line_number, "error": e.error},
+            )
+
+    @get(path="/ingest_jobs")
+    async def get_ingest_jobs(self, db_transaction: "AsyncSession") -> list[IngestJob]:
+        """List all ingest jobs, including their progress.
+
+        Results are ordered by creation.
+
+        :param db_transaction: A DB transaction.
+        :return: The list of jobs.
+        """
+        sql = select(ORMIngestJob).order_by(ORMIngestJob.pkey)
+        result = (await db_transaction.execute(sql)).scalars()
+        return [get_ingest_job_info(job) for job in result]
 
-    @delete(path="/remove_dataset")
+    @get(path="/ingest_jobs/{job_id:int}")
+    async def get_ingest_job(
+        self, db_transaction: "AsyncSession", job_id: int
+    ) -> IngestJob:
+        """Return a single ingest job, including its progress.
+
+        :param db_transaction: A DB transaction.
+        :param job_id: The job ID.
+        :raises HTTPException: When the job does not exist.
+        :return: The job.
+        """
+        job = await db_transaction.get(ORMIngestJob, job_id)
+        if job is None:
+            raise HTTPException(
+                "Could not find the requested ingest job.",
+                status_code=HTTP_404_NOT_FOUND,
+                extra={"job_id": job_id},
+            )
+        return get_ingest_job_info(job)
+
+    @post(path="/ingest_jobs/{job_id:int}/retry")
+    async def retry_ingest_job(
+        self, ingest_job_runner: "IngestJobRunner", job_id: int
+    ) -> IngestJob:
+        """Retry a failed ingest job, which resumes from its last checkpoint.
+
+        The items of failed jobs are kept until the jobs are removed.
+
+        :param ingest_job_runner: The ingest job runner.
+        :param job_id: The job ID.
+        :raises HTTPException: When the job does not exist.
+        :raises HTTPException: When the job has not failed or its items are no longer
+            available.
+        :return: The job.
+        """
+        try:
+            job = await ingest_job_runner.retry_job(job_id)
+        except IngestJobError as e:
+            raise HTTPException(
+                "Failed to retry the ingest job.",
+                status_code=HTTP_409_CONFLICT,
+                extra={"job_id": job_id, "error": str(e)},
+            )
+        if job is None:
+            raise HTTPException(
+                "Could not find the requested ingest job.",
+                status_code=HTTP_404_NOT_FOUND,
+                extra={"job_id": job_id},
+            )
+        return job
+
+    @delete(path="/ingest_jobs/{job_id:int}")
+    async def remove_ingest_job(
+        self, ingest_job_runner: "IngestJobRunner", job_id: int
+    ) -> None:
+        """Remove a completed or failed ingest job and its spooled items.
+
+        :param ingest_job_runner: The ingest job runner.
+        :param job_id: The job ID.
+        :raises HTTPException: When the job does not exist.
+        :raises HTTPException: When the job has not finished.
+        """
+        try:
+            removed = await ingest_job_runner.remove_job(job_id)
+        except IngestJobError as e:
+            raise HTTPException(
+                "Failed to remove the ingest job.",
+                status_code=HTTP_409_CONFLICT,
+                extra={"job_id": job_id, "error": str(e)},
+            )
+        if not removed:
+            raise HTTPException(
+                "Could not find the requested ingest job.",
+                status_code=HTTP_404_NOT_FOUND,
+                extra={"job_id": job_id},
+            )
+
+    @post(path="/summary_jobs")
+    async def create_summary_job(
+        self,
+        db_transaction: "AsyncSession",
+        summary_job_runner: SummaryJobRunner,
+        openai_client: AsyncOpenAI | None,
+        model_registry: ModelRegistry,
+        corpus_name: str,
+        model_name: str,
+        dataset_name: str | None = None,
+        max_documents: int | None = None,
+        concurrency: int = SUMMARY_CONCURRENCY,
+    ) -> SummaryJob:
+        """Create a background job that summarizes the documents of a corpus.
+
+        If a dataset is given, only its judged documents are summarized, starting with
+        the ones that have the most QRels. Documents that already have a summary (for
+        the model and the current prompt template) are skipped, so a job can be
+        created again to continue or extend an earlier one. Use the returned job ID to
+        check its progress.
+
+        :param db_transaction: A DB transaction.
+        :param summary_job_runner: The summary job runner.
+        :param openai_client: An OpenAI client.
+        :param model_registry: The available models.
+        :param corpus_name: The corpus whose documents are summarized.
+        :param model_name: The model to use.
+        :param dataset_name: The dataset whose judged documents are summarized.
+        :param max_documents: The maximum number of documents to summarize.
+        :param concurrency: The number of concurrent requests to the LLM endpoint.
+        :raises HTTPException: When the concurrency or maximum number of documents is
+            not positive.
+        :raises HTTPException: When the corpus or dataset does not exist.
+        :raises HTTPException: When LLM services or the requested model are
+            unavailable.
+        :return: The created job.
+        """
+        if concurrency < 1 or (max_documents is not None and max_documents < 1):
+            raise HTTPException(
+                "The concurrency and maximum number of documents must be positive.",
+                status_code=HTTP_400_BAD_REQUEST,
+                extra={"concurrency": concurrency, "max_documents": max_documents},
+            )
+        if dataset_name is None:
+            await _get_corpus_pkey_or_404(db_transaction, corpus_name)
+        else:
+            await _get_dataset_pkeys_or_404(db_transaction, corpus_name, dataset_name)
+        await ensure_model_available(openai_client, model_registry, model_name)
+
+        return await summary_job_runner.create_job(
+            corpus_name, dataset_name, model_name, max_documents, concurrency
+        )
+
+    @get(path="/summary_jobs")
+    async def get_summary_jobs(
+        self, db_transaction: "AsyncSession"
+    ) -> list[SummaryJob]:
+        """List all summary jobs, including their progress.
+
+        Results are ordered by creation.
+
+        :param db_transaction: A DB transaction.
+        :return: The list of jobs.
+        """
+        sql = select(ORMSummaryJob).order_by(ORMSummaryJob.pkey)
+        result = (await db_transaction.execute(sql)).scalars()
+        return [get_summary_job_info(job) for job in result]
+
+    @get(path="/summary_jobs/{job_id:int}")
+    async def get_summary_job(
+        self, db_transaction: "AsyncSession", job_id: int
+    ) -> SummaryJob:
+        """Return a single summary job, including its progress.
+
+        :param db_transaction: A DB transaction.
+        :param job_id: The job ID.
+        :raises HTTPException: When the job does not exist.
+        :return: The job.
+        """
+        job = await db_transaction.get(ORMSummaryJob, job_id)
+        if job is None:
+            raise HTTPException(
+                "Could not find the requested summary job.",
+                status_code=HTTP_404_NOT_FOUND,
+                extra={"job_id": job_id},
+            )
+        return get_summary_job_info(job)
+
+    @get(path="/get_index_status")
+    async def get_index_status(
+        self, db_transaction: "AsyncSession"
+    ) -> list[IndexStatus]:
+        """Return the status and size of all indexes that can be deferred during loads.
+
+        Partitions that are detached while their indexes are deferred are listed with
+        their missing indexes, including the progress while they are built.
+
+        :param db_transaction: A DB transaction.
+        :return: The status of each index.
+        """
+        return await get_index_status_(db_transaction)
+
+    @delete(path="/remove_dataset", opt={INVALIDATES: True})
     async def remove_dataset(
         self, db_transaction: "AsyncSession", corpus_name: str, dataset_name: str
     ) -> None:
         """Remove a dataset and its associated queries and QRels.
 
+        The queries are removed by dropping the partition of the dataset.
+
         :param db_transaction: A DB transaction.
         :param corpus_name: The name of the corpus the dataset is in.
         :param dataset_name: The name of the dataset to remove.
+        :raises HTTPException: When the dataset does not exist.
         """
-        dataset_pkey = (
-            select(ORMDataset.pkey)
-            .join(ORMCorpus)
-            .where(and_(ORMDataset.name == dataset_name, ORMCorpus.name == corpus_name))
-        ).scalar_subquery()
-        sql_del_qrels = delete_(ORMQRel).where(
-            ORMQRel.query_pkey == ORMQuery.pkey, ORMQuery.dataset_pkey == dataset_pkey
+        dataset_pkey, corpus_pkey = await _get_dataset_pkeys_or_404(
+            db_transaction, corpus_name, dataset_name
+        )
+        # the relevance counts of the documents are updated in the same statement
+        cte_del_qrels = (
+            delete_(ORMQRel)
+            .filter_by(dataset_pkey=dataset_pkey)
+            .returning(ORMQRel.document_pkey, ORMQRel.relevance)
+            .cte("deleted")
+        )
+        sql_del_qrels = (
+            select(func.count())
+            .select_from(cte_del_qrels)
+            .add_cte(
+                update_num_relevant_queries(
+                    cte_del_qrels, dataset_pkey, corpus_pkey, sign=-1
+                )
+            )
         )
-        sql_del_queries = delete_(ORMQuery).filter_by(dataset_pkey=dataset_pkey)
         sql_del_dataset = delete_(ORMDataset).filter_by(pkey=dataset_pkey)
 
         await db_transaction.execute(sql_del_qrels)
-        await db_transaction.execute(sql_del_queries)
+        await drop_partition(
+            db_transaction,
+            ORMQuery.__table__,  # pyright: ignore[reportArgumentType]
+            dataset_pkey,
+        )
         await db_transaction.execute(sql_del_dataset)
+        await update_corpus_statistics(db_transaction, corpus_pkey, num_datasets=-1)
 
-    @delete(path="/remove_corpus")
+    @delete(path="/remove_corpus", opt={INVALIDATES: True})
     async def remove_corpus(
         self, db_transaction: "AsyncSession", corpus_name: str
     ) -> None:
         """Remove a corpus and its associated documents.
 
-        Any associated datasets must be removed first.
+        Any associated datasets must be removed first. The documents are removed by
+        dropping the partition of the corpus.
 
         :param db_transaction: A DB transaction.
         :param corpus_name: The name of the corpus to remove.
@@ -307,11 +867,14 @@ class DataController(Controller):
                 extra={"corpus_name": corpus_name},
             )
 
-        sql_del_documents = delete_(ORMDocument).filter_by(corpus_pkey=corpus.pkey)
         sql_del_corpus = delete_(ORMCorpus).filter_by(name=corpus_name)
 
         try:
-            await db_transaction.execute(sql_del_documents)
+            await drop_partition(
+                db_transaction,
+                ORMDocument.__table__,  # pyright: ignore[reportArgumentType]
+                corpus.pkey,
+            )
             await db_transaction.execute(sql_del_corpus)
         except IntegrityError as e:
             raise HTTPException(
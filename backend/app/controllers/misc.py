@@ -1,16 +1,23 @@
 from typing import TYPE_CHECKING
 
+from cache import TaggedStore
 from db import provide_transaction
 from db.schema import ORMCorpus
-from litestar import Controller, get
+from litestar import Controller, Request, get
 from litestar.di import Provide
-from llm import provide_client
+from litestar.exceptions import HTTPException
+from litestar.status_codes import HTTP_404_NOT_FOUND
+
+# litestar needs the type outside of the type checking block
+from llm.registry import (
+    ModelRegistry,  # noqa: TC002
+    ModelsUnavailableError,
+    provide_model_registry,
+)
 from models import (
     AvailableOptions,
+    CacheStatistics,
 )
-
-# litestar needs the type outside of the type checking block
-from openai import AsyncOpenAI  # noqa: TC002
 from sqlalchemy import (
     select,
 )
@@ -24,7 +31,7 @@ class MiscController(Controller):
 
     dependencies = {
         "db_transaction": Provide(provide_transaction),
-        "openai_client": Provide(provide_client),
+        "model_registry": Provide(provide_model_registry),
     }
 
     @get(path="/get_available_languages")
@@ -42,19 +49,22 @@ class MiscController(Controller):
     async def get_available_options(
         self,
         db_transaction: "AsyncSession",
-        openai_client: AsyncOpenAI | None,
+        model_registry: ModelRegistry,
     ) -> AvailableOptions:
         """Get available options for all settings.
 
+        The model names are empty if LLM services are not available.
+
         :param db_transaction: A DB transaction.
-        :param openai_client: An OpenAI client.
+        :param model_registry: The available models.
         :return: The available options.
         """
         model_names = []
-        if openai_client is not None:
-            for t, item in await openai_client.models.list():
-                if t == "data" and item is not None:
-                    model_names.extend([model.id for model in item])
+        if model_registry.is_available:
+            try:
+                model_names = await model_registry.get_model_names()
+            except ModelsUnavailableError:
+                pass
 
         sql = select(ORMCorpus.name)
         result = (await db_transaction.execute(sql)).scalars()
@@ -63,3 +73,19 @@ class MiscController(Controller):
             corpus_names=list(result),
             model_names=model_names,
         )
+
+    @get(path="/get_cache_statistics")
+    async def get_cache_statistics(self, request: "Request") -> CacheStatistics:
+        """Return the usage and the hit, miss, and eviction counters of the cache.
+
+        :param request: The request.
+        :raises HTTPException: When the cache does not keep statistics.
+        :return: The cache statistics.
+        """
+        store = request.app.stores.get("cache")
+        if not isinstance(store, TaggedStore):
+            raise HTTPException(
+                "The cache does not keep statistics.",
+                status_code=HTTP_404_NOT_FOUND,
+            )
+        return await store.get_statistics()
@@ -0,0 +1,594 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING
+
+import anyio
+import numpy as np
+from cache import INVALIDATES
+from cache.qrels import Qrels, get_qrels, get_qrels_key, set_qrels
+from db import provide_transaction
+from db.schema import ORMDocument, ORMQuery, ORMRun, ORMRunRanking
+from ingest import get_corpus_pkey, get_dataset_pkeys
+from litestar import Controller, MediaType, Request, delete, get, post
+from litestar.di import Provide
+from litestar.exceptions import HTTPException
+from litestar.response import Stream
+from litestar.status_codes import (
+    HTTP_400_BAD_REQUEST,
+    HTTP_404_NOT_FOUND,
+    HTTP_409_CONFLICT,
+)
+
+# litestar needs the type outside of the type checking block
+from models import (
+    Evaluation,  # noqa: TC002
+    RankedDocument,
+    Run,
+    RunComparison,
+    RunIngestResult,
+    RunPairComparison,
+    RunQuery,  # noqa: TC002
+    RunRanking,
+)
+from runs import InvalidRunLineError, iter_run_batches
+from runs.comparison import (
+    COMPARISON_MAX_CUTOFF,
+    COMPARISON_MAX_PERMUTATIONS,
+    ComparisonPool,  # noqa: TC002
+    compute_comparison,
+    load_run,
+    provide_comparison_pool,
+)
+from runs.evaluation import (
+    Metric,  # noqa: TC002
+    compute_metrics,
+    load_qrels,
+    read_run,
+)
+from runs.retrieval import iter_bm25_run
+from runs.significance import paired_t_test
+from runs.storage import (
+    decode_ranking,
+    iter_run_export,
+    resolve_staged_run,
+    stage_run,
+)
+from sqlalchemy import ARRAY, Integer, func, insert, literal, select
+from sqlalchemy import delete as delete_
+from sqlalchemy.exc import IntegrityError
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def _get_corpus_pkey_or_404(
+    db_transaction: "AsyncSession", corpus_name: str
+) -> int:
+    corpus_pkey = await get_corpus_pkey(db_transaction, corpus_name)
+    if corpus_pkey is None:
+        raise HTTPException(
+            "Could not find the requested corpus.",
+            status_code=HTTP_404_NOT_FOUND,
+            extra={"corpus_name": corpus_name},
+        )
+    return corpus_pkey
+
+
+async def _get_dataset_pkeys_or_404(
+    db_transaction: "AsyncSession", corpus_name: str, dataset_name: str
+) -> tuple[int, int]:
+    dataset_pkeys = await get_dataset_pkeys(db_transaction, corpus_name, dataset_name)
+    if dataset_pkeys is None:
+        raise HTTPException(
+            "Could not find the requested dataset.",
+            status_code=HTTP_404_NOT_FOUND,
+            extra={"corpus_name": corpus_name, "dataset_name": dataset_name},
+        )
+    return dataset_pkeys
+
+
+async def _get_qrels(
+    request: "Request",
+    db_transaction: "AsyncSession",
+    corpus_name: str,
+    dataset_name: str,
+) -> Qrels:
+    dataset_pkey, corpus_pkey = await _get_dataset_pkeys_or_404(
+        db_transaction, corpus_name, dataset_name
+    )
+    store = request.app.stores.get("qrels")
+    key = get_qrels_key(corpus_name, dataset_name)
+    qrels = await get_qrels(store, key)
+    if qrels is None:
+        qrels = await load_qrels(db_transaction, dataset_pkey, corpus_pkey)
+        await set_qrels(
+            store, key, qrels, request.app.response_cache_config.default_expiration
+        )
+    return qrels
+
+
+async def _get_run_pkey_or_404(
+    db_transaction: "AsyncSession", dataset_pkey: int, run_name: str
+) -> int:
+    sql = select(ORMRun.pkey).where(
+        ORMRun.dataset_pkey == dataset_pkey, ORMRun.name == run_name
+    )
+    run_pkey = (await db_transaction.execute(sql)).scalar_one_or_none()
+    if run_pkey is None:
+        raise HTTPException(
+            "Could not find the requested run.",
+            status_code=HTTP_404_NOT_FOUND,
+            extra={"run_name": run_name},
+        )
+    return run_pkey
+
+
+class RunsController(Controller):
+    """Controller that handles run-related API endpoints."""
+
+    dependencies = {
+        "db_transaction": Provide(provide_transaction),
+        "comparison_pool": Provide(provide_comparison_pool),
+    }
+
+    @post(path="/retrieve_run", media_type=MediaType.TEXT)
+    async def retrieve_run(
+        self,
+        db_transaction: "AsyncSession",
+        corpus_name: str,
+        dataset_name: str | None = None,
+        data: "Sequence[RunQuery] | None" = None,
+        num_results: int = 1000,
+        tag: str = "bm25",
+    ) -> Stream:
+        """Retrieve documents for many queries at once (using full-text search).
+
+        The queries are either all queries of a dataset or provided in the request
+        body. They are executed concurrently and the run is streamed in the TREC
+        format (`query_id Q0 document_id rank score tag`) as the rankings complete,
+        i.e., the queries are not in order.
+
+        :param db_transaction: A DB transaction.
+        :param corpus_name: The corpus to retrieve documents from.
+        :param dataset_name: Use all queries of this dataset.
+        :param data: The queries, if no dataset is given.
+        :param num_results: How many documents to retrieve per query.
+        :param tag: The name of the run.
+        :raises HTTPException: When not exactly one of dataset and queries is given.
+        :raises HTTPException: When the corpus or dataset does not exist.
+        :return: The run stream.
+        """
+        if (dataset_name is None) == (data is None):
+            raise HTTPException(
+                "Must provide either a dataset or queries.",
+                status_code=HTTP_400_BAD_REQUEST,
+                extra={"dataset_name": dataset_name},
+            )
+
+        if dataset_name is None:
+            corpus_pkey = await _get_corpus_pkey_or_404(db_transaction, corpus_name)
+            queries = [(query.id, query.text) for query in data or []]
+        else:
+            dataset_pkey, corpus_pkey = await _get_dataset_pkeys_or_404(
+                db_transaction, corpus_name, dataset_name
+            )
+            sql = (
+                select(ORMQuery.id, ORMQuery.text)
+                .where(ORMQuery.dataset_pkey == dataset_pkey)
+                .order_by(ORMQuery.pkey)
+            )
+            queries = [(id, text) for id, text in await db_transaction.execute(sql)]
+
+        # the transaction ends before the response, so the pool is used directly
+        engine = (await db_transaction.connection()).engine
+        return Stream(iter_bm25_run(engine, corpus_pkey, queries, num_results, tag))
+
+    @post(path="/evaluate_run", request_max_body_size=None)
+    async def evaluate_run(
+        self,
+        request: "Request",
+        db_transaction: "AsyncSession",
+        corpus_name: str,
+        dataset_name: str,
+        cutoff: int = 10,
+    ) -> Evaluation:
+        """Evaluate a run from a streamed request body in the TREC format.
+
+        The QRels of the dataset are cached as arrays, and the metrics (nDCG, MAP,
+        MRR, precision, and recall) are computed for all queries at once. All queries
+        with relevant documents are evaluated; queries missing from the run count as
+        zeros.
+
+        :param request: The request.
+        :param db_transaction: A DB transaction.
+        :param corpus_name: The corpus of the dataset.
+        :param dataset_name: The dataset whose QRels are used.
+        :param cutoff: The number of top documents per query for nDCG, precision, and
+            recall.
+        :raises HTTPException: When the cutoff is not positive.
+        :raises HTTPException: When the dataset does not exist.
+        :raises HTTPException: When a line of the run is invalid.
+        :return: The metrics.
+        """
+        if cutoff < 1:
+            raise HTTPException(
+                "The cutoff must be positive.",
+                status_code=HTTP_400_BAD_REQUEST,
+                extra={"cutoff": cutoff},
+            )
+
+        qrels = await _get_qrels(request, db_transaction, corpus_name, dataset_name)
+        try:
+            query_numbers, document_numbers, scores = await read_run(
+                request.stream(), qrels
+            )
+        except InvalidRunLineError as e:
+            raise HTTPException(
+                "Failed to read run.",
+                status_code=HTTP_400_BAD_REQUEST,
+                extra={"line_number": e.line_number, "error": e.error},
+            )
+
+        # the metrics are computed in a thread, as large runs take a while
+        evaluated, metrics = await anyio.to_thread.run_sync(
+            compute_metrics, qrels, query_numbers, document_numbers, scores, cutoff
+        )
+        return Evaluation(
+            cutoff=cutoff,
+            num_queries=len(evaluated),
+            metrics={
+                name: float(values.mean()) if len(values) else 0.0
+                for name, values in metrics.items()
+            },
+            query_metrics={
+                qrels.query_ids[query_number]: {
+                    name: float(values[i]) for name, values in metrics.items()
+                }
+                for i, query_number in enumerate(evaluated)
+            },
+        )
+
+    @get(path="/compare_runs", cache=True)
+    async def compare_runs(
+        self,
+        request: "Request",
+        db_transaction: "AsyncSession",
+        comparison_pool: ComparisonPool,
+        corpus_name: str,
+        dataset_name: str,
+        run_names: list[str],
+        metric: Metric = "ndcg",
+        cutoff: int = 10,
+        num_permutations: int = 10000,
+    ) -> RunComparison:
+        """Compare stored runs using a metric.
+
+        Each run is compared with the first run (the baseline) on all queries with
+        relevant documents: wins, ties, and losses, a paired t-test, and a
+        randomization test and a bootstrap test, which run on worker processes. The
+        rank correlations (Kendall's tau and rank-biased overlap) use the top documents
+        up to the cutoff. The comparison is cached for each set of runs and metric.
+
+        :param request: The request.
+        :param db_transaction: A DB transaction.
+        :param comparison_pool: The worker processes for the significance tests.
+        :param corpus_name: The corpus of the dataset.
+        :param dataset_name: The dataset of the runs.
+        :param run_names: The names of the runs, starting with the baseline.
+        :param metric: The metric to compare.
+        :param cutoff: The number of top documents per query for the metric (except
+            MAP and MRR) and the rank correlations.
+        :param num_permutations: The number of permutations and bootstrap samples.
+        :raises HTTPException: When the cutoff or number of permutations is not
+            positive or exceeds its maximum.
+        :raises HTTPException: When fewer than two distinct runs are given.
+        :raises HTTPException: When the dataset or a run does not exist.
+        :return: The comparison.
+        """
+        if cutoff < 1 or num_permutations < 1:
+            raise HTTPException(
+                "The cutoff and number of permutations must be positive.",
+                status_code=HTTP_400_BAD_REQUEST,
+                extra={"cutoff": cutoff, "num_permutations": num_permutations},
+            )
+        if (
+            cutoff > COMPARISON_MAX_CUTOFF
+            or num_permutations > COMPARISON_MAX_PERMUTATIONS
+        ):
+            raise HTTPException(
+                "The cutoff or number of permutations is too large.",
+                status_code=HTTP_400_BAD_REQUEST,
+                extra={
+                    "cutoff": cutoff,
+                    "num_permutations": num_permutations,
+                    "max_cutoff": COMPARISON_MAX_CUTOFF,
+                    "max_num_permutations": COMPARISON_MAX_PERMUTATIONS,
+                },
+            )
+        if len(set(run_names)) < 2 or len(set(run_names)) != len(run_names):
+            raise HTTPException(
+                "At least two distinct runs are required.",
+                status_code=HTTP_400_BAD_REQUEST,
+                extra={"run_names": run_names},
+            )
+
+        dataset_pkey, _ = await _get_dataset_pkeys_or_404(
+            db_transaction, corpus_name, dataset_name
+        )
+        run_pkeys = [
+            await _get_run_pkey_or_404(db_transaction, dataset_pkey, run_name)
+            for run_name in run_names
+        ]
+        qrels = await _get_qrels(request, db_transaction, corpus_name, dataset_name)
+        runs = [
+            await load_run(db_transaction, run_pkey, dataset_pkey, qrels, cutoff)
+            for run_pkey in run_pkeys
+        ]
+
+        evaluated, values, correlations = await anyio.to_thread.run_sync(
+            compute_comparison, qrels, runs, metric, cutoff
+        )
+        deltas = [run_values - values[0] for run_values in values[1:]]
+        p_values = await asyncio.gather(
+            *(
+                comparison_pool.test_significance(run_deltas, num_permutations)
+                for run_deltas in deltas
+            )
+        )
+
+        def nan_mean(correlations: np.ndarray) -> float | None:
+            correlations = correlations[~np.isnan(correlations)]
+            return float(correlations.mean()) if len(correlations) else None
+
+        comparisons = []
+        for run_name, run_deltas, (tau, rbo), (randomization, bootstrap) in zip(
+            run_names[1:], deltas, correlations, p_values
+        ):
+            t_statistic, t_test_p_value = paired_t_test(run_deltas)
+            comparisons.append(
+                RunPairComparison(
+                    run_name=run_name,
+                    mean_delta=float(run_deltas.mean()) if len(run_deltas) else 0.0,
+                    num_wins=int((run_deltas > 0).sum()),
+                    num_ties=int((run_deltas == 0).sum()),
+                    num_losses=int((run_deltas < 0).sum()),
+                    t_statistic=t_statistic,
+                    t_test_p_value=t_test_p_value,
+                    randomization_p_value=randomization,
+                    bootstrap_p_value=bootstrap,
+                    kendall_tau=nan_mean(tau),
+                    rank_biased_overlap=nan_mean(rbo),
+                )
+            )
+        return RunComparison(
+            metric=metric,
+            cutoff=cutoff,
+            num_queries=len(evaluated),
+            num_permutations=num_permutations,
+            metrics={
+                run_name: float(run_values.mean()) if len(run_values) else 0.0
+                for run_name, run_values in zip(run_names, values)
+            },
+            comparisons=comparisons,
+            query_metrics={
+                qrels.query_ids[query_number]: {
+                    run_name: float(run_values[i])
+                    for run_name, run_values in zip(run_names, values)
+                }
+                for i, query_number in enumerate(evaluated)
+            },
+        )
+
+    @post(path="/add_run", request_max_body_size=None, opt={INVALIDATES: True})
+    async def add_run(
+        self,
+        request: "Request",
+        db_transaction: "AsyncSession",
+        corpus_name: str,
+        dataset_name: str,
+        run_name: str,
+    ) -> RunIngestResult:
+        """Add a run from a streamed request body in the TREC format.
+
+        The lines are staged using the COPY protocol. Once the body has been read,
+        the ranking of each query is stored as a single row with arrays of documents
+        and scores. Lines whose query or document does not exist are skipped and
+        counted as unresolved.
+
+        :param request: The request.
+        :param db_transaction: A DB transaction.
+        :param corpus_name: The corpus of the dataset.
+        :param dataset_name: The dataset the run belongs to.
+        :param run_name: The name of the run.
+        :raises HTTPException: When the dataset does not exist.
+        :raises HTTPException: When a line of the run is invalid.
+        :raises HTTPException: When the run already exists.
+        :return: The number of stored and unresolved lines and the throughput.
+        """
+        start_time = time.perf_counter()
+        dataset_pkey, corpus_pkey = await _get_dataset_pkeys_or_404(
+            db_transaction, corpus_name, dataset_name
+        )
+
+        num_staged = 0
+        try:
+            sql = (
+                insert(ORMRun)
+                .values(name=run_name, dataset_pkey=dataset_pkey)
+                .returning(ORMRun.pkey)
+            )
+            run_pkey = (await db_transaction.execute(sql)).scalar_one()
+            async for batch in iter_run_batches(request.stream()):
+                num_staged += await stage_run(db_transaction, batch)
+            num_items, num_queries = 0, 0
+            if num_staged > 0:
+                num_items, num_queries = await resolve_staged_run(
+                    db_transaction, run_pkey, dataset_pkey, corpus_pkey
+                )
+        except InvalidRunLineError as e:
+            raise HTTPException(
+                "Failed to read run.",
+                status_code=HTTP_400_BAD_REQUEST,
+                extra={"line_number": e.line_number, "error": e.error},
+            )
+        except IntegrityError as e:
+            raise HTTPException(
+                "Failed to add run.",
+                status_code=HTTP_409_CONFLICT,
+                extra={"error_code": e.code},
+            )
+
+        duration = time.perf_counter() - start_time
+        return RunIngestResult(
+            num_items=num_items,
+            duration=duration,
+            items_per_second=num_items / duration if duration > 0 else 0.0,
+            num_queries=num_queries,
+            num_unresolved=num_staged - num_items,
+        )
+
+    @get(path="/get_runs", cache=True)
+    async def get_runs(
+        self, db_transaction: "AsyncSession", corpus_name: str, dataset_name: str
+    ) -> list[Run]:
+        """List all runs of a dataset.
+
+        :param db_transaction: A DB transaction.
+        :param corpus_name: The corpus of the dataset.
+        :param dataset_name: The dataset.
+        :raises HTTPException: When the dataset does not exist.
+        :return: The runs.
+        """
+        dataset_pkey, _ = await _get_dataset_pkeys_or_404(
+            db_transaction, corpus_name, dataset_name
+        )
+        sql = (
+            select(ORMRun.name, ORMRun.num_queries, ORMRun.num_items)
+            .where(ORMRun.dataset_pkey == dataset_pkey)
+            .order_by(ORMRun.name)
+        )
+        return [
+            Run(
+                name=name,
+                corpus_name=corpus_name,
+                dataset_name=dataset_name,
+                num_queries=num_queries,
+                num_items=num_items,
+            )
+            for name, num_queries, num_items in await db_transaction.execute(sql)
+        ]
+
+    @get(path="/get_run_ranking", cache=True)
+    async def get_run_ranking(
+        self,
+        db_transaction: "AsyncSession",
+        corpus_name: str,
+        dataset_name: str,
+        run_name: str,
+        query_id: str,
+        num_results: int | None = None,
+    ) -> RunRanking:
+        """Return the ranking of a run for a query.
+
+        The ranking is a single row, only the IDs of the returned documents are looked
+        up.
+
+        :param db_transaction: A DB transaction.
+        :param corpus_name: The corpus of the dataset.
+        :param dataset_name: The dataset of the run.
+        :param run_name: The name of the run.
+        :param query_id: The query.
+        :param num_results: How many top documents to return (all if None).
+        :raises HTTPException: When the dataset, run, or ranking does not exist.
+        :return: The ranked documents with their scores.
+        """
+        dataset_pkey, corpus_pkey = await _get_dataset_pkeys_or_404(
+            db_transaction, corpus_name, dataset_name
+        )
+        run_pkey = await _get_run_pkey_or_404(db_transaction, dataset_pkey, run_name)
+        sql = (
+            select(ORMRunRanking.document_pkeys, ORMRunRanking.scores)
+            .join(ORMQuery, ORMQuery.pkey == ORMRunRanking.query_pkey)
+            .where(
+                ORMRunRanking.run_pkey == run_pkey,
+                ORMQuery.dataset_pkey == dataset_pkey,
+                ORMQuery.id == query_id,
+            )
+        )
+        ranking = (await db_transaction.execute(sql)).one_or_none()
+        if ranking is None:
+            raise HTTPException(
+                "Could not find the requested ranking.",
+                status_code=HTTP_404_NOT_FOUND,
+                extra={"run_name": run_name, "query_id": query_id},
+            )
+
+        document_pkeys, scores = decode_ranking(*ranking)
+        document_pkeys = document_pkeys[:num_results].tolist()
+        sql_ids = select(ORMDocument.pkey, ORMDocument.id).where(
+            ORMDocument.corpus_pkey == corpus_pkey,
+            ORMDocument.pkey == func.any(literal(document_pkeys, ARRAY(Integer))),
+        )
+        document_ids = dict((await db_transaction.execute(sql_ids)).tuples().all())
+        return RunRanking(
+            query_id=query_id,
+            items=[
+                RankedDocument(id=document_ids[pkey], score=score)
+                for pkey, score in zip(document_pkeys, scores.tolist())
+            ],
+        )
+
+    @get(path="/export_run", media_type=MediaType.TEXT)
+    async def export_run(
+        self,
+        db_transaction: "AsyncSession",
+        corpus_name: str,
+        dataset_name: str,
+        run_name: str,
+    ) -> Stream:
+        """Export a run in the TREC format.
+
+        The run is streamed, one batch of queries at a time.
+
+        :param db_transaction: A DB transaction.
+        :param corpus_name: The corpus of the dataset.
+        :param dataset_name: The dataset of the run.
+        :param run_name: The name of the run.
+        :raises HTTPException: When the dataset or run does not exist.
+        :return: The run stream.
+        """
+        dataset_pkey, corpus_pkey = await _get_dataset_pkeys_or_404(
+            db_transaction, corpus_name, dataset_name
+        )
+        run_pkey = await _get_run_pkey_or_404(db_transaction, dataset_pkey, run_name)
+
+        # the transaction ends before the response, so the pool is used directly
+        engine = (await db_transaction.connection()).engine
+        return Stream(
+            iter_run_export(engine, run_pkey, dataset_pkey, corpus_pkey, run_name)
+        )
+
+    @delete(path="/remove_run", opt={INVALIDATES: True})
+    async def remove_run(
+        self,
+        db_transaction: "AsyncSession",
+        corpus_name: str,
+        dataset_name: str,
+        run_name: str,
+    ) -> None:
+        """Remove a run and its rankings.
+
+        :param db_transaction: A DB transaction.
+        :param corpus_name: The corpus of the dataset.
+        :param dataset_name: The dataset of the run.
+        :param run_name: The name of the run.
+        :raises HTTPException: When the dataset or run does not exist.
+        """
+        dataset_pkey, _ = await _get_dataset_pkeys_or_404(
+            db_transaction, corpus_name, dataset_name
+        )
+        run_pkey = await _get_run_pkey_or_404(db_transaction, dataset_pkey, run_name)
+        # the rankings are removed by the foreign key
+        await db_transaction.execute(delete_(ORMRun).where(ORMRun.pkey == run_pkey))
@@ -1,8 +1,17 @@
+from array import array
 from typing import TYPE_CHECKING
 
-from db import provide_transaction
+from cache.rankings import (
+    SEARCH_RANKING_SIZE,
+    Ranking,
+    get_ranking,
+    get_ranking_key,
+    set_ranking,
+)
+from db import provide_read_transaction
 from db.schema import ORMCorpus, ORMDocument
-from litestar import Controller, get
+from db.snapshots import CountMode, execute_with_count
+from litestar import Controller, Request, get
 from litestar.di import Provide
 from litestar.exceptions import HTTPException
 from litestar.response import Stream
@@ -12,6 +21,10 @@ from litestar.status_codes import (
     HTTP_500_INTERNAL_SERVER_ERROR,
 )
 from llm import ensure_model_available, provide_client
+from llm.registry import (
+    ModelRegistry,  # noqa: TC002
+    provide_model_registry,
+)
 from llm.util import get_rag_prompt
 from models import (
     DocumentSearchHit,
@@ -30,35 +43,82 @@ from sqlalchemy import (
 )
 
 if TYPE_CHECKING:
+    from sqlalchemy import ColumnElement, Select
     from sqlalchemy.ext.asyncio import AsyncSession
 
 # TODO: remove pyright ignores once sqlalchemy-paradedb matures
 
+_SNIPPET_START_TAG = "\x1eHIGHLIGHT_START\x1f"
+_SNIPPET_END_TAG = "\x1eHIGHLIGHT_END\x1f"
+
+
+def _snippet() -> "ColumnElement[str]":
+    return pdb.snippet(
+        ORMDocument.text,  # pyright: ignore[reportArgumentType]
+        start_tag=_SNIPPET_START_TAG,
+        end_tag=_SNIPPET_END_TAG,
+        max_num_chars=500,
+    )
+
+
+async def _compute_ranking(
+    db_transaction: "AsyncSession", where_clause: "list[ColumnElement[bool]]"
+) -> Ranking:
+    sql = (
+        select(  # pyright: ignore[reportCallIssue]
+            ORMDocument.pkey,
+            ORMDocument.corpus_pkey,
+            pdb.score(ORMDocument.pkey).label("score"),  # pyright: ignore[reportArgumentType,reportAttributeAccessIssue]
+        )
+        .where(and_(*where_clause))
+        .order_by(desc("score"))
+        .order_by(ORMDocument.pkey)
+        .limit(SEARCH_RANKING_SIZE)
+    )
+    ranking = Ranking(None, array("i"), array("i"), array("f"))
+    for pkey, corpus_pkey, score in await db_transaction.execute(sql):
+        ranking.pkeys.append(pkey)
+        ranking.corpus_pkeys.append(corpus_pkey)
+        ranking.scores.append(score)
+    # a ranking that is not full contains all hits
+    if len(ranking.pkeys) < SEARCH_RANKING_SIZE:
+        ranking.total_num_hits = len(ranking.pkeys)
+    return ranking
+
 
 class SearchController(Controller):
     """Controller that handles search-related API endpoints."""
 
     dependencies = {
-        "db_transaction": Provide(provide_transaction),
+        "db_transaction": Provide(provide_read_transaction),
         "openai_client": Provide(provide_client),
+        "model_registry": Provide(provide_model_registry),
     }
 
     @get(path="/search_documents", cache=True)
     async def search_documents(
         self,
+        request: "Request",
         db_transaction: "AsyncSession",
         q: str,
         corpus_name: list[str] | None = None,
         num_results: int = 10,
         offset: int = 0,
+        count_mode: CountMode = "exact",
     ) -> Paginated[DocumentSearchHit]:
         """Search documents (using full-text search).
 
+        The top hits (see `SEARCH_RANKING_SIZE`) are computed once for each query and
+        cached, so that pages within them only need to fetch their snippets.
+
+        :param request: The request.
         :param db_transaction: A DB transaction.
         :param q: The search query.
         :param corpus_name: Search only within these corpora.
         :param num_results: How many hits to return.
         :param offset: Offset for pagination.
+        :param count_mode: How to count all hits, "estimate" and "capped"
+            are exact only up to a limit, "none" skips the count.
         :return: Paginated list of results, ordered by score.
         """
         where_clause = [
@@ -68,23 +128,36 @@ class SearchController(Controller):
             corpus_pkeys_sq = select(ORMCorpus.pkey).where(
                 ORMCorpus.name.in_(corpus_name)
             )
-            where_clause.append(ORMDocument.corpus_pkey.in_(corpus_pkeys_sq))
+            # "= ANY(ARRAY(...))" is evaluated once, so that the partitions of other
+            # corpora are skipped, unlike a semi-join with "IN (...)"
+            where_clause.append(
+                ORMDocument.corpus_pkey
+                == func.any(func.array(corpus_pkeys_sq.scalar_subquery()))
+            )
 
         # count the total number of hits
         sql_count = select(func.count(ORMDocument.pkey)).where(and_(*where_clause))
 
+        if offset + num_results <= SEARCH_RANKING_SIZE:
+            return await self._search_documents_in_ranking(
+                request,
+                db_transaction,
+                q,
+                corpus_name,
+                where_clause,
+                sql_count,
+                num_results,
+                offset,
+                count_mode,
+            )
+
         # results for the current page only
         sql_results_sq = (
             select(  # pyright: ignore[reportCallIssue]
                 ORMDocument.id,
                 ORMDocument.corpus_pkey,
                 pdb.score(ORMDocument.pkey).label("score"),  # pyright: ignore[reportArgumentType,reportAttributeAccessIssue]
-                pdb.snippet(
-                    ORMDocument.text,  # pyright: ignore[reportArgumentType]
-                    start_tag="\x1eHIGHLIGHT_START\x1f",
-                    end_tag="\x1eHIGHLIGHT_END\x1f",
-                    max_num_chars=500,
-                ),
+                _snippet(),
             )
             .where(and_(*where_clause))
             .order_by(desc("score"))
@@ -100,8 +173,9 @@ class SearchController(Controller):
             .order_by(desc("score"))
         )
 
-        total_num_results = (await db_transaction.execute(sql_count)).scalar_one()
-        results = (await db_transaction.execute(sql_results)).all()
+        results, total_num_results, is_exact = await execute_with_count(
+            db_transaction, sql_results, sql_count, count_mode
+        )
         return Paginated[DocumentSearchHit](
             items=[
                 DocumentSearchHit(
@@ -114,6 +188,80 @@ class SearchController(Controller):
             ],
             offset=offset,
             total_num_items=total_num_results,
+            is_exact=is_exact,
+        )
+
+    async def _search_documents_in_ranking(
+        self,
+        request: "Request",
+        db_transaction: "AsyncSession",
+        q: str,
+        corpus_names: list[str] | None,
+        where_clause: "list[ColumnElement[bool]]",
+        sql_count: "Select",
+        num_results: int,
+        offset: int,
+        count_mode: CountMode,
+    ) -> Paginated[DocumentSearchHit]:
+        store = request.app.stores.get("rankings")
+        key = get_ranking_key(q, corpus_names)
+        ranking = await get_ranking(store, key)
+        is_modified = ranking is None
+        if ranking is None:
+            ranking = await _compute_ranking(db_transaction, where_clause)
+
+        page = slice(offset, offset + num_results)
+        pkeys = ranking.pkeys[page]
+        # the match is required for the snippets
+        sql = (
+            select(ORMDocument.pkey, ORMDocument.id, _snippet(), ORMCorpus.name)
+            .join(ORMCorpus)
+            .where(
+                *where_clause,
+                ORMDocument.corpus_pkey.in_(set(ranking.corpus_pkeys[page])),
+                ORMDocument.pkey.in_(list(pkeys)),
+            )
+        )
+        # an exact count is stored with the ranking and serves all count modes
+        if ranking.total_num_hits is None:
+            results, total_num_hits, is_exact = await execute_with_count(
+                db_transaction, sql, sql_count, count_mode
+            )
+            if is_exact:
+                ranking.total_num_hits = total_num_hits
+                is_modified = True
+        else:
+            results = await db_transaction.execute(sql)
+            total_num_hits, is_exact = ranking.total_num_hits, True
+        if is_modified:
+            await set_ranking(
+                store,
+                key,
+                ranking,
+                request.app.response_cache_config.default_expiration,
+            )
+        snippets = {
+            pkey: (id, snippet, corpus_name)
+            for pkey, id, snippet, corpus_name in results
+        }
+
+        items = []
+        for pkey, score in zip(pkeys, ranking.scores[page]):
+            if pkey not in snippets:
+                continue
+            id, snippet, corpus_name = snippets[pkey]
+            items.append(
+                DocumentSearchHit(
+                    id=id, corpus_name=corpus_name, snippet=snippet, score=score
+                )
+            )
+        if count_mode == "none":
+            total_num_hits, is_exact = None, False
+        return Paginated[DocumentSearchHit](
+            items=items,
+            offset=offset,
+            total_num_items=total_num_hits,
+            is_exact=is_exact,
         )
 
     @get(path="/get_answer", cache=True, media_type="text/event-stream")
@@ -121,6 +269,7 @@ class SearchController(Controller):
         self,
         db_transaction: "AsyncSession",
         openai_client: AsyncOpenAI | None,
+        model_registry: ModelRegistry,
         model_name: str,
         q: str,
         corpus_name: list[str],
@@ -130,6 +279,7 @@ class SearchController(Controller):
 
         :param db_transaction: A DB transaction.
         :param openai_client: An OpenAI client.
+        :param model_registry: The available models.
         :param model_name: The model to use.
         :param q: The search query/question.
         :param corpus_name: Corpus identifiers for the corresponding documents.
@@ -168,7 +318,9 @@ class SearchController(Controller):
                 extra={"documents": missing_documents},
             )
 
-        openai_client = await ensure_model_available(openai_client, model_name)
+        openai_client = await ensure_model_available(
+            openai_client, model_registry, model_name
+        )
         doc_inputs = [documents[key] for key in document_keys]
         try:
             stream = await openai_client.completions.create(
@@ -36,6 +36,24 @@ async def provide_transaction(
         ) from exc
 
 
+async def provide_read_transaction(
+    db_session: "AsyncSession",
+) -> "AsyncGenerator[AsyncSession, None]":
+    """Provide a database transaction that sees a single snapshot of the data.
+
+    All statements of a repeatable read transaction see the same snapshot, which can be
+    shared with other transactions (see `execute_with_count`).
+
+    :param db_session: Asynchronous DB session.
+    :yield: The DB transaction.
+    """
+    async with db_session.begin():
+        await db_session.connection(
+            execution_options={"isolation_level": "REPEATABLE READ"}
+        )
+        yield db_session
+
+
 CONFIG = SQLAlchemyAsyncConfig(
     connection_string=URL.create(
         drivername="postgresql+asyncpg",
@@ -0,0 +1,101 @@
+import os
+from typing import TYPE_CHECKING
+
+from sqlalchemy import column, exists, func, select, table, update
+
+if TYPE_CHECKING:
+    from sqlalchemy import ColumnElement, Exists, Select, Update
+    from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+    from db.schema import ORMIngestJob, ORMSummaryJob
+
+JOB_RESCAN_INTERVAL = int(os.environ.get("JOB_RESCAN_INTERVAL", "60"))
+
+_PG_STAT_ACTIVITY = table("pg_stat_activity", column("pid"))
+
+
+async def open_runner_connection(
+    engine: "AsyncEngine",
+) -> tuple["AsyncConnection", int]:
+    """Open the connection that identifies a job runner while its process is alive.
+
+    Jobs are claimed with the backend PID of this connection, so that the jobs of a
+    runner whose process has died (and whose connection has been closed) can be
+    claimed by other runners.
+
+    :param engine: The engine of the job runner.
+    :return: The connection and its backend PID.
+    """
+    connection = await engine.connect()
+    pid = (await connection.execute(select(func.pg_backend_pid()))).scalar_one()
+    await connection.commit()
+    return connection, pid
+
+
+def is_runner_alive(runner_pid: "ColumnElement[int]") -> "Exists":
+    """Return whether the job runner (or other owner) with a backend PID still exists.
+
+    :param runner_pid: The backend PID of the connection of the runner.
+    :return: The condition.
+    """
+    return exists().where(_PG_STAT_ACTIVITY.c.pid == runner_pid)
+
+
+def select_orphaned_jobs(
+    orm_class: "type[ORMIngestJob] | type[ORMSummaryJob]",
+    running_statuses: tuple[str, ...] = ("running",),
+) -> "Select[tuple[int]]":
+    """Return a statement that selects unfinished jobs whose runner no longer exists.
+
+    These are the jobs that have been created or claimed by the runner of a process
+    that has died, they can be claimed by other runners (see `claim_job`).
+
+    :param orm_class: The ORM class of the jobs.
+    :param running_statuses: The statuses of jobs that are run by a runner.
+    :return: The select statement for the primary keys of the jobs.
+    """
+    return (
+        select(orm_class.pkey)
+        .where(
+            orm_class.status.in_(("pending", *running_statuses)),
+            ~is_runner_alive(orm_class.runner_pid),
+        )
+        .order_by(orm_class.pkey)
+    )
+
+
+def claim_job(
+    orm_class: "type[ORMIngestJob] | type[ORMSummaryJob]",
+    job_pkey: int,
+    runner_pid: int,
+    running_statuses: tuple[str, ...] = ("running",),
+) -> "Update":
+    """Return a statement that claims a job for a runner, returning the job.
+
+    Pending jobs and the running jobs of runners that no longer exist can be claimed,
+    nothing is returned for other jobs. Jobs that are being claimed concurrently are
+    skipped, so that each job is claimed by a single runner.
+
+    :param orm_class: The ORM class of the jobs.
+    :param job_pkey: The job to claim.
+    :param runner_pid: The backend PID of the connection of the runner.
+    :param running_statuses: The statuses of jobs that are run by a runner.
+    :return: The update statement.
+    """
+    is_claimable = (orm_class.status == "pending") | (
+        orm_class.status.in_(running_statuses) & ~is_runner_alive(orm_class.runner_pid)
+    )
+    # the subquery must not be correlated with the updated table
+    sql_claimable = (
+        select(orm_class.pkey)
+        .where(orm_class.pkey == job_pkey, is_claimable)
+        .with_for_update(skip_locked=True)
+        .correlate(None)
+        .scalar_subquery()
+    )
+    return (
+        update(orm_class)
+        .where(orm_class.pkey == sql_claimable)
+        .values(status="running", runner_pid=runner_pid)
+        .returning(orm_class)
+    )
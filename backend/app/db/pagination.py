@@ -0,0 +1,96 @@
+import base64
+from typing import TYPE_CHECKING
+
+from msgspec import MsgspecError
+from msgspec.json import Decoder, Encoder
+from sqlalchemy import UnaryExpression, and_, or_
+from sqlalchemy.sql import operators
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from sqlalchemy import ColumnElement
+
+# a cursor identifies the order it was created for and the sort key of the last item
+_ENCODER = Encoder()
+_DECODER = Decoder(tuple[str, list[int | float]])
+
+
+def get_sort_key(
+    order_by_clause: "Sequence[ColumnElement]",
+) -> list[tuple["ColumnElement", bool]]:
+    """Return the columns of an order and whether they are descending.
+
+    The columns need to be selected to create a cursor for the last item of a page.
+
+    :param order_by_clause: The expressions of the ORDER BY clause.
+    :return: The columns (without direction) and whether they are descending.
+    """
+    sort_key = []
+    for clause in order_by_clause:
+        if isinstance(clause, UnaryExpression) and clause.modifier in (
+            operators.asc_op,
+            operators.desc_op,
+        ):
+            sort_key.append((clause.element, clause.modifier is operators.desc_op))
+        else:
+            sort_key.append((clause, False))
+    return sort_key
+
+
+def encode_cursor(order: str, key: "Sequence[int | float]") -> str:
+    """Encode the sort key of the last item of a page as an opaque cursor.
+
+    :param order: Identifies the order of the items, e.g., by the order parameters.
+    :param key: The values of the sort key columns for the last item.
+    :return: The cursor.
+    """
+    return base64.urlsafe_b64encode(_ENCODER.encode((order, list(key)))).decode()
+
+
+def decode_cursor(cursor: str, order: str) -> list[int | float]:
+    """Decode a cursor created by `encode_cursor`.
+
+    :param cursor: The cursor.
+    :param order: Identifies the order of the items, must be the same as for the cursor.
+    :raises ValueError: When the cursor is invalid or was created for another order.
+    :return: The values of the sort key columns.
+    """
+    try:
+        cursor_order, key = _DECODER.decode(base64.urlsafe_b64decode(cursor))
+    except (ValueError, MsgspecError) as e:
+        raise ValueError("Invalid cursor.") from e
+    if cursor_order != order:
+        raise ValueError("The cursor was created for a different order.")
+    return key
+
+
+def seek_predicate(
+    order_by_clause: "Sequence[ColumnElement]", key: "Sequence[int | float]"
+) -> "ColumnElement[bool]":
+    """Select the items that come after a sort key (keyset pagination).
+
+    Unlike an offset, the predicate can be evaluated using an index on the sort key,
+    so that the time to fetch a page does not depend on its position. The order must be
+    total, i.e., end with unique columns.
+
+    :param order_by_clause: The expressions of the ORDER BY clause, in ascending or
+        descending direction.
+    :param key: The values of the sort key columns for the last item of a page.
+    :raises ValueError: When the number of values does not match.
+    :return: The predicate.
+    """
+    sort_key = get_sort_key(order_by_clause)
+    if len(sort_key) != len(key):
+        raise ValueError("The cursor does not match the order.")
+
+    # (a, b) > (x, y) <=> a > x or (a = x and b > y), for any mix of directions
+    predicates = []
+    for i, ((column, descending), value) in enumerate(zip(sort_key, key)):
+        predicates.append(
+            and_(
+                *(c == v for (c, _), v in zip(sort_key[:i], key[:i])),
+                column < value if descending else column > value,
+            )
+        )
+    return or_(*predicates)
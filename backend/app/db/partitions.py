@@ -0,0 +1,88 @@
+from typing import TYPE_CHECKING
+
+from sqlalchemy import select, text
+
+from db.schema import ORMCorpus, ORMDataset
+
+if TYPE_CHECKING:
+    from sqlalchemy import ScalarSelect, Table
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def get_partition_name(table: "Table", key: int) -> str:
+    """Return the name of the partition of a table for a partition key value.
+
+    :param table: The partitioned table.
+    :param key: The partition key value.
+    :return: The partition name.
+    """
+    return f"{table.name}_{int(key)}"
+
+
+async def create_partition(
+    db_transaction: "AsyncSession", table: "Table", key: int
+) -> None:
+    """Create the partition of a list-partitioned table for a partition key value.
+
+    Indexes of the partitioned table are created on the partition automatically.
+
+    :param db_transaction: A DB transaction.
+    :param table: The partitioned table.
+    :param key: The partition key value.
+    """
+    await db_transaction.execute(
+        text(
+            f"CREATE TABLE {get_partition_name(table, key)} "
+            f"PARTITION OF {table.name} FOR VALUES IN ({int(key)})"
+        )
+    )
+
+
+async def drop_partition(
+    db_transaction: "AsyncSession", table: "Table", key: int
+) -> None:
+    """Detach and drop the partition of a table for a partition key value.
+
+    All rows of the partition are removed at once. Rows in other tables that reference
+    the partition must be removed first.
+
+    :param db_transaction: A DB transaction.
+    :param table: The partitioned table.
+    :param key: The partition key value.
+    """
+    name = get_partition_name(table, key)
+    # partitions referenced by foreign keys must be detached before they are dropped
+    await db_transaction.execute(
+        text(f"ALTER TABLE {table.name} DETACH PARTITION {name}")
+    )
+    await db_transaction.execute(text(f"DROP TABLE {name}"))
+
+
+def corpus_pkey_subquery(corpus_name: str) -> "ScalarSelect[int]":
+    """Select the primary key of a corpus.
+
+    Filtering documents by this (rather than by a join on the corpus name) allows
+    the planner to skip the partitions of all other corpora.
+
+    :param corpus_name: The name of the corpus.
+    :return: The scalar subquery.
+    """
+    return select(ORMCorpus.pkey).where(ORMCorpus.name == corpus_name).scalar_subquery()
+
+
+def dataset_pkey_subquery(corpus_name: str, dataset_name: str) -> "ScalarSelect[int]":
+    """Select the primary key of a dataset.
+
+    Filtering queries by this (rather than by a join on the dataset name) allows the
+    planner to skip the partitions of all other datasets.
+
+    :param corpus_name: The name of the corpus the dataset belongs to.
+    :param dataset_name: The name of the dataset.
+    :return: The scalar subquery.
+    """
+    return (
+        select(ORMDataset.pkey)
+        .join(ORMCorpus)
+        .where(ORMDataset.name == dataset_name, ORMCorpus.name == corpus_name)
+        .scalar_subquery()
+    )
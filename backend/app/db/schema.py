@@ -1,10 +1,16 @@
+# sqlalchemy needs the type outside of the type checking block
+from datetime import datetime  # noqa: TC003
+
 from paradedb.sqlalchemy import indexing, tokenizer
 from sqlalchemy import (
+    BigInteger,
     Column,
     Computed,
     ForeignKey,
+    ForeignKeyConstraint,
     Index,
     Integer,
+    LargeBinary,
     UniqueConstraint,
     func,
 )
@@ -31,6 +37,22 @@ class ORMCorpus(ORMBase):
     __tablename__ = "corpora"
 
 
+class ORMCorpusStatistics(ORMBase):
+    """ORM class representing the statistics of a corpus.
+
+    The statistics are updated whenever documents or datasets are added or removed.
+    """
+
+    corpus_pkey: Mapped[int] = mapped_column(
+        ForeignKey("corpora.pkey", ondelete="CASCADE"), primary_key=True
+    )
+    num_documents: Mapped[int] = mapped_column(BigInteger, default=0)
+    num_datasets: Mapped[int] = mapped_column(default=0)
+    text_size: Mapped[int] = mapped_column(BigInteger, default=0)
+
+    __tablename__ = "corpus_statistics"
+
+
 class ORMDataset(ORMBase):
     """ORM class representing a dataset."""
 
@@ -46,32 +68,90 @@ class ORMDataset(ORMBase):
     __table_args__ = (UniqueConstraint("name", "corpus_pkey"),)
 
 
+class ORMDatasetStatistics(ORMBase):
+    """ORM class representing the statistics of a dataset.
+
+    The statistics are updated whenever queries or QRels are added. The relevance range
+    is None as long as the dataset has no QRels.
+    """
+
+    dataset_pkey: Mapped[int] = mapped_column(
+        ForeignKey("datasets.pkey", ondelete="CASCADE"), primary_key=True
+    )
+    num_queries: Mapped[int] = mapped_column(default=0)
+    num_qrels: Mapped[int] = mapped_column(BigInteger, default=0)
+    min_relevance: Mapped[int] = mapped_column(nullable=True)
+    max_relevance: Mapped[int] = mapped_column(nullable=True)
+
+    __tablename__ = "dataset_statistics"
+
+
+class ORMDatasetRelevanceCount(ORMBase):
+    """ORM class representing the number of QRels of a dataset with a relevance grade.
+
+    Together, these rows form the relevance histogram of a dataset.
+    """
+
+    dataset_pkey: Mapped[int] = mapped_column(
+        ForeignKey("datasets.pkey", ondelete="CASCADE"), primary_key=True
+    )
+    relevance: Mapped[int] = mapped_column(primary_key=True)
+    num_qrels: Mapped[int] = mapped_column(BigInteger, default=0)
+
+    __tablename__ = "dataset_relevance_counts"
+
+
 class ORMQuery(ORMBase):
-    """ORM class representing a query."""
+    """ORM class representing a query.
+
+    The table is partitioned by dataset, see `create_partition`. The number of relevant
+    documents is updated whenever QRels are added.
+    """
 
     pkey: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
 
     id: Mapped[str] = mapped_column(index=True)
-    dataset_pkey: Mapped[int] = mapped_column(ForeignKey("datasets.pkey"), index=True)
+    # the partition key must be part of the primary key
+    dataset_pkey: Mapped[int] = mapped_column(
+        ForeignKey("datasets.pkey"), primary_key=True
+    )
     text: Mapped[str] = mapped_column()
     description: Mapped[str] = mapped_column(nullable=True)
+    num_relevant_documents: Mapped[int] = mapped_column(server_default="0")
 
     dataset: Mapped["ORMDataset"] = relationship()
     qrels: Mapped[list["ORMQRel"]] = relationship(back_populates="query")
 
     __tablename__ = "queries"
-    __table_args__ = (UniqueConstraint(id, dataset_pkey),)
+    __table_args__ = (
+        UniqueConstraint(id, dataset_pkey),
+        Index(
+            "ix_queries_relevant_documents",
+            dataset_pkey,
+            num_relevant_documents,
+            pkey,
+        ),
+        {"postgresql_partition_by": "LIST (dataset_pkey)"},
+    )
 
 
 class ORMDocument(ORMBase):
-    """ORM class representing a document."""
+    """ORM class representing a document.
+
+    The table is partitioned by corpus, see `create_partition`. The number of relevant
+    queries (in all datasets) is updated whenever QRels are added or removed.
+    """
 
     pkey: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
 
     id: Mapped[str] = mapped_column(index=True)
-    corpus_pkey: Mapped[int] = mapped_column(ForeignKey("corpora.pkey"), index=True)
+    # the partition key must be part of the primary key
+    corpus_pkey: Mapped[int] = mapped_column(
+        ForeignKey("corpora.pkey"), primary_key=True
+    )
     title: Mapped[str] = mapped_column(nullable=True)
     text: Mapped[str] = mapped_column()
+    num_relevant_queries: Mapped[int] = mapped_column(server_default="0")
 
     text_length = Column(Integer, Computed(func.length(text)), index=True)
 
@@ -82,24 +162,166 @@ class ORMDocument(ORMBase):
     __table_args__ = (
         UniqueConstraint(id, corpus_pkey),
         Index("ix_documents_length", corpus_pkey, text_length),
+        Index("ix_documents_relevant_queries", corpus_pkey, num_relevant_queries, pkey),
+        {"postgresql_partition_by": "LIST (corpus_pkey)"},
     )
 
 
 class ORMQRel(ORMBase):
-    """ORM class representing a query relevance judgment (QRel)."""
+    """ORM class representing a query relevance judgment (QRel).
 
-    query_pkey: Mapped[str] = mapped_column(
-        ForeignKey("queries.pkey"), primary_key=True, index=True
-    )
-    document_pkey: Mapped[str] = mapped_column(
-        ForeignKey("documents.pkey"), primary_key=True, index=True
-    )
+    The partition keys of the query and document are stored as well, since foreign
+    keys to partitioned tables must include them.
+    """
+
+    query_pkey: Mapped[int] = mapped_column(primary_key=True, index=True)
+    document_pkey: Mapped[int] = mapped_column(primary_key=True, index=True)
+    dataset_pkey: Mapped[int] = mapped_column(index=True)
+    corpus_pkey: Mapped[int] = mapped_column(index=True)
     relevance: Mapped[int] = mapped_column()
 
     query: Mapped["ORMQuery"] = relationship(back_populates="qrels")
     document: Mapped["ORMDocument"] = relationship(back_populates="qrels")
 
     __tablename__ = "qrels"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            [query_pkey, dataset_pkey], ["queries.pkey", "queries.dataset_pkey"]
+        ),
+        ForeignKeyConstraint(
+            [document_pkey, corpus_pkey], ["documents.pkey", "documents.corpus_pkey"]
+        ),
+    )
+
+
+class ORMRun(ORMBase):
+    """ORM class representing a run, i.e., rankings of documents for a dataset.
+
+    The number of ranked queries and documents is computed when the run is added.
+    """
+
+    pkey: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    name: Mapped[str] = mapped_column()
+    dataset_pkey: Mapped[int] = mapped_column(
+        ForeignKey("datasets.pkey", ondelete="CASCADE")
+    )
+    num_queries: Mapped[int] = mapped_column(default=0)
+    num_items: Mapped[int] = mapped_column(BigInteger, default=0)
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+    __tablename__ = "runs"
+    __table_args__ = (UniqueConstraint("name", "dataset_pkey"),)
+
+
+class ORMRunRanking(ORMBase):
+    """ORM class representing the ranking of a run for a single query.
+
+    The documents (primary keys) and scores are stored as arrays of big-endian 32-bit
+    integers and floats, ordered by rank, so that a ranking is a single row. There is
+    no foreign key to the query, as it would prevent dropping the query partition.
+    """
+
+    run_pkey: Mapped[int] = mapped_column(
+        ForeignKey("runs.pkey", ondelete="CASCADE"), primary_key=True
+    )
+    query_pkey: Mapped[int] = mapped_column(primary_key=True)
+    document_pkeys: Mapped[bytes] = mapped_column(LargeBinary)
+    scores: Mapped[bytes] = mapped_column(LargeBinary)
+
+    __tablename__ = "run_rankings"
+
+
+class ORMDocumentSummary(ORMBase):
+    """ORM class representing a generated summary of a document.
+
+    Summaries are stored per model and prompt template (identified by its hash). There
+    is no foreign key to the document, as it would prevent dropping the document
+    partition, summaries are removed with the corpus instead.
+    """
+
+    document_pkey: Mapped[int] = mapped_column(primary_key=True)
+    model_name: Mapped[str] = mapped_column(primary_key=True)
+    prompt_hash: Mapped[str] = mapped_column(primary_key=True)
+    corpus_pkey: Mapped[int] = mapped_column(
+        ForeignKey("corpora.pkey", ondelete="CASCADE"), index=True
+    )
+    summary: Mapped[str] = mapped_column()
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+    __tablename__ = "document_summaries"
+
+
+class ORMSummaryJob(ORMBase):
+    """ORM class representing a background job that summarizes documents.
+
+    Summaries are committed in batches. The job is resumed by summarizing the target
+    documents that have no summary yet.
+    """
+
+    pkey: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    corpus_name: Mapped[str] = mapped_column()
+    dataset_name: Mapped[str] = mapped_column(nullable=True)
+    model_name: Mapped[str] = mapped_column()
+    prompt_hash: Mapped[str] = mapped_column()
+    max_documents: Mapped[int] = mapped_column(nullable=True)
+    concurrency: Mapped[int] = mapped_column()
+    status: Mapped[str] = mapped_column(index=True)
+    error: Mapped[str] = mapped_column(nullable=True)
+    # the backend PID of the connection of the runner that claimed the job
+    runner_pid: Mapped[int] = mapped_column(nullable=True)
+
+    num_items: Mapped[int] = mapped_column(BigInteger, default=0)
+    num_processed: Mapped[int] = mapped_column(BigInteger, default=0)
+    num_failed: Mapped[int] = mapped_column(BigInteger, default=0)
+    duration: Mapped[float] = mapped_column(default=0.0)
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+    __tablename__ = "summary_jobs"
+
+
+class ORMIngestJob(ORMBase):
+    """ORM class representing a background ingest job.
+
+    The items to ingest are spooled to a file. The job progress is checkpointed as a
+    byte offset into that file, which is committed together with each batch.
+    """
+
+    pkey: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    kind: Mapped[str] = mapped_column()
+    corpus_name: Mapped[str] = mapped_column()
+    dataset_name: Mapped[str] = mapped_column(nullable=True)
+    status: Mapped[str] = mapped_column(index=True)
+    error: Mapped[str] = mapped_column(nullable=True)
+    # the backend PID of the connection of the runner that claimed the job
+    runner_pid: Mapped[int] = mapped_column(nullable=True)
+    defer_indexes: Mapped[bool] = mapped_column(default=False)
+
+    num_items: Mapped[int] = mapped_column(BigInteger, default=0)
+    num_processed: Mapped[int] = mapped_column(BigInteger, default=0)
+    num_unresolved: Mapped[int] = mapped_column(BigInteger, default=0)
+    offset: Mapped[int] = mapped_column(BigInteger, default=0)
+    duration: Mapped[float] = mapped_column(default=0.0)
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+    __tablename__ = "ingest_jobs"
+
+
+class ORMDetachedPartition(ORMBase):
+    """ORM class representing a partition that is detached to defer its indexes.
+
+    The owner attaches the partition again. Partitions whose owner no longer exists
+    have been left detached (e.g., by a crash).
+    """
+
+    table_name: Mapped[str] = mapped_column(primary_key=True)
+    key: Mapped[int] = mapped_column(primary_key=True)
+    # the backend PID of the connection of the owner
+    owner_pid: Mapped[int] = mapped_column()
+
+    __tablename__ = "detached_partitions"
 
 
 ENGLISH_TOKENIZER = tokenizer.unicode_words(
@@ -0,0 +1,170 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Literal
+
+from msgspec.json import decode
+from sqlalchemy import ClauseElement, Executable, func, literal_column, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.compiler import compiles
+
+from db import CONFIG
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from sqlalchemy import Result, Select
+    from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+    from sqlalchemy.sql.compiler import SQLCompiler
+
+# counting beyond this is pointless for pagination, the frontend shows fewer pages
+COUNT_LIMIT = int(os.environ.get("COUNT_LIMIT", "10000"))
+COUNT_CONNECTIONS = int(os.environ.get("COUNT_CONNECTIONS", "5"))
+
+CountMode = Literal["exact", "estimate", "capped", "none"]
+
+
+class _Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement: "Select") -> None:
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element: _Explain, compiler: "SQLCompiler", **kw: object) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+async def _count(
+    connection: "AsyncConnection", sql_count: "Select", count_mode: CountMode
+) -> tuple[int, bool]:
+    if count_mode == "exact":
+        return (await connection.execute(sql_count)).scalar_one(), True
+
+    # stop counting after the limit, one more row tells whether it was reached
+    sql_rows = sql_count.with_only_columns(
+        literal_column("1"), maintain_column_froms=True
+    )
+    sql_count_bounded = select(func.count()).select_from(
+        sql_rows.limit(COUNT_LIMIT + 1).subquery()
+    )
+    num_items = (await connection.execute(sql_count_bounded)).scalar_one()
+    if num_items <= COUNT_LIMIT:
+        return num_items, True
+    if count_mode == "capped":
+        return COUNT_LIMIT, False
+
+    plan = (await connection.execute(_Explain(sql_rows))).scalar_one()
+    if isinstance(plan, str):
+        plan = decode(plan)
+    return max(COUNT_LIMIT + 1, int(plan[0]["Plan"]["Plan Rows"])), False
+
+
+class CountPool:
+    """Connections that count items concurrently with the queries for pages.
+
+    Requests hold their own connection while they wait for the count, so taking the
+    count connection from the same pool could exhaust it. Counts use a separate,
+    bounded pool instead and never wait for one of its connections.
+    """
+
+    def __init__(self, size: int = COUNT_CONNECTIONS) -> None:
+        """Create a pool.
+
+        :param size: The number of connections.
+        """
+        self.size = size
+        self._engine: AsyncEngine | None = None
+        self._semaphore = asyncio.Semaphore(size)
+
+    async def start(self) -> None:
+        """Create the engine, connections are opened on demand."""
+        self._engine = create_async_engine(
+            CONFIG.connection_string,  # pyright: ignore[reportArgumentType]
+            pool_size=self.size,
+            max_overflow=0,
+        )
+
+    async def stop(self) -> None:
+        """Close all connections."""
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+
+    @asynccontextmanager
+    async def connect(self) -> "AsyncIterator[AsyncConnection | None]":
+        """Acquire a connection without waiting.
+
+        :yield: A connection, or None if the pool has not been started or all of its
+            connections are in use.
+        """
+        # acquiring an unlocked semaphore does not suspend, so no other task can
+        # take the last connection in between
+        if self._engine is None or self._semaphore.locked():
+            yield None
+            return
+        async with self._semaphore, self._engine.connect() as connection:
+            yield connection
+
+
+COUNT_POOL = CountPool()
+
+
+async def _count_in_snapshot(
+    connection: "AsyncConnection",
+    snapshot: str,
+    sql_count: "Select",
+    count_mode: CountMode,
+) -> tuple[int, bool]:
+    await connection.execution_options(isolation_level="REPEATABLE READ")
+    async with connection.begin():
+        # the snapshot ID is generated by the server, it cannot be a parameter
+        snapshot = snapshot.replace("'", "''")
+        await connection.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot}'"))
+        return await _count(connection, sql_count, count_mode)
+
+
+async def execute_with_count(
+    db_transaction: "AsyncSession",
+    sql: "Executable",
+    sql_count: "Select",
+    count_mode: CountMode = "exact",
+) -> tuple["Result", int | None, bool]:
+    """Execute the query for a page of items and count all items concurrently.
+
+    The count is executed on a connection of `COUNT_POOL`, which imports the snapshot
+    of the transaction, so that both results are consistent. For this, the
+    transaction should be repeatable read (see `provide_read_transaction`). If no
+    connection is free, the items are counted after the page query in the
+    transaction itself.
+
+    Up to `COUNT_LIMIT` items, all count modes (except "none") are exact. Beyond
+    that, "capped" returns the limit (i.e., at least this many items) and
+    "estimate" returns the number of rows estimated by the query planner.
+
+    :param db_transaction: A DB transaction.
+    :param sql: The query for the page.
+    :param sql_count: The query that counts all items (`SELECT count(*) ...`).
+    :param count_mode: How to count the items.
+    :return: The result of the page query, the number of all items (None if it is
+        not counted), and whether the number is exact.
+    """
+    if count_mode == "none":
+        return await db_transaction.execute(sql), None, False
+
+    async with COUNT_POOL.connect() as connection:
+        if connection is None:
+            result = await db_transaction.execute(sql)
+            num_items, is_exact = await _count(
+                await db_transaction.connection(), sql_count, count_mode
+            )
+            return result, num_items, is_exact
+
+        sql_snapshot = select(func.pg_export_snapshot())
+        snapshot = (await db_transaction.execute(sql_snapshot)).scalar_one()
+        result, (num_items, is_exact) = await asyncio.gather(
+            db_transaction.execute(sql),
+            _count_in_snapshot(connection, snapshot, sql_count, count_mode),
+        )
+        return result, num_items, is_exact
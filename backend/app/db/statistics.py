@@ -0,0 +1,217 @@
+from typing import TYPE_CHECKING
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db.schema import (
+    ORMCorpusStatistics,
+    ORMDataset,
+    ORMDatasetRelevanceCount,
+    ORMDatasetStatistics,
+    ORMDocument,
+    ORMQuery,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+    from sqlalchemy import CTE, ColumnElement
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.sql.selectable import NamedFromClause
+
+
+async def create_corpus_statistics(
+    db_transaction: "AsyncSession", corpus_pkey: int
+) -> None:
+    """Create the (empty) statistics of a new corpus.
+
+    The statistics are removed together with the corpus.
+
+    :param db_transaction: A DB transaction.
+    :param corpus_pkey: The primary key of the corpus.
+    """
+    await db_transaction.execute(
+        insert(ORMCorpusStatistics).values(
+            corpus_pkey=corpus_pkey, num_documents=0, num_datasets=0, text_size=0
+        )
+    )
+
+
+async def update_corpus_statistics(
+    db_transaction: "AsyncSession",
+    corpus_pkey: int,
+    num_documents: int = 0,
+    num_datasets: int = 0,
+    text_size: int = 0,
+) -> None:
+    """Add to (or subtract from) the statistics of a corpus.
+
+    :param db_transaction: A DB transaction.
+    :param corpus_pkey: The primary key of the corpus.
+    :param num_documents: The number of added documents.
+    :param num_datasets: The number of added datasets.
+    :param text_size: The size of the added document texts in bytes.
+    """
+    await db_transaction.execute(
+        update(ORMCorpusStatistics)
+        .where(ORMCorpusStatistics.corpus_pkey == corpus_pkey)
+        .values(
+            num_documents=ORMCorpusStatistics.num_documents + num_documents,
+            num_datasets=ORMCorpusStatistics.num_datasets + num_datasets,
+            text_size=ORMCorpusStatistics.text_size + text_size,
+        )
+    )
+
+
+async def create_dataset_statistics(
+    db_transaction: "AsyncSession", dataset_pkey: int
+) -> None:
+    """Create the (empty) statistics of a new dataset.
+
+    The statistics are removed together with the dataset.
+
+    :param db_transaction: A DB transaction.
+    :param dataset_pkey: The primary key of the dataset.
+    """
+    await db_transaction.execute(
+        insert(ORMDatasetStatistics).values(
+            dataset_pkey=dataset_pkey, num_queries=0, num_qrels=0
+        )
+    )
+
+
+async def update_dataset_statistics(
+    db_transaction: "AsyncSession",
+    dataset_pkey: int,
+    num_queries: int = 0,
+    relevance_counts: "Mapping[int, int] | None" = None,
+) -> None:
+    """Add to the statistics of a dataset.
+
+    :param db_transaction: A DB transaction.
+    :param dataset_pkey: The primary key of the dataset.
+    :param num_queries: The number of added queries.
+    :param relevance_counts: The number of added QRels for each relevance grade.
+    """
+    relevance_counts = {
+        relevance: count
+        for relevance, count in (relevance_counts or {}).items()
+        if count > 0
+    }
+    values = {
+        "num_queries": ORMDatasetStatistics.num_queries + num_queries,
+        "num_qrels": ORMDatasetStatistics.num_qrels + sum(relevance_counts.values()),
+    }
+    if relevance_counts:
+        # least and greatest ignore NULL, i.e., an empty relevance range
+        values["min_relevance"] = func.least(
+            ORMDatasetStatistics.min_relevance, min(relevance_counts)
+        )
+        values["max_relevance"] = func.greatest(
+            ORMDatasetStatistics.max_relevance, max(relevance_counts)
+        )
+
+        sql_counts = pg_insert(ORMDatasetRelevanceCount).values(
+            [
+                {
+                    "dataset_pkey": dataset_pkey,
+                    "relevance": relevance,
+                    "num_qrels": count,
+                }
+                for relevance, count in relevance_counts.items()
+            ]
+        )
+        await db_transaction.execute(
+            sql_counts.on_conflict_do_update(
+                index_elements=[
+                    ORMDatasetRelevanceCount.dataset_pkey,
+                    ORMDatasetRelevanceCount.relevance,
+                ],
+                set_={
+                    "num_qrels": ORMDatasetRelevanceCount.num_qrels
+                    + sql_counts.excluded.num_qrels
+                },
+            )
+        )
+
+    await db_transaction.execute(
+        update(ORMDatasetStatistics)
+        .where(ORMDatasetStatistics.dataset_pkey == dataset_pkey)
+        .values(values)
+    )
+
+
+def _is_relevant(qrels: "NamedFromClause", dataset_pkey: int) -> "ColumnElement[bool]":
+    return (
+        qrels.c.relevance
+        >= select(ORMDataset.relevance_threshold)
+        .where(ORMDataset.pkey == dataset_pkey)
+        .scalar_subquery()
+    )
+
+
+def update_num_relevant_documents(
+    qrels: "NamedFromClause", dataset_pkey: int, sign: int = 1
+) -> "CTE":
+    """Add the relevant documents of QRels to the counts of their queries.
+
+    The update is returned as a CTE, so that it can be added to the statement that
+    inserts (or deletes) the QRels and returns them.
+
+    :param qrels: The QRels, with query_pkey and relevance columns.
+    :param dataset_pkey: The primary key of the dataset the QRels belong to.
+    :param sign: -1 to subtract the QRels instead.
+    :return: The data-modifying CTE.
+    """
+    sq_counts = (
+        select(qrels.c.query_pkey, func.count().label("count"))
+        .where(_is_relevant(qrels, dataset_pkey))
+        .group_by(qrels.c.query_pkey)
+        .subquery()
+    )
+    return (
+        update(ORMQuery)
+        .where(
+            ORMQuery.dataset_pkey == dataset_pkey,
+            ORMQuery.pkey == sq_counts.c.query_pkey,
+        )
+        .values(
+            num_relevant_documents=ORMQuery.num_relevant_documents
+            + sign * sq_counts.c.count
+        )
+        .cte("update_queries")
+    )
+
+
+def update_num_relevant_queries(
+    qrels: "NamedFromClause", dataset_pkey: int, corpus_pkey: int, sign: int = 1
+) -> "CTE":
+    """Add the relevant queries of QRels to the counts of their documents.
+
+    The update is returned as a CTE, so that it can be added to the statement that
+    inserts (or deletes) the QRels and returns them.
+
+    :param qrels: The QRels, with document_pkey and relevance columns.
+    :param dataset_pkey: The primary key of the dataset the QRels belong to.
+    :param corpus_pkey: The primary key of the corpus the dataset belongs to.
+    :param sign: -1 to subtract the QRels instead.
+    :return: The data-modifying CTE.
+    """
+    sq_counts = (
+        select(qrels.c.document_pkey, func.count().label("count"))
+        .where(_is_relevant(qrels, dataset_pkey))
+        .group_by(qrels.c.document_pkey)
+        .subquery()
+    )
+    return (
+        update(ORMDocument)
+        .where(
+            ORMDocument.corpus_pkey == corpus_pkey,
+            ORMDocument.pkey == sq_counts.c.document_pkey,
+        )
+        .values(
+            num_relevant_queries=ORMDocument.num_relevant_queries
+            + sign * sq_counts.c.count
+        )
+        .cte("update_documents")
+    )
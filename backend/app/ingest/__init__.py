@@ -0,0 +1,305 @@
+"""Module for bulk data ingestion."""
+
+import time
+from typing import TYPE_CHECKING
+
+from db.partitions import get_partition_name
+from db.schema import ORMCorpus, ORMDataset, ORMDocument, ORMQRel, ORMQuery
+from db.statistics import (
+    update_corpus_statistics,
+    update_dataset_statistics,
+    update_num_relevant_documents,
+    update_num_relevant_queries,
+)
+from models import IngestResult, QRelIngestResult
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    and_,
+    func,
+    insert,
+    select,
+    text,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterable, Iterable, Iterator
+
+    from asyncpg import Connection
+    from models import DocumentInfo, QRelInfo, QueryInfo
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def get_driver_connection(db_transaction: "AsyncSession") -> "Connection":
+    """Return the asyncpg connection underlying a DB transaction.
+
+    Statements executed on this connection are part of the same transaction.
+
+    :param db_transaction: A DB transaction.
+    :return: The asyncpg connection.
+    """
+    connection = await db_transaction.connection()
+    # the driver only begins the transaction with the first statement, so statements
+    # on the raw connection would otherwise be committed on their own
+    await connection.execute(select(1))
+    raw_connection = await connection.get_raw_connection()
+    return raw_connection.driver_connection  # pyright: ignore[reportReturnType]
+
+
+async def copy_records(
+    db_transaction: "AsyncSession",
+    table: "Table",
+    columns: "Iterable[Column]",
+    records: "Iterable[tuple] | AsyncIterable[tuple]",
+    table_name: str | None = None,
+) -> int:
+    """Insert records into a table using the PostgreSQL COPY protocol.
+
+    :param db_transaction: A DB transaction.
+    :param table: The target table.
+    :param columns: The target columns, in the order of the record fields.
+    :param records: The records to insert.
+    :param table_name: Insert into the table with this name (e.g., a partition)
+        instead, which has the same columns.
+    :return: The number of inserted records.
+    """
+    driver_connection = await get_driver_connection(db_transaction)
+    status = await driver_connection.copy_records_to_table(
+        table.name if table_name is None else table_name,
+        records=records,
+        columns=[column.name for column in columns],
+    )
+    # the status message has the form "COPY <count>"
+    return int(status.split()[-1])
+
+
+async def get_corpus_pkey(
+    db_transaction: "AsyncSession", corpus_name: str
+) -> int | None:
+    """Resolve the primary key of a corpus.
+
+    :param db_transaction: A DB transaction.
+    :param corpus_name: The name of the corpus.
+    :return: The primary key, or None if the corpus does not exist.
+    """
+    sql = select(ORMCorpus.pkey).where(ORMCorpus.name == corpus_name)
+    return (await db_transaction.execute(sql)).scalar_one_or_none()
+
+
+async def get_dataset_pkeys(
+    db_transaction: "AsyncSession", corpus_name: str, dataset_name: str
+) -> tuple[int, int] | None:
+    """Resolve the primary keys of a dataset and its corpus.
+
+    :param db_transaction: A DB transaction.
+    :param corpus_name: The name of the corpus.
+    :param dataset_name: The name of the dataset.
+    :return: The dataset and corpus primary keys, or None if the dataset does not exist.
+    """
+    sql = (
+        select(ORMDataset.pkey, ORMDataset.corpus_pkey)
+        .join(ORMCorpus)
+        .where(ORMDataset.name == dataset_name, ORMCorpus.name == corpus_name)
+    )
+    result = (await db_transaction.execute(sql)).one_or_none()
+    return None if result is None else (result[0], result[1])
+
+
+async def copy_documents(
+    db_transaction: "AsyncSession",
+    corpus_pkey: int,
+    documents: "Iterable[DocumentInfo]",
+    detached: bool = False,
+) -> int:
+    """Insert documents into a corpus using COPY and update the corpus statistics.
+
+    :param db_transaction: A DB transaction.
+    :param corpus_pkey: The primary key of the corpus.
+    :param documents: The documents to insert.
+    :param detached: Whether the partition of the corpus is detached (see
+        `detach_partition`), the documents are inserted into it directly.
+    :return: The number of inserted documents.
+    """
+    text_size = 0
+
+    def records() -> "Iterator[tuple]":
+        nonlocal text_size
+        for doc in documents:
+            text_size += len(doc.text.encode())
+            yield doc.id, corpus_pkey, doc.title, doc.text
+
+    table = ORMDocument.__table__
+    partition_name = get_partition_name(table, corpus_pkey)  # pyright: ignore[reportArgumentType]
+    num_documents = await copy_records(
+        db_transaction,
+        table,  # pyright: ignore[reportArgumentType]
+        (table.c.id, table.c.corpus_pkey, table.c.title, table.c.text),
+        records(),
+        partition_name if detached else None,
+    )
+    await update_corpus_statistics(
+        db_transaction, corpus_pkey, num_documents=num_documents, text_size=text_size
+    )
+    return num_documents
+
+
+async def copy_queries(
+    db_transaction: "AsyncSession",
+    dataset_pkey: int,
+    queries: "Iterable[QueryInfo]",
+    detached: bool = False,
+) -> int:
+    """Insert queries into a dataset using COPY and update the dataset statistics.
+
+    :param db_transaction: A DB transaction.
+    :param dataset_pkey: The primary key of the dataset.
+    :param queries: The queries to insert.
+    :param detached: Whether the partition of the dataset is detached (see
+        `detach_partition`), the queries are inserted into it directly.
+    :return: The number of inserted queries.
+    """
+    table = ORMQuery.__table__
+    partition_name = get_partition_name(table, dataset_pkey)  # pyright: ignore[reportArgumentType]
+    num_queries = await copy_records(
+        db_transaction,
+        table,  # pyright: ignore[reportArgumentType]
+        (table.c.id, table.c.dataset_pkey, table.c.text, table.c.description),
+        ((q.id, dataset_pkey, q.text, q.description) for q in queries),
+        partition_name if detached else None,
+    )
+    await update_dataset_statistics(
+        db_transaction, dataset_pkey, num_queries=num_queries
+    )
+    return num_queries
+
+
+QREL_STAGING_TABLE = Table(
+    "qrels_staging",
+    MetaData(),
+    Column("query_id", String, nullable=False),
+    Column("document_id", String, nullable=False),
+    Column("relevance", Integer, nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
+async def stage_qrels(
+    db_transaction: "AsyncSession", qrels: "Iterable[QRelInfo]"
+) -> int:
+    """Insert QRels into a temporary staging table using COPY.
+
+    The staging table only exists until the end of the transaction.
+
+    :param db_transaction: A DB transaction.
+    :param qrels: The QRels to stage.
+    :return: The number of staged QRels.
+    """
+    connection = await db_transaction.connection()
+    await connection.run_sync(QREL_STAGING_TABLE.create, checkfirst=True)
+    return await copy_records(
+        db_transaction,
+        QREL_STAGING_TABLE,
+        QREL_STAGING_TABLE.c,
+        ((qrel.query_id, qrel.document_id, qrel.relevance) for qrel in qrels),
+    )
+
+
+async def resolve_staged_qrels(
+    db_transaction: "AsyncSession", dataset_pkey: int, corpus_pkey: int
+) -> int:
+    """Insert all staged QRels whose query and document exist.
+
+    Query and document IDs are resolved using a single join, QRels that cannot be
+    resolved are skipped. The dataset statistics and the relevance counts of the
+    queries and documents are updated.
+
+    :param db_transaction: A DB transaction.
+    :param dataset_pkey: The primary key of the dataset.
+    :param corpus_pkey: The primary key of the corpus the dataset belongs to.
+    :return: The number of inserted QRels.
+    """
+    # temporary tables are not analyzed automatically, the planner needs statistics
+    # to choose a hash join
+    await db_transaction.execute(text(f"ANALYZE {QREL_STAGING_TABLE.name}"))
+
+    staging = QREL_STAGING_TABLE.c
+    sql_insert = insert(ORMQRel).from_select(
+        ["query_pkey", "document_pkey", "dataset_pkey", "corpus_pkey", "relevance"],
+        select(
+            ORMQuery.pkey,
+            ORMDocument.pkey,
+            ORMQuery.dataset_pkey,
+            ORMDocument.corpus_pkey,
+            staging.relevance,
+        )
+        .select_from(QREL_STAGING_TABLE)
+        .join(
+            ORMQuery,
+            and_(
+                ORMQuery.id == staging.query_id,
+                ORMQuery.dataset_pkey == dataset_pkey,
+            ),
+        )
+        .join(
+            ORMDocument,
+            and_(
+                ORMDocument.id == staging.document_id,
+                ORMDocument.corpus_pkey == corpus_pkey,
+            ),
+        ),
+    )
+    # update the counts using the inserted QRels in the same statement
+    cte_inserted = sql_insert.returning(
+        ORMQRel.query_pkey, ORMQRel.document_pkey, ORMQRel.relevance
+    ).cte("inserted")
+    sql = (
+        select(cte_inserted.c.relevance, func.count())
+        .group_by(cte_inserted.c.relevance)
+        .add_cte(
+            update_num_relevant_documents(cte_inserted, dataset_pkey),
+            update_num_relevant_queries(cte_inserted, dataset_pkey, corpus_pkey),
+        )
+    )
+    relevance_counts = dict((await db_transaction.execute(sql)).tuples().all())
+    await update_dataset_statistics(
+        db_transaction, dataset_pkey, relevance_counts=relevance_counts
+    )
+    return sum(relevance_counts.values())
+
+
+def get_ingest_result(num_items: int, start_time: float) -> IngestResult:
+    """Summarize an ingest operation.
+
+    :param num_items: The number of inserted items.
+    :param start_time: The start time of the operation (`time.perf_counter`).
+    :return: The ingest result including throughput.
+    """
+    duration = time.perf_counter() - start_time
+    return IngestResult(
+        num_items=num_items,
+        duration=duration,
+        items_per_second=num_items / duration if duration > 0 else 0.0,
+    )
+
+
+def get_qrel_ingest_result(
+    num_items: int, num_unresolved: int, start_time: float
+) -> QRelIngestResult:
+    """Summarize a QRel ingest operation.
+
+    :param num_items: The number of inserted QRels.
+    :param num_unresolved: The number of QRels whose query or document does not exist.
+    :param start_time: The start time of the operation (`time.perf_counter`).
+    :return: The ingest result including throughput.
+    """
+    result = get_ingest_result(num_items, start_time)
+    return QRelIngestResult(
+        num_items=result.num_items,
+        duration=result.duration,
+        items_per_second=result.items_per_second,
+        num_unresolved=num_unresolved,
+    )
@@ -0,0 +1,287 @@
+from typing import TYPE_CHECKING
+
+from db.jobs import is_runner_alive
+from db.partitions import get_partition_name
+from db.schema import ORMDetachedPartition, ORMDocument, ORMQuery
+from models import IndexStatus
+from sqlalchemy import bindparam, delete, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+if TYPE_CHECKING:
+    from collections.abc import Set
+
+    from sqlalchemy import Index, Table
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def _get_indexes(table: "Table", names: "set[str]") -> list["Index"]:
+    return sorted(
+        (index for index in table.indexes if index.name in names),
+        key=lambda index: str(index.name),
+    )
+
+
+# indexes that are maintained on every insert, but are not required for integrity
+DEFERRABLE_INDEXES: dict[str, list["Index"]] = {
+    "documents": _get_indexes(
+        ORMDocument.__table__,  # pyright: ignore[reportArgumentType]
+        {
+            "ix_documents_search",
+            "ix_documents_id",
+            "ix_documents_text_length",
+            "ix_documents_length",
+            "ix_documents_relevant_queries",
+        },
+    ),
+    "queries": _get_indexes(
+        ORMQuery.__table__,  # pyright: ignore[reportArgumentType]
+        {"ix_queries_search", "ix_queries_id", "ix_queries_relevant_documents"},
+    ),
+}
+
+
+def _get_partition_name(table_name: str, key: int) -> str:
+    table = ORMDocument.__table__ if table_name == "documents" else ORMQuery.__table__
+    return get_partition_name(table, key)  # pyright: ignore[reportArgumentType]
+
+
+async def _is_attached(db_transaction: "AsyncSession", partition_name: str) -> bool:
+    sql = text(
+        "SELECT relispartition FROM pg_class "
+        "WHERE relname = :name AND pg_table_is_visible(oid)"
+    )
+    return bool(
+        (await db_transaction.execute(sql, {"name": partition_name})).scalar_one()
+    )
+
+
+async def is_partition_empty(
+    db_transaction: "AsyncSession", table_name: str, key: int
+) -> bool:
+    """Check whether the partition of a table for a partition key value is empty.
+
+    :param db_transaction: A DB transaction.
+    :param table_name: The name of the partitioned table.
+    :param key: The partition key value.
+    :return: Whether the partition has no rows.
+    """
+    name = _get_partition_name(table_name, key)
+    sql = text(f"SELECT NOT EXISTS (SELECT 1 FROM {name})")
+    return (await db_transaction.execute(sql)).scalar_one()
+
+
+async def detach_partition(
+    db_transaction: "AsyncSession", table_name: str, key: int, owner_pid: int
+) -> bool:
+    """Detach the partition of a table and drop its deferrable indexes.
+
+    Rows can be inserted into the detached partition (see `copy_documents` and
+    `copy_queries`), but they are not visible in the partitioned table until the
+    partition is attached again (see `attach_partition`). The partition is only
+    attached by other processes once its owner no longer exists (see
+    `attach_detached_partitions`).
+
+    Detaching locks the partitioned table exclusively until the end of the
+    transaction, which should therefore be committed right away.
+
+    :param db_transaction: A DB transaction.
+    :param table_name: The name of the partitioned table.
+    :param key: The partition key value.
+    :param owner_pid: The backend PID of the connection that attaches the partition
+        again (e.g., of a job runner).
+    :return: False if the partition was detached already.
+    """
+    name = _get_partition_name(table_name, key)
+    if not await _is_attached(db_transaction, name):
+        return False
+
+    # the indexes of the partition lose their link to the partitioned indexes once
+    # the partition is detached, so they are looked up first
+    sql_indexes = text(
+        "SELECT c.relname FROM pg_inherits h "
+        "JOIN pg_class c ON c.oid = h.inhrelid "
+        "JOIN pg_class p ON p.oid = h.inhparent "
+        "JOIN pg_index i ON i.indexrelid = c.oid "
+        "WHERE p.relname IN :names AND i.indrelid = CAST(:partition AS regclass)"
+    ).bindparams(bindparam("names", expanding=True))
+    names = [str(index.name) for index in DEFERRABLE_INDEXES[table_name]]
+    index_names = (
+        await db_transaction.execute(sql_indexes, {"names": names, "partition": name})
+    ).scalars()
+
+    await db_transaction.execute(
+        text(f"ALTER TABLE {table_name} DETACH PARTITION {name}")
+    )
+    for index_name in list(index_names):
+        await db_transaction.execute(text(f'DROP INDEX "{index_name}"'))
+
+    sql_owner = insert(ORMDetachedPartition).values(
+        table_name=table_name, key=key, owner_pid=owner_pid
+    )
+    await db_transaction.execute(
+        sql_owner.on_conflict_do_update(
+            index_elements=[ORMDetachedPartition.table_name, ORMDetachedPartition.key],
+            set_={"owner_pid": sql_owner.excluded.owner_pid},
+        )
+    )
+    return True
+
+
+async def attach_partition(
+    db_transaction: "AsyncSession", table_name: str, key: int
+) -> None:
+    """Attach a detached partition of a table again, if it is detached.
+
+    The missing indexes of the partition are created while it is attached. This only
+    locks the partition itself exclusively, the partitioned table remains available.
+
+    :param db_transaction: A DB transaction.
+    :param table_name: The name of the partitioned table.
+    :param key: The partition key value.
+    """
+    name = _get_partition_name(table_name, key)
+    if not await _is_attached(db_transaction, name):
+        await db_transaction.execute(
+            text(
+                f"ALTER TABLE {table_name} ATTACH PARTITION {name} "
+                f"FOR VALUES IN ({int(key)})"
+            )
+        )
+    await db_transaction.execute(
+        delete(ORMDetachedPartition).where(
+            ORMDetachedPartition.table_name == table_name,
+            ORMDetachedPartition.key == key,
+        )
+    )
+
+
+async def _get_detached_partitions(
+    db_transaction: "AsyncSession", table_name: str
+) -> list[tuple[int, str]]:
+    sql = text(
+        "SELECT oid, relname FROM pg_class "
+        "WHERE relkind = 'r' AND NOT relispartition AND relname ~ :pattern "
+        "AND pg_table_is_visible(oid) ORDER BY relname"
+    )
+    result = await db_transaction.execute(sql, {"pattern": f"^{table_name}_[0-9]+$"})
+    return [(oid, name) for oid, name in result]
+
+
+async def attach_detached_partitions(
+    db_transaction: "AsyncSession", exclude: "Set[tuple[str, int]]" = frozenset()
+) -> None:
+    """Attach all partitions that have been left detached (e.g., by a crash).
+
+    Partitions whose owner still exists (see `detach_partition`) stay detached.
+
+    :param db_transaction: A DB transaction.
+    :param exclude: Partitions (table name and partition key value) that stay
+        detached as well.
+    """
+    sql_owned = select(ORMDetachedPartition.table_name, ORMDetachedPartition.key).where(
+        is_runner_alive(ORMDetachedPartition.owner_pid)
+    )
+    owned = {
+        (table_name, key) for table_name, key in await db_transaction.execute(sql_owned)
+    }
+    for table_name in DEFERRABLE_INDEXES:
+        for _, name in await _get_detached_partitions(db_transaction, table_name):
+            key = int(name.rsplit("_", 1)[1])
+            if (table_name, key) not in exclude | owned:
+                await attach_partition(db_transaction, table_name, key)
+
+
+async def get_index_status(db_transaction: "AsyncSession") -> list[IndexStatus]:
+    """Return the status of all deferrable indexes.
+
+    The indexes of the partitioned tables cover all attached partitions. Detached
+    partitions (see `detach_partition`) are reported separately, they have none of
+    the deferrable indexes until they are attached again. While a partition is being
+    attached, its indexes are not visible to other transactions, they are reported as
+    "building" with the progress of the index that is currently being built.
+
+    :param db_transaction: A DB transaction.
+    :return: The status of each index.
+    """
+    # the indexes of partitioned tables are partitioned as well, their size is the
+    # total size of all partitions
+    sql_indexes = text(
+        "SELECT c.relname, i.indisvalid, ("
+        "SELECT coalesce(sum(pg_relation_size(t.relid)), 0) "
+        "FROM pg_partition_tree(c.oid) t) "
+        "FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+        "WHERE c.relname IN :names AND pg_table_is_visible(c.oid)"
+    ).bindparams(bindparam("names", expanding=True))
+    sql_progress = text(
+        "SELECT relid, phase, blocks_done, blocks_total, tuples_done, tuples_total "
+        "FROM pg_stat_progress_create_index WHERE datid = ("
+        "SELECT oid FROM pg_database WHERE datname = current_database())"
+    )
+
+    names = [
+        str(index.name) for indexes in DEFERRABLE_INDEXES.values() for index in indexes
+    ]
+    existing = {
+        name: (is_valid, size)
+        for name, is_valid, size in await db_transaction.execute(
+            sql_indexes, {"names": names}
+        )
+    }
+    # keyed by the table whose indexes are built
+    progress = {
+        relid: (
+            phase,
+            tuples_done / tuples_total
+            if tuples_total
+            else blocks_done / blocks_total
+            if blocks_total
+            else None,
+        )
+        for (
+            relid,
+            phase,
+            blocks_done,
+            blocks_total,
+            tuples_done,
+            tuples_total,
+        ) in await db_transaction.execute(sql_progress)
+    }
+
+    result = []
+    for table_name, indexes in DEFERRABLE_INDEXES.items():
+        for index in indexes:
+            name = str(index.name)
+            is_valid, size = existing.get(name, (None, 0))
+            if is_valid is None:
+                status = "missing"
+            else:
+                status = "ready" if is_valid else "invalid"
+            result.append(
+                IndexStatus(
+                    name=name,
+                    table_name=table_name,
+                    partition_name=None,
+                    status=status,
+                    size=size,
+                    build_phase=None,
+                    build_progress=None,
+                )
+            )
+
+        for relid, partition_name in await _get_detached_partitions(
+            db_transaction, table_name
+        ):
+            build_phase, build_progress = progress.get(relid, (None, None))
+            for index in indexes:
+                result.append(
+                    IndexStatus(
+                        name=str(index.name),
+                        table_name=table_name,
+                        partition_name=partition_name,
+                        status="missing" if build_phase is None else "building",
+                        size=0,
+                        build_phase=build_phase,
+                        build_progress=build_progress,
+                    )
+                )
+    return result
@@ -0,0 +1,480 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+from db import CONFIG
+from db.jobs import (
+    JOB_RESCAN_INTERVAL,
+    claim_job,
+    is_runner_alive,
+    open_runner_connection,
+    select_orphaned_jobs,
+)
+from db.schema import ORMIngestJob
+from models import DocumentInfo, IngestJob, QRelInfo, QueryInfo
+from msgspec.json import Encoder
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from ingest import (
+    copy_documents,
+    copy_queries,
+    get_corpus_pkey,
+    get_dataset_pkeys,
+    resolve_staged_qrels,
+    stage_qrels,
+)
+from ingest.indexes import (
+    attach_detached_partitions,
+    attach_partition,
+    detach_partition,
+    is_partition_empty,
+)
+from ingest.ndjson import iter_ndjson_batches, iter_ndjson_file_batches
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterable, Awaitable, Callable
+
+    from litestar.datastructures import State
+    from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+LOGGER = logging.getLogger(__name__)
+
+INGEST_JOB_DIRECTORY = Path(
+    os.environ.get(
+        "INGEST_JOB_DIRECTORY",
+        str(Path(tempfile.gettempdir()) / "ir-explorer-ingest-jobs"),
+    )
+)
+INGEST_MAX_CONCURRENT_JOBS = int(os.environ.get("INGEST_MAX_CONCURRENT_JOBS", "1"))
+
+IngestJobKind = Literal["documents", "queries", "qrels"]
+RUNNING_STATUSES = ("running", "indexing")
+ITEM_TYPES: dict[str, type] = {
+    "documents": DocumentInfo,
+    "queries": QueryInfo,
+    "qrels": QRelInfo,
+}
+INDEXED_TABLES = {"documents": "documents", "queries": "queries"}
+
+
+class IngestJobError(Exception):
+    """Raised when an ingest job cannot be run."""
+
+
+def get_ingest_job_info(job: ORMIngestJob) -> IngestJob:
+    """Convert an ingest job to its API representation, including its progress.
+
+    :param job: The ingest job.
+    :return: The ingest job with throughput and estimated remaining time (seconds).
+    """
+    items_per_second = job.num_processed / job.duration if job.duration > 0 else 0.0
+    eta = None
+    if job.status == "completed":
+        eta = 0.0
+    elif job.status in ("pending", "running") and items_per_second > 0:
+        eta = (job.num_items - job.num_processed) / items_per_second
+    return IngestJob(
+        id=job.pkey,
+        kind=job.kind,
+        corpus_name=job.corpus_name,
+        dataset_name=job.dataset_name,
+        status=job.status,
+        error=job.error,
+        num_items=job.num_items,
+        num_processed=job.num_processed,
+        num_unresolved=job.num_unresolved,
+        items_per_second=items_per_second,
+        eta=eta,
+    )
+
+
+class IngestJobRunner:
+    """Run ingest jobs in the background.
+
+    Jobs are persisted in the database and their items are spooled to files, so that
+    unfinished jobs are resumed from their last checkpoint after a restart. Each job is
+    claimed by the runner of one backend process. The jobs of processes that have died
+    are claimed by the others on the same host, which look for them periodically (see
+    `JOB_RESCAN_INTERVAL`).
+    """
+
+    def __init__(
+        self,
+        directory: Path = INGEST_JOB_DIRECTORY,
+        max_concurrent_jobs: int = INGEST_MAX_CONCURRENT_JOBS,
+        on_commit: "Callable[[ORMIngestJob], Awaitable[None]] | None" = None,
+    ) -> None:
+        """Create a job runner.
+
+        :param directory: The directory for spooled job items.
+        :param max_concurrent_jobs: How many jobs to run concurrently.
+        :param on_commit: Called after each committed batch.
+        """
+        self.directory = directory
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.on_commit = on_commit
+        self._queue: asyncio.Queue[int] = asyncio.Queue()
+        self._orphaned: set[int] = set()
+        self._num_deferring_jobs: dict[tuple[str, int], int] = {}
+        self._workers: list[asyncio.Task] = []
+        self._engine: AsyncEngine | None = None
+        self._connection: AsyncConnection | None = None
+        self._runner_pid = 0
+        self._session_maker: async_sessionmaker[AsyncSession] | None = None
+
+    @property
+    def session_maker(self) -> "async_sessionmaker[AsyncSession]":
+        """Session maker for the connection pool of the job runner.
+
+        :raises RuntimeError: When the job runner has not been started.
+        :return: The session maker.
+        """
+        if self._session_maker is None:
+            raise RuntimeError("The ingest job runner has not been started.")
+        return self._session_maker
+
+    async def start(self) -> None:
+        """Start the workers and resume unfinished jobs."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # jobs use their own connection pool so that they do not starve requests
+        self._engine = create_async_engine(
+            CONFIG.connection_string,  # pyright: ignore[reportArgumentType]
+            pool_size=self.max_concurrent_jobs + 1,
+        )
+        self._session_maker = async_sessionmaker(self._engine, expire_on_commit=False)
+        self._connection, self._runner_pid = await open_runner_connection(self._engine)
+
+        async with self.session_maker() as session, session.begin():
+            await self._fail_interrupted_uploads(session)
+
+            # jobs that are running in other processes are not claimed
+            sql = (
+                select(ORMIngestJob)
+                .where(ORMIngestJob.status.in_(("pending", *RUNNING_STATUSES)))
+                .order_by(ORMIngestJob.pkey)
+            )
+            jobs = (await session.execute(sql)).scalars().all()
+
+            # partitions are left detached by a crash, those of resumed jobs stay
+            # detached until the jobs have finished
+            deferred = set()
+            for job in jobs:
+                table_name = INDEXED_TABLES.get(job.kind)
+                if job.defer_indexes and table_name is not None:
+                    target_pkeys = await self._get_target_pkeys(session, job)
+                    if target_pkeys is not None:
+                        deferred.add((table_name, target_pkeys[0]))
+            await attach_detached_partitions(session, deferred)
+
+        # the items of jobs created on other hosts are spooled there
+        for job in jobs:
+            if self._get_path(job.pkey).exists():
+                self._queue.put_nowait(job.pkey)
+
+        self._workers = [
+            asyncio.create_task(self._work()) for _ in range(self.max_concurrent_jobs)
+        ]
+        self._workers.append(asyncio.create_task(self._rescan()))
+
+    async def stop(self) -> None:
+        """Stop the workers.
+
+        Running jobs are interrupted and resumed from their last checkpoint on the next
+        start (or by the runner of another process).
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._connection is not None:
+            await self._connection.close()
+        if self._engine is not None:
+            await self._engine.dispose()
+
+    def _get_path(self, job_pkey: int) -> Path:
+        return self.directory / f"{job_pkey}.ndjson"
+
+    async def _fail_interrupted_uploads(self, session: "AsyncSession") -> None:
+        # uploads cannot be resumed, unless they are still running in another
+        # process, and their partial items cannot be retried
+        sql = (
+            update(ORMIngestJob)
+            .where(
+                ORMIngestJob.status == "uploading",
+                ~is_runner_alive(ORMIngestJob.runner_pid),
+            )
+            .values(status="failed", error="Upload interrupted.")
+            .returning(ORMIngestJob.pkey)
+        )
+        for job_pkey in (await session.execute(sql)).scalars():
+            self._get_path(job_pkey).unlink(missing_ok=True)
+
+    async def create_job(
+        self,
+        kind: IngestJobKind,
+        corpus_name: str,
+        dataset_name: str | None,
+        chunks: "AsyncIterable[bytes]",
+        defer_indexes: bool = False,
+    ) -> IngestJob:
+        """Create a job and spool its items.
+
+        The items are validated while they are spooled. The job is queued afterwards.
+
+        :param kind: What kind of items to ingest.
+        :param corpus_name: The corpus to ingest into.
+        :param dataset_name: The dataset to ingest into (queries and QRels only).
+        :param chunks: The raw NDJSON byte chunks.
+        :param defer_indexes: Detach the (empty) target partition while the job runs
+            and build its deferrable indexes once at the end.
+        :raises InvalidLineError: When an item cannot be decoded.
+        :return: The created job.
+        """
+        async with self.session_maker() as session:
+            async with session.begin():
+                job = ORMIngestJob(
+                    kind=kind,
+                    corpus_name=corpus_name,
+                    dataset_name=dataset_name,
+                    status="uploading",
+                    runner_pid=self._runner_pid,
+                    defer_indexes=defer_indexes,
+                )
+                session.add(job)
+
+            path = self._get_path(job.pkey)
+            encoder = Encoder()
+            num_items = 0
+            try:
+                with path.open("wb") as f:
+                    async for batch in iter_ndjson_batches(chunks, ITEM_TYPES[kind]):
+                        data = b"".join(encoder.encode(item) + b"\n" for item in batch)
+                        await asyncio.to_thread(f.write, data)
+                        num_items += len(batch)
+            except BaseException:
+                path.unlink(missing_ok=True)
+                async with session.begin():
+                    await session.delete(job)
+                raise
+
+            async with session.begin():
+                job.num_items = num_items
+                job.status = "pending"
+
+        self._queue.put_nowait(job.pkey)
+        return get_ingest_job_info(job)
+
+    async def retry_job(self, job_pkey: int) -> IngestJob | None:
+        """Queue a failed job again, it is resumed from its last checkpoint.
+
+        :param job_pkey: The job ID.
+        :raises IngestJobError: When the job has not failed or its items are no longer
+            available.
+        :return: The queued job, or None if it does not exist.
+        """
+        async with self.session_maker() as session:
+            async with session.begin():
+                job = await session.get(ORMIngestJob, job_pkey, with_for_update=True)
+                if job is None:
+                    return None
+                if job.status != "failed":
+                    raise IngestJobError("Only failed jobs can be retried.")
+                if not self._get_path(job_pkey).exists():
+                    raise IngestJobError(
+                        "The items of the job are no longer available."
+                    )
+                job.status = "pending"
+                job.error = None  # pyright: ignore[reportAttributeAccessIssue]
+                job.runner_pid = self._runner_pid
+
+        self._queue.put_nowait(job_pkey)
+        return get_ingest_job_info(job)
+
+    async def remove_job(self, job_pkey: int) -> bool:
+        """Remove a completed or failed job and its spooled items.
+
+        :param job_pkey: The job ID.
+        :raises IngestJobError: When the job has not finished.
+        :return: Whether the job existed.
+        """
+        async with self.session_maker() as session, session.begin():
+            job = await session.get(ORMIngestJob, job_pkey, with_for_update=True)
+            if job is None:
+                return False
+            if job.status not in ("completed", "failed"):
+                raise IngestJobError("Only completed or failed jobs can be removed.")
+            await session.delete(job)
+
+        self._get_path(job_pkey).unlink(missing_ok=True)
+        return True
+
+    async def _rescan(self) -> None:
+        while True:
+            await asyncio.sleep(JOB_RESCAN_INTERVAL)
+            try:
+                async with self.session_maker() as session, session.begin():
+                    await self._fail_interrupted_uploads(session)
+                    sql = select_orphaned_jobs(ORMIngestJob, RUNNING_STATUSES)
+                    job_pkeys = (await session.execute(sql)).scalars().all()
+            except Exception:
+                LOGGER.exception("failed to look for orphaned ingest jobs")
+                continue
+            # jobs stay orphaned until they are claimed, they are queued only once
+            for job_pkey in job_pkeys:
+                if job_pkey not in self._orphaned and self._get_path(job_pkey).exists():
+                    self._orphaned.add(job_pkey)
+                    self._queue.put_nowait(job_pkey)
+
+    async def _work(self) -> None:
+        while True:
+            job_pkey = await self._queue.get()
+            self._orphaned.discard(job_pkey)
+            try:
+                await self._run(job_pkey)
+            except Exception as e:
+                LOGGER.exception("ingest job %d failed", job_pkey)
+                # the spooled items are kept, so that the job can be retried
+                async with self.session_maker() as session, session.begin():
+                    await session.execute(
+                        update(ORMIngestJob)
+                        .where(
+                            ORMIngestJob.pkey == job_pkey,
+                            ORMIngestJob.runner_pid == self._runner_pid,
+                        )
+                        .values(status="failed", error=str(e))
+                    )
+
+    @staticmethod
+    async def _get_target_pkeys(
+        session: "AsyncSession", job: ORMIngestJob
+    ) -> tuple[int, int] | None:
+        # the corpus (twice) for documents, the dataset and its corpus otherwise
+        if job.kind == "documents":
+            corpus_pkey = await get_corpus_pkey(session, job.corpus_name)
+            return None if corpus_pkey is None else (corpus_pkey, corpus_pkey)
+        return await get_dataset_pkeys(session, job.corpus_name, job.dataset_name)
+
+    async def _run(self, job_pkey: int) -> None:
+        async with self.session_maker() as session:
+            # the claim is committed first, so that a failed job is marked as such
+            sql = claim_job(ORMIngestJob, job_pkey, self._runner_pid, RUNNING_STATUSES)
+            async with session.begin():
+                job = (await session.scalars(sql)).one_or_none()
+            # the job is run by another process or has been removed
+            if job is None:
+                return
+
+            async with session.begin():
+                target_pkeys = await self._get_target_pkeys(session, job)
+                if target_pkeys is None:
+                    raise IngestJobError(
+                        "The corpus does not exist."
+                        if job.kind == "documents"
+                        else "The dataset does not exist."
+                    )
+
+            table_name = INDEXED_TABLES.get(job.kind) if job.defer_indexes else None
+            partition = None if table_name is None else (table_name, target_pkeys[0])
+            if partition is not None:
+                await self._defer_indexes(session, job, partition)
+            try:
+                await self._load(session, job, target_pkeys, partition is not None)
+            except Exception:
+                if partition is not None:
+                    await self._restore_indexes(session, partition)
+                raise
+
+            # cancelled jobs are resumed later, so the indexes stay deferred
+            if partition is not None:
+                async with session.begin():
+                    job.status = "indexing"
+                await self._restore_indexes(session, partition)
+
+            async with session.begin():
+                job.status = "completed"
+
+        self._get_path(job_pkey).unlink(missing_ok=True)
+
+    async def _load(
+        self,
+        session: "AsyncSession",
+        job: ORMIngestJob,
+        target_pkeys: tuple[int, int],
+        detached: bool,
+    ) -> None:
+        async for batch, offset in iter_ndjson_file_batches(
+            self._get_path(job.pkey), ITEM_TYPES[job.kind], job.offset
+        ):
+            start_time = time.perf_counter()
+            async with session.begin():
+                num_unresolved = await self._insert(
+                    session, job.kind, target_pkeys, batch, detached
+                )
+                # the checkpoint is committed together with the batch
+                job.offset = offset
+                job.num_processed += len(batch)
+                job.num_unresolved += num_unresolved
+                job.duration += time.perf_counter() - start_time
+            if self.on_commit is not None:
+                await self.on_commit(job)
+
+    async def _defer_indexes(
+        self, session: "AsyncSession", job: ORMIngestJob, partition: tuple[str, int]
+    ) -> None:
+        # concurrent jobs share the deferral, the first job detaches the partition,
+        # which is committed right away, as it locks the partitioned table
+        if self._num_deferring_jobs.get(partition, 0) == 0:
+            async with session.begin():
+                # resumed jobs have inserted rows already
+                if job.offset == 0 and not await is_partition_empty(
+                    session, *partition
+                ):
+                    raise IngestJobError(
+                        "Indexes can only be deferred when adding to an empty "
+                        "partition."
+                    )
+                await detach_partition(session, *partition, self._runner_pid)
+        self._num_deferring_jobs[partition] = (
+            self._num_deferring_jobs.get(partition, 0) + 1
+        )
+
+    async def _restore_indexes(
+        self, session: "AsyncSession", partition: tuple[str, int]
+    ) -> None:
+        # the last job attaches the partition, which builds its indexes
+        self._num_deferring_jobs[partition] -= 1
+        if self._num_deferring_jobs[partition] == 0:
+            async with session.begin():
+                await attach_partition(session, *partition)
+
+    @staticmethod
+    async def _insert(
+        session: "AsyncSession",
+        kind: str,
+        target_pkeys: tuple[int, int],
+        batch: list,
+        detached: bool,
+    ) -> int:
+        if kind == "documents":
+            await copy_documents(session, target_pkeys[0], batch, detached)
+            return 0
+        if kind == "queries":
+            await copy_queries(session, target_pkeys[0], batch, detached)
+            return 0
+        num_staged = await stage_qrels(session, batch)
+        return num_staged - await resolve_staged_qrels(session, *target_pkeys)
+
+
+async def provide_ingest_job_runner(state: "State") -> IngestJobRunner:
+    """Provide the ingest job runner of the app.
+
+    :param state: The app state.
+    :return: The ingest job runner.
+    """
+    return state.ingest_job_runner
@@ -0,0 +1,169 @@
+import asyncio
+import os
+from typing import TYPE_CHECKING, TypeVar
+
+from msgspec import MsgspecError
+from msgspec.json import Decoder
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, AsyncIterable
+    from pathlib import Path
+
+T = TypeVar("T")
+
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "10000"))
+INGEST_MAX_LINE_LENGTH = int(os.environ.get("INGEST_MAX_LINE_LENGTH", "16777216"))
+FILE_CHUNK_SIZE = 1 << 20
+
+
+class LineTooLongError(Exception):
+    """Raised when a line of a stream is longer than the maximum line length."""
+
+    def __init__(self, line_number: int, max_line_length: int) -> None:
+        """Create an error for a specific line.
+
+        :param line_number: The (1-based) line number.
+        :param max_line_length: The maximum line length in bytes.
+        """
+        self.line_number = line_number
+        self.error = f"line is longer than {max_line_length} bytes"
+        super().__init__(f"Invalid line {line_number}: {self.error}")
+
+
+class InvalidLineError(Exception):
+    """Raised when a line of an NDJSON stream cannot be decoded."""
+
+    def __init__(self, line_number: int, error: str) -> None:
+        """Create an error for a specific line.
+
+        :param line_number: The (1-based) line number.
+        :param error: The decoding error message.
+        """
+        super().__init__(f"Invalid item in line {line_number}: {error}")
+        self.line_number = line_number
+        self.error = error
+
+
+async def iter_lines(
+    chunks: "AsyncIterable[bytes]", max_line_length: int = INGEST_MAX_LINE_LENGTH
+) -> "AsyncGenerator[list[bytes], None]":
+    """Split a stream of chunks into lines.
+
+    Chunks may split lines at arbitrary positions. The parts of a split line are
+    joined once the line is complete, a line that exceeds the maximum length is
+    rejected before it is complete.
+
+    :param chunks: The raw byte chunks.
+    :param max_line_length: The maximum line length in bytes (without line break).
+    :raises LineTooLongError: When a line is longer than the maximum line length.
+    :yield: The complete lines of each chunk, including their line breaks. The last
+        line may have no line break.
+    """
+    line_number = 0
+    parts: list[bytes] = []
+    num_part_bytes = 0
+    async for chunk in chunks:
+        lines = []
+        start = 0
+        while (end := chunk.find(b"\n", start)) != -1:
+            line_number += 1
+            if num_part_bytes + end - start > max_line_length:
+                raise LineTooLongError(line_number, max_line_length)
+            line = chunk[start : end + 1]
+            if parts:
+                parts.append(line)
+                line = b"".join(parts)
+                parts = []
+                num_part_bytes = 0
+            lines.append(line)
+            start = end + 1
+        if start < len(chunk):
+            num_part_bytes += len(chunk) - start
+            if num_part_bytes > max_line_length:
+                raise LineTooLongError(line_number + 1, max_line_length)
+            parts.append(chunk[start:])
+        if lines:
+            yield lines
+    if parts:
+        yield [b"".join(parts)]
+
+
+async def _iter_ndjson_batches_with_offsets(
+    chunks: "AsyncIterable[bytes]", item_type: type[T], batch_size: int
+) -> "AsyncGenerator[tuple[list[T], int], None]":
+    decoder = Decoder(item_type)
+    batch: list[T] = []
+    line_number = 0
+    num_bytes = 0
+    try:
+        async for lines in iter_lines(chunks):
+            for line in lines:
+                line_number += 1
+                num_bytes += len(line)
+                if line.strip():
+                    try:
+                        batch.append(decoder.decode(line))
+                    except MsgspecError as e:
+                        raise InvalidLineError(line_number, str(e)) from e
+                if len(batch) >= batch_size:
+                    yield batch, num_bytes
+                    batch = []
+    except LineTooLongError as e:
+        raise InvalidLineError(e.line_number, e.error) from e
+
+    if batch:
+        yield batch, num_bytes
+
+
+async def iter_ndjson_batches(
+    chunks: "AsyncIterable[bytes]",
+    item_type: type[T],
+    batch_size: int = INGEST_BATCH_SIZE,
+) -> "AsyncGenerator[list[T], None]":
+    """Decode a stream of NDJSON chunks into batches of items.
+
+    Chunks may split lines at arbitrary positions. Empty lines are skipped.
+    Only the current batch and an incomplete trailing line are kept in memory.
+
+    :param chunks: The raw NDJSON byte chunks.
+    :param item_type: The type each line is decoded into.
+    :param batch_size: The maximum number of items per batch.
+    :raises InvalidLineError: When a line cannot be decoded or is longer than
+        `INGEST_MAX_LINE_LENGTH`.
+    :yield: Batches of decoded items.
+    """
+    async for batch, _ in _iter_ndjson_batches_with_offsets(
+        chunks, item_type, batch_size
+    ):
+        yield batch
+
+
+async def iter_ndjson_file_batches(
+    path: "Path",
+    item_type: type[T],
+    offset: int = 0,
+    batch_size: int = INGEST_BATCH_SIZE,
+) -> "AsyncGenerator[tuple[list[T], int], None]":
+    """Decode an NDJSON file into batches of items, starting at a byte offset.
+
+    The file is read in large chunks in a worker thread.
+
+    :param path: The NDJSON file.
+    :param item_type: The type each line is decoded into.
+    :param offset: The byte offset to start reading at. Must be at the start of a line.
+    :param batch_size: The maximum number of items per batch.
+    :raises InvalidLineError: When a line cannot be decoded. The line number is
+        relative to the offset.
+    :yield: Batches of decoded items and the byte offset after each batch.
+    """
+    with path.open("rb") as f:
+        f.seek(offset)
+
+        async def read_chunks() -> "AsyncGenerator[bytes, None]":
+            while chunk := await asyncio.to_thread(f.read, FILE_CHUNK_SIZE):
+                yield chunk
+
+        async for batch, num_bytes in _iter_ndjson_batches_with_offsets(
+            read_chunks(), item_type, batch_size
+        ):
+            yield batch, offset + num_bytes
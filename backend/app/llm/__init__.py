@@ -3,24 +3,39 @@
 import os
 from typing import TYPE_CHECKING
 
+import httpx
 from litestar.exceptions import HTTPException
 from litestar.status_codes import HTTP_503_SERVICE_UNAVAILABLE
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from llm.registry import ModelsUnavailableError
 
 if TYPE_CHECKING:
-    from collections.abc import AsyncGenerator
+    from litestar.datastructures import State
+
+    from llm.registry import ModelRegistry
 
 
 OPENAI_API_ENDPOINT = os.environ.get("OPENAI_API_ENDPOINT")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
 
 
 async def ensure_model_available(
-    openai_client: AsyncOpenAI | None, model_name: str
+    openai_client: AsyncOpenAI | None,
+    model_registry: "ModelRegistry",
+    model_name: str,
 ) -> AsyncOpenAI:
     """Check whether a requested model is available.
 
+    The available models are looked up in the registry, which usually does not call
+    the API.
+
     :param openai_client: An OpenAI client.
+    :param model_registry: The model registry.
     :param model_name: The requested model name.
     :raises HTTPException: When LLM services or the requested model are unavailable.
     :return: The validated OpenAI client.
@@ -32,10 +47,8 @@ async def ensure_model_available(
         )
 
     try:
-        available_model_names = [
-            model.id for model in (await openai_client.models.list()).data
-        ]
-    except Exception as e:
+        available_model_names = await model_registry.get_model_names()
+    except ModelsUnavailableError as e:
         raise HTTPException(
             "LLM list not available.",
             status_code=HTTP_503_SERVICE_UNAVAILABLE,
@@ -55,14 +68,33 @@ async def ensure_model_available(
     return openai_client
 
 
-async def provide_client() -> "AsyncGenerator[AsyncOpenAI | None, None]":
-    """Provide an asynchronous client for the OpenAI API.
+def create_client() -> AsyncOpenAI | None:
+    """Create a client for the OpenAI API, which is shared by all requests.
+
+    Idle connections are kept alive, so that requests reuse them instead of opening
+    new ones.
+
+    :return: The client, or None if no endpoint is set.
+    """
+    if OPENAI_API_ENDPOINT is None:
+        return None
+    return AsyncOpenAI(
+        base_url=OPENAI_API_ENDPOINT,
+        api_key=OPENAI_API_KEY,
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=60,
+            )
+        ),
+    )
+
 
-    If no endpoint is set, yield None.
+async def provide_client(state: "State") -> AsyncOpenAI | None:
+    """Provide the client for the OpenAI API of the app.
 
-    :yield: The client (or None).
+    :param state: The app state.
+    :return: The client (or None if LLM services are not available).
     """
-    if OPENAI_API_ENDPOINT is not None:
-        yield AsyncOpenAI(base_url=OPENAI_API_ENDPOINT, api_key=OPENAI_API_KEY)
-    else:
-        yield None
+    return state.openai_client
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import os
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from litestar.datastructures import State
+    from openai import AsyncOpenAI
+
+LOGGER = logging.getLogger(__name__)
+
+LLM_MODELS_TTL = float(os.environ.get("LLM_MODELS_TTL", "60"))
+LLM_MODELS_TIMEOUT = float(os.environ.get("LLM_MODELS_TIMEOUT", "5"))
+
+
+class ModelsUnavailableError(Exception):
+    """Raised when the list of models cannot be retrieved."""
+
+
+class ModelRegistry:
+    """Keep the list of models of the OpenAI API in memory.
+
+    The list is refreshed in the background, so that requests do not wait for the API.
+    Consecutive failures open a circuit breaker: while it is open, the API is not
+    called and lookups fail immediately. After a timeout, a single call is attempted
+    again.
+    """
+
+    def __init__(
+        self,
+        ttl: float = LLM_MODELS_TTL,
+        timeout: float = LLM_MODELS_TIMEOUT,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+    ) -> None:
+        """Create a registry.
+
+        :param ttl: Time in seconds after which the list is refreshed.
+        :param timeout: Time in seconds before a call to the API fails.
+        :param failure_threshold: The number of consecutive failures that open the
+            circuit breaker.
+        :param reset_timeout: Time in seconds before the API is called again once the
+            circuit breaker is open.
+        """
+        self.ttl = ttl
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._client: AsyncOpenAI | None = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+        self._model_names: list[str] | None = None
+        self._updated_at = -float("inf")
+        self._num_failures = 0
+        self._opened_at: float | None = None
+        self._error: str | None = None
+
+    @property
+    def is_available(self) -> bool:
+        """Whether LLM services are configured.
+
+        :return: True if the registry has been started with a client.
+        """
+        return self._client is not None
+
+    async def start(self, client: "AsyncOpenAI | None") -> None:
+        """Start refreshing the list in the background.
+
+        :param client: The client of the app (None if LLM services are not
+            available).
+        """
+        if client is None:
+            return
+        # the connections of the client are shared, but calls are not retried, the
+        # circuit breaker handles failures
+        self._client = client.with_options(timeout=self.timeout, max_retries=0)
+        self._refresh_task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        """Stop refreshing the list, the client is closed by the app."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+        self._client = None
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            try:
+                await self.refresh(force=True)
+            except ModelsUnavailableError as e:
+                LOGGER.warning("failed to refresh the list of models: %s", e)
+            # refresh before the list expires
+            await asyncio.sleep(self.ttl / 2)
+
+    def _check_circuit(self) -> None:
+        if (
+            self._opened_at is not None
+            and time.monotonic() - self._opened_at < self.reset_timeout
+        ):
+            raise ModelsUnavailableError(self._error)
+
+    async def refresh(self, force: bool = False) -> list[str]:
+        """Retrieve the list of models from the API.
+
+        Concurrent calls are coalesced into one.
+
+        :param force: Whether to refresh a list that has not expired yet.
+        :raises ModelsUnavailableError: When the registry has not been started, the
+            circuit breaker is open, or the API call fails.
+        :return: The model names.
+        """
+        async with self._lock:
+            if (
+                not force
+                and self._model_names is not None
+                and time.monotonic() - self._updated_at < self.ttl
+            ):
+                return self._model_names
+            if self._client is None:
+                raise ModelsUnavailableError("The model registry has not been started.")
+            self._check_circuit()
+
+            try:
+                model_names = [
+                    model.id for model in (await self._client.models.list()).data
+                ]
+            except Exception as e:
+                self._error = str(e)
+                self._num_failures += 1
+                if self._num_failures >= self.failure_threshold:
+                    self._opened_at = time.monotonic()
+                raise ModelsUnavailableError(self._error) from e
+
+            self._model_names = model_names
+            self._updated_at = time.monotonic()
+            self._num_failures = 0
+            self._opened_at = None
+            return model_names
+
+    async def get_model_names(self) -> list[str]:
+        """Return the list of models.
+
+        The list is served from memory, unless it has expired.
+
+        :raises ModelsUnavailableError: When the list is not available.
+        :return: The model names.
+        """
+        self._check_circuit()
+        if (
+            self._model_names is not None
+            and time.monotonic() - self._updated_at < self.ttl
+        ):
+            return self._model_names
+        return await self.refresh()
+
+
+async def provide_model_registry(state: "State") -> ModelRegistry:
+    """Provide the model registry of the app.
+
+    :param state: The app state.
+    :return: The model registry.
+    """
+    return state.model_registry
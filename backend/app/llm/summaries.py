@@ -0,0 +1,453 @@
+import asyncio
+import logging
+import os
+import time
+from typing import TYPE_CHECKING
+
+from db import CONFIG
+from db.jobs import (
+    JOB_RESCAN_INTERVAL,
+    claim_job,
+    open_runner_connection,
+    select_orphaned_jobs,
+)
+from db.schema import ORMDocument, ORMDocumentSummary, ORMQRel, ORMSummaryJob
+from ingest import get_corpus_pkey, get_dataset_pkeys
+from models import SummaryJob
+from sqlalchemy import exists, func, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from llm.util import SUMMARY_PROMPT_HASH, get_summary_prompt
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, AsyncIterable, Iterable, Sequence
+
+    from litestar.datastructures import State
+    from openai import AsyncOpenAI
+    from openai.types import Completion
+    from sqlalchemy import ColumnElement, Exists, Subquery
+    from sqlalchemy.ext.asyncio import (
+        AsyncConnection,
+        AsyncEngine,
+        AsyncSession,
+    )
+
+LOGGER = logging.getLogger(__name__)
+
+# the number of concurrent requests to the LLM endpoint per job (if not specified)
+SUMMARY_CONCURRENCY = int(os.environ.get("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_JOB_BATCH_SIZE = 100
+
+
+class SummaryJobError(Exception):
+    """Raised when a summary job cannot be run."""
+
+
+async def get_stored_summary(
+    db_transaction: "AsyncSession", document_pkey: int, model_name: str
+) -> str | None:
+    """Return the stored summary of a document for the current prompt template.
+
+    :param db_transaction: A DB transaction.
+    :param document_pkey: The primary key of the document.
+    :param model_name: The model that generated the summary.
+    :return: The summary, or None if it has not been stored.
+    """
+    sql = select(ORMDocumentSummary.summary).where(
+        ORMDocumentSummary.document_pkey == document_pkey,
+        ORMDocumentSummary.model_name == model_name,
+        ORMDocumentSummary.prompt_hash == SUMMARY_PROMPT_HASH,
+    )
+    return (await db_transaction.execute(sql)).scalar_one_or_none()
+
+
+async def store_summaries(
+    connection: "AsyncConnection | AsyncSession",
+    corpus_pkey: int,
+    model_name: str,
+    prompt_hash: str,
+    summaries: "Iterable[tuple[int, str]]",
+) -> None:
+    """Store summaries of documents.
+
+    Existing summaries are kept.
+
+    :param connection: A DB connection or transaction.
+    :param corpus_pkey: The corpus of the documents.
+    :param model_name: The model that generated the summaries.
+    :param prompt_hash: The hash of the prompt template that was used.
+    :param summaries: The primary key and summary of each document.
+    """
+    values = [
+        {
+            "document_pkey": document_pkey,
+            "model_name": model_name,
+            "prompt_hash": prompt_hash,
+            "corpus_pkey": corpus_pkey,
+            "summary": summary,
+        }
+        for document_pkey, summary in summaries
+    ]
+    if values:
+        await connection.execute(
+            insert(ORMDocumentSummary).values(values).on_conflict_do_nothing()
+        )
+
+
+async def iter_summary_chunks(
+    stream: "AsyncIterable[Completion]",
+    engine: "AsyncEngine",
+    document_pkey: int,
+    corpus_pkey: int,
+    model_name: str,
+) -> "AsyncGenerator[str, None]":
+    """Yield the chunks of a streamed summary and store it once it is complete.
+
+    Incomplete summaries (e.g., if the client disconnects) are not stored.
+
+    :param stream: The completion stream.
+    :param engine: The engine whose connection pool is used to store the summary.
+    :param document_pkey: The primary key of the document.
+    :param corpus_pkey: The corpus of the document.
+    :param model_name: The model that generates the summary.
+    :yield: The chunks of the summary.
+    """
+    chunks = []
+    async for chunk in stream:
+        text = chunk.choices[0].text
+        chunks.append(text)
+        yield text
+    async with engine.begin() as connection:
+        await store_summaries(
+            connection,
+            corpus_pkey,
+            model_name,
+            SUMMARY_PROMPT_HASH,
+            [(document_pkey, "".join(chunks))],
+        )
+
+
+def get_summary_job_info(job: ORMSummaryJob) -> SummaryJob:
+    """Convert a summary job to its API representation, including its progress.
+
+    :param job: The summary job.
+    :return: The summary job with throughput and estimated remaining time (seconds).
+    """
+    items_per_second = job.num_processed / job.duration if job.duration > 0 else 0.0
+    eta = None
+    if job.status == "completed":
+        eta = 0.0
+    elif job.status in ("pending", "running") and items_per_second > 0:
+        eta = (job.num_items - job.num_processed) / items_per_second
+    return SummaryJob(
+        id=job.pkey,
+        corpus_name=job.corpus_name,
+        dataset_name=job.dataset_name,
+        model_name=job.model_name,
+        status=job.status,
+        error=job.error,
+        num_items=job.num_items,
+        num_processed=job.num_processed,
+        num_failed=job.num_failed,
+        items_per_second=items_per_second,
+        eta=eta,
+    )
+
+
+def _select_targets(
+    corpus_pkey: int, dataset_pkey: int | None, max_documents: int | None
+) -> "Subquery":
+    # all documents of the corpus, or the documents of the dataset with the most QRels
+    if dataset_pkey is None:
+        sql = (
+            select(
+                ORMDocument.pkey.label("document_pkey"),
+                literal_column("0").label("num_qrels"),
+            )
+            .where(ORMDocument.corpus_pkey == corpus_pkey)
+            .order_by(ORMDocument.pkey)
+        )
+    else:
+        sql = (
+            select(ORMQRel.document_pkey, func.count().label("num_qrels"))
+            .where(ORMQRel.dataset_pkey == dataset_pkey)
+            .group_by(ORMQRel.document_pkey)
+            .order_by(func.count().desc(), ORMQRel.document_pkey)
+        )
+    return sql.limit(max_documents).subquery("targets")
+
+
+def _is_summarized(job: ORMSummaryJob, document_pkey: "ColumnElement[int]") -> "Exists":
+    return exists().where(
+        ORMDocumentSummary.document_pkey == document_pkey,
+        ORMDocumentSummary.model_name == job.model_name,
+        ORMDocumentSummary.prompt_hash == job.prompt_hash,
+    )
+
+
+class SummaryJobRunner:
+    """Summarize documents in the background.
+
+    Jobs are persisted in the database and summaries are committed in batches, so that
+    unfinished jobs are resumed after a restart, skipping the summarized documents. Each
+    job is claimed by the runner of one backend process. The jobs of processes that
+    have died are claimed by the others, which look for them periodically (see
+    `JOB_RESCAN_INTERVAL`).
+    """
+
+    def __init__(self, max_concurrent_jobs: int = 1) -> None:
+        """Create a job runner.
+
+        :param max_concurrent_jobs: How many jobs to run concurrently.
+        """
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self._queue: asyncio.Queue[int] = asyncio.Queue()
+        self._orphaned: set[int] = set()
+        self._workers: list[asyncio.Task] = []
+        self._client: AsyncOpenAI | None = None
+        self._engine: AsyncEngine | None = None
+        self._connection: AsyncConnection | None = None
+        self._runner_pid = 0
+        self._session_maker: async_sessionmaker[AsyncSession] | None = None
+
+    @property
+    def session_maker(self) -> "async_sessionmaker[AsyncSession]":
+        """Session maker for the connection pool of the job runner.
+
+        :raises RuntimeError: When the job runner has not been started.
+        :return: The session maker.
+        """
+        if self._session_maker is None:
+            raise RuntimeError("The summary job runner has not been started.")
+        return self._session_maker
+
+    async def start(self, client: "AsyncOpenAI | None") -> None:
+        """Start the workers and resume unfinished jobs.
+
+        :param client: The client of the app (None if LLM services are not
+            available, in which case no jobs are run).
+        """
+        if client is None:
+            return
+        self._client = client
+
+        # jobs use their own connection pool so that they do not starve requests
+        self._engine = create_async_engine(
+            CONFIG.connection_string,  # pyright: ignore[reportArgumentType]
+            pool_size=self.max_concurrent_jobs + 1,
+        )
+        self._session_maker = async_sessionmaker(self._engine, expire_on_commit=False)
+        self._connection, self._runner_pid = await open_runner_connection(self._engine)
+
+        # jobs that are running in other processes are not claimed
+        async with self.session_maker() as session:
+            sql = (
+                select(ORMSummaryJob.pkey)
+                .where(ORMSummaryJob.status.in_(("pending", "running")))
+                .order_by(ORMSummaryJob.pkey)
+            )
+            for job_pkey in (await session.execute(sql)).scalars():
+                self._queue.put_nowait(job_pkey)
+
+        self._workers = [
+            asyncio.create_task(self._work()) for _ in range(self.max_concurrent_jobs)
+        ]
+        self._workers.append(asyncio.create_task(self._rescan()))
+
+    async def stop(self) -> None:
+        """Stop the workers.
+
+        Running jobs are interrupted and resumed on the next start (or by the runner
+        of another process).
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._connection is not None:
+            await self._connection.close()
+        if self._engine is not None:
+            await self._engine.dispose()
+        self._client = None
+
+    async def create_job(
+        self,
+        corpus_name: str,
+        dataset_name: str | None,
+        model_name: str,
+        max_documents: int | None = None,
+        concurrency: int = SUMMARY_CONCURRENCY,
+    ) -> SummaryJob:
+        """Create and queue a job.
+
+        :param corpus_name: The corpus whose documents are summarized.
+        :param dataset_name: If given, only the documents with QRels in this dataset
+            are summarized, starting with the most judged ones.
+        :param model_name: The model to use.
+        :param max_documents: The maximum number of documents to summarize.
+        :param concurrency: The number of concurrent requests to the LLM endpoint.
+        :return: The created job.
+        """
+        async with self.session_maker() as session, session.begin():
+            job = ORMSummaryJob(
+                corpus_name=corpus_name,
+                dataset_name=dataset_name,
+                model_name=model_name,
+                prompt_hash=SUMMARY_PROMPT_HASH,
+                max_documents=max_documents,
+                concurrency=concurrency,
+                status="pending",
+                runner_pid=self._runner_pid,
+            )
+            session.add(job)
+
+        self._queue.put_nowait(job.pkey)
+        return get_summary_job_info(job)
+
+    async def _rescan(self) -> None:
+        while True:
+            await asyncio.sleep(JOB_RESCAN_INTERVAL)
+            try:
+                async with self.session_maker() as session:
+                    sql = select_orphaned_jobs(ORMSummaryJob)
+                    job_pkeys = (await session.execute(sql)).scalars().all()
+            except Exception:
+                LOGGER.exception("failed to look for orphaned summary jobs")
+                continue
+            # jobs stay orphaned until they are claimed, they are queued only once
+            for job_pkey in job_pkeys:
+                if job_pkey not in self._orphaned:
+                    self._orphaned.add(job_pkey)
+                    self._queue.put_nowait(job_pkey)
+
+    async def _work(self) -> None:
+        while True:
+            job_pkey = await self._queue.get()
+            self._orphaned.discard(job_pkey)
+            try:
+                await self._run(job_pkey)
+            except Exception as e:
+                LOGGER.exception("summary job %d failed", job_pkey)
+                async with self.session_maker() as session, session.begin():
+                    await session.execute(
+                        update(ORMSummaryJob)
+                        .where(
+                            ORMSummaryJob.pkey == job_pkey,
+                            ORMSummaryJob.runner_pid == self._runner_pid,
+                        )
+                        .values(status="failed", error=str(e))
+                    )
+
+    async def _run(self, job_pkey: int) -> None:
+        async with self.session_maker() as session:
+            # the claim is committed first, so that a failed job is marked as such
+            sql = claim_job(ORMSummaryJob, job_pkey, self._runner_pid)
+            async with session.begin():
+                job = (await session.scalars(sql)).one_or_none()
+            # the job is run by another process
+            if job is None:
+                return
+
+            async with session.begin():
+                # summaries are generated with the current prompt template, they
+                # cannot be stored for the template of an earlier job
+                if job.prompt_hash != SUMMARY_PROMPT_HASH:
+                    raise SummaryJobError("The summary prompt template has changed.")
+                corpus_pkey = await get_corpus_pkey(session, job.corpus_name)
+                if corpus_pkey is None:
+                    raise SummaryJobError("The corpus does not exist.")
+                dataset_pkey = None
+                if job.dataset_name is not None:
+                    dataset_pkeys = await get_dataset_pkeys(
+                        session, job.corpus_name, job.dataset_name
+                    )
+                    if dataset_pkeys is None:
+                        raise SummaryJobError("The dataset does not exist.")
+                    dataset_pkey = dataset_pkeys[0]
+
+                # documents summarized before (e.g., by an interrupted run) are counted
+                targets = _select_targets(corpus_pkey, dataset_pkey, job.max_documents)
+                sql_count = select(
+                    func.count(),
+                    func.count().filter(_is_summarized(job, targets.c.document_pkey)),
+                ).select_from(targets)
+                job.num_items, job.num_processed = (
+                    await session.execute(sql_count)
+                ).one()
+                job.num_failed = 0
+
+            failed_pkeys: set[int] = set()
+            while True:
+                sql = (
+                    select(ORMDocument.pkey, ORMDocument.title, ORMDocument.text)
+                    .join(targets, targets.c.document_pkey == ORMDocument.pkey)
+                    .where(
+                        ORMDocument.corpus_pkey == corpus_pkey,
+                        ~_is_summarized(job, ORMDocument.pkey),
+                        ORMDocument.pkey.not_in(failed_pkeys),
+                    )
+                    .order_by(targets.c.num_qrels.desc(), ORMDocument.pkey)
+                    .limit(SUMMARY_JOB_BATCH_SIZE)
+                )
+                async with session.begin():
+                    batch = (await session.execute(sql)).tuples().all()
+                if not batch:
+                    break
+
+                start_time = time.perf_counter()
+                summaries, errors = await self._summarize(job, batch)
+                if not summaries:
+                    raise SummaryJobError(
+                        f"Failed to summarize a batch of documents: {errors[0]}"
+                    )
+                summarized_pkeys = {pkey for pkey, _ in summaries}
+                failed_pkeys.update(
+                    pkey for pkey, _, _ in batch if pkey not in summarized_pkeys
+                )
+                async with session.begin():
+                    await store_summaries(
+                        session, corpus_pkey, job.model_name, job.prompt_hash, summaries
+                    )
+                    job.num_processed += len(summaries)
+                    job.num_failed += len(errors)
+                    job.duration += time.perf_counter() - start_time
+
+            async with session.begin():
+                job.status = "completed"
+
+    async def _summarize(
+        self, job: ORMSummaryJob, batch: "Sequence[tuple[int, str | None, str]]"
+    ) -> tuple[list[tuple[int, str]], list[str]]:
+        client = self._client
+        if client is None:
+            raise SummaryJobError("LLM services not available.")
+        semaphore = asyncio.Semaphore(job.concurrency)
+
+        async def summarize(title: str | None, text: str) -> str:
+            async with semaphore:
+                completion = await client.completions.create(
+                    model=job.model_name, prompt=get_summary_prompt(text, title)
+                )
+            return completion.choices[0].text
+
+        results = await asyncio.gather(
+            *(summarize(title, text) for _, title, text in batch),
+            return_exceptions=True,
+        )
+        summaries, errors = [], []
+        for (pkey, _, _), result in zip(batch, results):
+            if isinstance(result, BaseException):
+                errors.append(str(result))
+            else:
+                summaries.append((pkey, result))
+        return summaries, errors
+
+
+async def provide_summary_job_runner(state: "State") -> SummaryJobRunner:
+    """Provide the summary job runner of the app.
+
+    :param state: The app state.
+    :return: The summary job runner.
+    """
+    return state.summary_job_runner
@@ -1,3 +1,4 @@
+import hashlib
 import os
 from string import Formatter
 from typing import TYPE_CHECKING
@@ -8,6 +9,10 @@ if TYPE_CHECKING:
 LLM_PROMPT_SUMMARY = os.environ.get("LLM_PROMPT_SUMMARY")
 LLM_PROMPT_RAG = os.environ.get("LLM_PROMPT_RAG")
 LLM_PROMPT_RAG_DOCUMENT = os.environ.get("LLM_PROMPT_RAG_DOCUMENT")
+# identifies stored summaries, which are regenerated when the template changes
+SUMMARY_PROMPT_HASH = hashlib.sha256((LLM_PROMPT_SUMMARY or "").encode()).hexdigest()[
+    :16
+]
 
 
 def has_valid_placeholders(s: str, allowed_placeholders: set[str]) -> bool:
@@ -23,10 +23,11 @@ class CorpusInfo:
 
 @dataclass
 class Corpus(CorpusInfo):
-    """Corpus with attributes and statistics."""
+    """Corpus with attributes and statistics (text size in bytes)."""
 
     num_datasets: int
     num_documents: int
+    text_size: int
 
 
 @dataclass
@@ -48,9 +49,14 @@ class DatasetRelevanceInfo(DatasetInfo):
 
 @dataclass
 class Dataset(DatasetRelevanceInfo):
-    """Dataset with attributes and statistics."""
+    """Dataset with attributes and statistics.
+
+    The relevance histogram maps relevance grades to the number of QRels.
+    """
 
     num_queries: int
+    num_qrels: int
+    relevance_histogram: dict[int, int]
 
 
 @dataclass
@@ -62,6 +68,14 @@ class QueryInfo:
     description: str | None
 
 
+@dataclass
+class RunQuery:
+    """A query to retrieve documents for, as part of a run."""
+
+    id: str
+    text: str
+
+
 @dataclass
 class Query(QueryInfo):
     """Query with attributes, associated dataset, and statistics."""
@@ -119,8 +133,187 @@ class QRel:
 
 @dataclass
 class Paginated(Generic[T]):
-    """Part of a list of items for pagination."""
+    """Part of a list of items for pagination.
+
+    If the page is full, the cursor can be used to fetch the next page. The total
+    number of items is None if it was not counted. If it is not exact, it is either
+    an estimate or a lower bound, depending on how it was counted.
+    """
 
     items: list[T]
     offset: int
-    total_num_items: int
+    total_num_items: int | None
+    is_exact: bool = True
+    next_cursor: str | None = None
+
+
+@dataclass
+class RunInfo:
+    """Run attributes."""
+
+    name: str
+    corpus_name: str
+    dataset_name: str
+
+
+@dataclass
+class Run(RunInfo):
+    """Run with attributes and statistics (number of ranked queries and documents)."""
+
+    num_queries: int
+    num_items: int
+
+
+@dataclass
+class RankedDocument:
+    """A document in a ranking."""
+
+    id: str
+    score: float
+
+
+@dataclass
+class RunRanking:
+    """The ranking of a run for a query."""
+
+    query_id: str
+    items: list[RankedDocument]
+
+
+@dataclass
+class Evaluation:
+    """Metrics of a run for a dataset, on average and for each query.
+
+    The metrics with a cutoff only consider the top documents of each query.
+    """
+
+    cutoff: int
+    num_queries: int
+    metrics: dict[str, float]
+    query_metrics: dict[str, dict[str, float]]
+
+
+@dataclass
+class RunPairComparison:
+    """Comparison of a run with the baseline run, over all evaluated queries.
+
+    The deltas are the metric of the run minus the metric of the baseline. The rank
+    correlations are averaged over the queries ranked by both runs.
+    """
+
+    run_name: str
+    mean_delta: float
+    num_wins: int
+    num_ties: int
+    num_losses: int
+    t_statistic: float | None
+    t_test_p_value: float
+    randomization_p_value: float
+    bootstrap_p_value: float
+    kendall_tau: float | None
+    rank_biased_overlap: float | None
+
+
+@dataclass
+class RunComparison:
+    """Comparison of runs for a dataset using a metric, on average and for each query.
+
+    All runs are compared with the first run (the baseline).
+    """
+
+    metric: str
+    cutoff: int
+    num_queries: int
+    num_permutations: int
+    metrics: dict[str, float]
+    comparisons: list[RunPairComparison]
+    query_metrics: dict[str, dict[str, float]]
+
+
+@dataclass
+class IngestResult:
+    """Number of ingested items and throughput."""
+
+    num_items: int
+    duration: float
+    items_per_second: float
+
+
+@dataclass
+class QRelIngestResult(IngestResult):
+    """Number of ingested QRels, throughput, and number of unresolved QRels."""
+
+    num_unresolved: int
+
+
+@dataclass
+class RunIngestResult(IngestResult):
+    """Number of ingested lines of a run, throughput, and number of ranked queries.
+
+    Lines whose query or document does not exist are unresolved.
+    """
+
+    num_queries: int
+    num_unresolved: int
+
+
+@dataclass
+class IngestJob:
+    """Background ingest job with its progress."""
+
+    id: int
+    kind: str
+    corpus_name: str
+    dataset_name: str | None
+    status: str
+    error: str | None
+    num_items: int
+    num_processed: int
+    num_unresolved: int
+    items_per_second: float
+    eta: float | None
+
+
+@dataclass
+class SummaryJob:
+    """Background job that summarizes documents, with its progress."""
+
+    id: int
+    corpus_name: str
+    dataset_name: str | None
+    model_name: str
+    status: str
+    error: str | None
+    num_items: int
+    num_processed: int
+    num_failed: int
+    items_per_second: float
+    eta: float | None
+
+
+@dataclass
+class IndexStatus:
+    """Index status, size (in bytes), and build progress (if it is being built).
+
+    The partition is only set for detached partitions, which lack the index.
+    """
+
+    name: str
+    table_name: str
+    partition_name: str | None
+    status: str
+    size: int
+    build_phase: str | None
+    build_progress: float | None
+
+
+@dataclass
+class CacheStatistics:
+    """Response cache usage (sizes in bytes) and counters."""
+
+    num_entries: int
+    size: int
+    max_size: int
+    num_hits: int
+    num_misses: int
+    num_evictions: int
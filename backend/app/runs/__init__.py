@@ -0,0 +1,82 @@
+"""Module for runs, i.e., rankings of documents for the queries of a dataset.
+
+Runs are exchanged in the TREC format, one line per ranked document:
+`query_id Q0 document_id rank score tag`.
+"""
+
+from typing import TYPE_CHECKING
+
+from ingest.ndjson import LineTooLongError, iter_lines
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, AsyncIterable, Iterable
+
+
+class InvalidRunLineError(Exception):
+    """Raised when a line of a run is not in the TREC format."""
+
+    def __init__(self, line_number: int, error: str) -> None:
+        """Create an error for a specific line.
+
+        :param line_number: The (1-based) line number.
+        :param error: The error message.
+        """
+        super().__init__(f"Invalid run in line {line_number}: {error}")
+        self.line_number = line_number
+        self.error = error
+
+
+def _parse_line(line: bytes, line_number: int) -> tuple[str, str, float] | None:
+    fields = line.split()
+    if not fields:
+        return None
+    if len(fields) != 6:
+        raise InvalidRunLineError(line_number, f"expected 6 fields, got {len(fields)}")
+    try:
+        score = float(fields[4])
+    except ValueError as e:
+        raise InvalidRunLineError(line_number, str(e)) from e
+    return fields[0].decode(), fields[2].decode(), score
+
+
+def format_run_lines(
+    query_id: str, ranking: "Iterable[tuple[str, float]]", tag: str
+) -> str:
+    """Format the ranking of a query in the TREC run format.
+
+    :param query_id: The query ID.
+    :param ranking: The document IDs and scores, ordered by rank.
+    :param tag: The name of the run.
+    :return: The lines of the run, each terminated by a newline.
+    """
+    return "".join(
+        f"{query_id} Q0 {document_id} {rank} {score} {tag}\n"
+        for rank, (document_id, score) in enumerate(ranking, start=1)
+    )
+
+
+async def iter_run_batches(
+    chunks: "AsyncIterable[bytes]",
+) -> "AsyncGenerator[list[tuple[str, str, float]], None]":
+    """Parse a stream of chunks of a run in the TREC format.
+
+    Chunks may split lines at arbitrary positions. Empty lines are skipped. The ranks
+    are ignored, as the documents are ranked by their scores.
+
+    :param chunks: The raw byte chunks.
+    :raises InvalidRunLineError: When a line is not in the TREC format or is longer
+        than `INGEST_MAX_LINE_LENGTH`.
+    :yield: The query ID, document ID, and score of the complete lines of each chunk.
+    """
+    line_number = 0
+    try:
+        async for lines in iter_lines(chunks):
+            batch = []
+            for line in lines:
+                line_number += 1
+                if (item := _parse_line(line, line_number)) is not None:
+                    batch.append(item)
+            if batch:
+                yield batch
+    except LineTooLongError as e:
+        raise InvalidRunLineError(e.line_number, e.error) from e
@@ -0,0 +1,195 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+import numpy as np
+from db.schema import ORMQuery, ORMRunRanking
+from sqlalchemy import select
+
+from runs.evaluation import compute_metrics
+from runs.significance import count_bootstrapped, count_randomized, rank_correlations
+from runs.storage import decode_ranking
+
+if TYPE_CHECKING:
+    from cache.qrels import Qrels
+    from litestar.datastructures import State
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from runs.evaluation import Metric
+
+# each worker process uses one CPU core
+COMPARISON_WORKERS = int(os.environ.get("COMPARISON_WORKERS", "4"))
+# the rank correlations take memory quadratic in the cutoff
+COMPARISON_MAX_CUTOFF = int(os.environ.get("COMPARISON_MAX_CUTOFF", "1000"))
+COMPARISON_MAX_PERMUTATIONS = int(
+    os.environ.get("COMPARISON_MAX_PERMUTATIONS", "100000")
+)
+RBO_PERSISTENCE = 0.9
+
+
+class ComparisonPool:
+    """Run the significance tests of run comparisons on worker processes."""
+
+    def __init__(self, max_workers: int = COMPARISON_WORKERS) -> None:
+        """Create a pool.
+
+        :param max_workers: The number of worker processes.
+        """
+        self.max_workers = max_workers
+        self._executor: ProcessPoolExecutor | None = None
+
+    async def start(self) -> None:
+        """Create the executor, the workers are started on demand."""
+        # forking a process with running threads is unsafe, so workers are spawned
+        self._executor = ProcessPoolExecutor(
+            self.max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    async def stop(self) -> None:
+        """Shut down the workers, pending tests are cancelled."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def test_significance(
+        self, deltas: np.ndarray, num_permutations: int, seed: int = 0
+    ) -> tuple[float, float]:
+        """Perform a randomization test and a bootstrap test of paired differences.
+
+        The permutations and samples are split evenly between the workers.
+
+        :param deltas: The differences between the paired values.
+        :param num_permutations: The number of permutations and bootstrap samples.
+        :param seed: The seed of the random number generators.
+        :raises RuntimeError: When the pool has not been started.
+        :return: The two-sided p-values of the randomization and bootstrap tests.
+        """
+        if self._executor is None:
+            raise RuntimeError("The comparison pool has not been started.")
+
+        num_workers = min(self.max_workers, num_permutations)
+        sizes = [
+            num_permutations // num_workers + (i < num_permutations % num_workers)
+            for i in range(num_workers)
+        ]
+        seeds = iter(np.random.SeedSequence(seed).generate_state(2 * num_workers))
+        loop = asyncio.get_running_loop()
+        counts = await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, count, deltas, size, next(seeds))
+                for count in (count_randomized, count_bootstrapped)
+                for size in sizes
+            )
+        )
+        return (
+            (sum(counts[:num_workers]) + 1) / (num_permutations + 1),
+            (sum(counts[num_workers:]) + 1) / (num_permutations + 1),
+        )
+
+
+async def provide_comparison_pool(state: "State") -> ComparisonPool:
+    """Provide the comparison pool of the app.
+
+    :param state: The app state.
+    :return: The comparison pool.
+    """
+    return state.comparison_pool
+
+
+async def load_run(
+    db_transaction: "AsyncSession",
+    run_pkey: int,
+    dataset_pkey: int,
+    qrels: "Qrels",
+    depth: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Load a stored run into arrays for `compute_metrics` and `rank_correlations`.
+
+    Queries and documents are numbered as in the QRels. Documents without QRels get
+    the number -1, queries without QRels are skipped.
+
+    :param db_transaction: A DB transaction.
+    :param run_pkey: The primary key of the run.
+    :param dataset_pkey: The primary key of the dataset of the run.
+    :param qrels: The QRels.
+    :param depth: The number of top documents per query for the rank correlations.
+    :return: The query numbers, document numbers, and scores, and the top document
+        primary keys of each query (padded with -1).
+    """
+    query_numbers = {id: i for i, id in enumerate(qrels.query_ids)}
+    document_order = np.argsort(qrels.document_pkeys)
+    sorted_document_pkeys = qrels.document_pkeys[document_order]
+    top_documents = np.full((len(qrels.query_ids), depth), -1, np.int32)
+
+    sql = (
+        select(ORMQuery.id, ORMRunRanking.document_pkeys, ORMRunRanking.scores)
+        .join(ORMQuery, ORMQuery.pkey == ORMRunRanking.query_pkey)
+        .where(
+            ORMRunRanking.run_pkey == run_pkey,
+            ORMQuery.dataset_pkey == dataset_pkey,
+        )
+    )
+    run_query_numbers, document_pkeys, scores = [], [], []
+    for query_id, *ranking in (await db_transaction.execute(sql)).tuples():
+        query_number = query_numbers.get(query_id)
+        if query_number is None:
+            continue
+        ranking_document_pkeys, ranking_scores = decode_ranking(*ranking)
+        top = ranking_document_pkeys[:depth]
+        top_documents[query_number, : len(top)] = top
+        run_query_numbers.append(np.full(len(ranking_scores), query_number, np.int32))
+        document_pkeys.append(ranking_document_pkeys)
+        scores.append(ranking_scores)
+    if not scores:
+        empty = np.empty(0, np.int32)
+        return empty, empty, np.empty(0, np.float32), top_documents
+
+    document_pkeys = np.concatenate(document_pkeys)
+    document_numbers = np.full(len(document_pkeys), -1, np.int32)
+    if len(sorted_document_pkeys) > 0:
+        positions = np.minimum(
+            np.searchsorted(sorted_document_pkeys, document_pkeys),
+            len(sorted_document_pkeys) - 1,
+        )
+        is_judged = sorted_document_pkeys[positions] == document_pkeys
+        document_numbers[is_judged] = document_order[positions[is_judged]]
+    return (
+        np.concatenate(run_query_numbers),
+        document_numbers,
+        np.concatenate(scores).astype(np.float32),
+        top_documents,
+    )
+
+
+def compute_comparison(
+    qrels: "Qrels",
+    runs: "list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]",
+    metric: "Metric",
+    cutoff: int,
+) -> tuple[np.ndarray, list[np.ndarray], list[tuple[np.ndarray, np.ndarray]]]:
+    """Compute a metric for each run and the rank correlations with the first run.
+
+    :param qrels: The QRels.
+    :param runs: The runs, see `load_run`. The first run is the baseline.
+    :param metric: The metric.
+    :param cutoff: The number of top documents to evaluate.
+    :return: The numbers of the evaluated queries, the metric of each run for these
+        queries, and Kendall's tau and rank-biased overlap of each other run with the
+        baseline for these queries.
+    """
+    evaluated = np.empty(0, np.int64)
+    values = []
+    for query_numbers, document_numbers, scores, _ in runs:
+        evaluated, metrics = compute_metrics(
+            qrels, query_numbers, document_numbers, scores, cutoff
+        )
+        values.append(metrics[metric])
+
+    baseline = runs[0][3][evaluated]
+    correlations = [
+        rank_correlations(baseline, top_documents[evaluated], RBO_PERSISTENCE)
+        for *_, top_documents in runs[1:]
+    ]
+    return evaluated, values, correlations
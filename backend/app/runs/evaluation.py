@@ -0,0 +1,213 @@
+from array import array
+from typing import TYPE_CHECKING, Literal, get_args
+
+import numpy as np
+from cache.qrels import Qrels
+from db.schema import ORMDataset, ORMDocument, ORMQRel, ORMQuery
+from sqlalchemy import select
+
+from runs import iter_run_batches
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterable
+
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+Metric = Literal["ndcg", "map", "mrr", "precision", "recall"]
+METRIC_NAMES: tuple[Metric, ...] = get_args(Metric)
+
+
+def _group_ranks(groups: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # the 1-based rank of each entry within its group and the start of the groups,
+    # the groups must be contiguous
+    starts = np.flatnonzero(np.diff(groups, prepend=-1))
+    sizes = np.diff(np.append(starts, len(groups)))
+    ranks = np.arange(1, len(groups) + 1) - np.repeat(starts, sizes)
+    return ranks, np.repeat(starts, sizes)
+
+
+async def load_qrels(
+    db_transaction: "AsyncSession", dataset_pkey: int, corpus_pkey: int
+) -> Qrels:
+    """Load the QRels of a dataset into arrays.
+
+    :param db_transaction: A DB transaction.
+    :param dataset_pkey: The primary key of the dataset.
+    :param corpus_pkey: The primary key of the corpus of the dataset.
+    :return: The QRels.
+    """
+    sql_threshold = select(ORMDataset.relevance_threshold).where(
+        ORMDataset.pkey == dataset_pkey
+    )
+    relevance_threshold = (await db_transaction.execute(sql_threshold)).scalar_one()
+
+    # the partition keys of all tables are given, so that only one partition is read
+    sql = (
+        select(ORMQuery.id, ORMDocument.id, ORMDocument.pkey, ORMQRel.relevance)
+        .select_from(ORMQRel)
+        .join(ORMQuery)
+        .join(ORMDocument)
+        .where(
+            ORMQRel.dataset_pkey == dataset_pkey,
+            ORMQuery.dataset_pkey == dataset_pkey,
+            ORMDocument.corpus_pkey == corpus_pkey,
+        )
+    )
+    query_numbers: dict[str, int] = {}
+    document_numbers: dict[str, int] = {}
+    document_pkeys: list[int] = []
+    qrel_query_numbers: list[int] = []
+    qrel_document_numbers: list[int] = []
+    relevances: list[int] = []
+    for query_id, document_id, document_pkey, relevance in (
+        await db_transaction.execute(sql)
+    ).tuples():
+        qrel_query_numbers.append(
+            query_numbers.setdefault(query_id, len(query_numbers))
+        )
+        document_number = document_numbers.setdefault(
+            document_id, len(document_numbers)
+        )
+        if document_number == len(document_pkeys):
+            document_pkeys.append(document_pkey)
+        qrel_document_numbers.append(document_number)
+        relevances.append(relevance)
+
+    qrels_query_numbers = np.array(qrel_query_numbers, np.int32)
+    qrels_document_numbers = np.array(qrel_document_numbers, np.int32)
+    order = np.lexsort((qrels_document_numbers, qrels_query_numbers))
+    return Qrels(
+        relevance_threshold,
+        list(query_numbers),
+        list(document_numbers),
+        np.array(document_pkeys, np.int32),
+        qrels_query_numbers[order],
+        qrels_document_numbers[order],
+        np.array(relevances, np.int32)[order],
+    )
+
+
+async def read_run(
+    chunks: "AsyncIterable[bytes]", qrels: Qrels
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Read a run in the TREC format into arrays for `compute_metrics`.
+
+    Queries and documents are numbered as in the QRels. Documents without QRels get
+    the number -1, queries without QRels are skipped.
+
+    :param chunks: The raw byte chunks of the run.
+    :param qrels: The QRels.
+    :raises InvalidRunLineError: When a line is not in the TREC format.
+    :return: The query numbers, document numbers, and scores.
+    """
+    query_numbers = {id: i for i, id in enumerate(qrels.query_ids)}
+    document_numbers = {id: i for i, id in enumerate(qrels.document_ids)}
+    run_query_numbers, run_document_numbers, scores = array("i"), array("i"), array("f")
+    async for batch in iter_run_batches(chunks):
+        for query_id, document_id, score in batch:
+            query_number = query_numbers.get(query_id)
+            if query_number is None:
+                continue
+            run_query_numbers.append(query_number)
+            run_document_numbers.append(document_numbers.get(document_id, -1))
+            scores.append(score)
+    return (
+        np.frombuffer(run_query_numbers, np.int32),
+        np.frombuffer(run_document_numbers, np.int32),
+        np.frombuffer(scores, np.float32),
+    )
+
+
+def compute_metrics(
+    qrels: Qrels,
+    query_numbers: np.ndarray,
+    document_numbers: np.ndarray,
+    scores: np.ndarray,
+    cutoff: int,
+) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """Compute the metrics of a run for all queries at once.
+
+    The run is given as one entry per ranked document, with queries and documents
+    numbered as in the QRels. Documents without QRels have the number -1, entries for
+    other queries must be omitted. The documents of each query are ranked by their
+    scores (ties keep their order).
+
+    Documents count as relevant if their relevance is at least the threshold of the
+    dataset. nDCG uses the relevance (if positive) as gain. The metrics are computed
+    for the cutoff, except for MAP and MRR, which use the whole ranking. All queries
+    with relevant documents are evaluated, queries that are not in the run get zeros.
+
+    :param qrels: The QRels.
+    :param query_numbers: The query of each entry.
+    :param document_numbers: The document of each entry.
+    :param scores: The score of each entry.
+    :param cutoff: The number of top documents to evaluate.
+    :return: The numbers of the evaluated queries and their metrics (see
+        `METRIC_NAMES`).
+    """
+    num_queries = len(qrels.query_ids)
+    num_documents = max(len(qrels.document_ids), 1)
+
+    order = np.lexsort((-scores, query_numbers))
+    query_numbers = query_numbers[order].astype(np.int64)
+    document_numbers = document_numbers[order].astype(np.int64)
+    ranks, starts = _group_ranks(query_numbers)
+
+    # look up the relevance of each entry, the QRels are sorted by their keys
+    qrel_keys = qrels.query_numbers.astype(np.int64) * num_documents
+    qrel_keys += qrels.document_numbers
+    keys = query_numbers * num_documents + document_numbers
+    positions = np.minimum(np.searchsorted(qrel_keys, keys), len(qrel_keys) - 1)
+    judged = (document_numbers >= 0) & (qrel_keys[positions] == keys)
+    relevances = np.where(judged, qrels.relevances[positions], 0)
+    is_relevant = judged & (relevances >= qrels.relevance_threshold)
+    in_cutoff = ranks <= cutoff
+
+    num_relevant = np.bincount(
+        qrels.query_numbers,
+        weights=qrels.relevances >= qrels.relevance_threshold,
+        minlength=num_queries,
+    )
+
+    def per_query(weights: np.ndarray) -> np.ndarray:
+        return np.bincount(query_numbers, weights=weights, minlength=num_queries)
+
+    def divide(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return np.divide(a, b, out=np.zeros(num_queries), where=b > 0)
+
+    discounts = 1 / np.log2(ranks + 1)
+    dcg = per_query(np.where(in_cutoff, np.maximum(relevances, 0) * discounts, 0))
+    ideal_order = np.lexsort((-qrels.relevances, qrels.query_numbers))
+    ideal_ranks, _ = _group_ranks(qrels.query_numbers[ideal_order])
+    idcg = np.bincount(
+        qrels.query_numbers[ideal_order],
+        weights=np.where(
+            ideal_ranks <= cutoff,
+            np.maximum(qrels.relevances[ideal_order], 0) / np.log2(ideal_ranks + 1),
+            0,
+        ),
+        minlength=num_queries,
+    )
+
+    # the number of relevant documents up to each rank, within each query
+    cumulative_relevant = np.cumsum(is_relevant)
+    cumulative_relevant -= cumulative_relevant[starts] - is_relevant[starts]
+    average_precision = divide(
+        per_query(np.where(is_relevant, cumulative_relevant / ranks, 0)), num_relevant
+    )
+
+    reciprocal_rank = np.zeros(num_queries)
+    relevant_entries = np.flatnonzero(is_relevant)
+    queries, first = np.unique(query_numbers[relevant_entries], return_index=True)
+    reciprocal_rank[queries] = 1 / ranks[relevant_entries[first]]
+
+    num_relevant_retrieved = per_query(in_cutoff & is_relevant)
+    metrics = {
+        "ndcg": divide(dcg, idcg),
+        "map": average_precision,
+        "mrr": reciprocal_rank,
+        "precision": num_relevant_retrieved / cutoff,
+        "recall": divide(num_relevant_retrieved, num_relevant),
+    }
+    evaluated = np.flatnonzero(num_relevant > 0)
+    return evaluated, {name: values[evaluated] for name, values in metrics.items()}
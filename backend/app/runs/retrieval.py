@@ -0,0 +1,89 @@
+import asyncio
+import os
+from typing import TYPE_CHECKING
+
+from db.schema import ORMDocument
+from paradedb.sqlalchemy import pdb, search
+from sqlalchemy import desc, select
+
+from runs import format_run_lines
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, Iterable
+
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+# each concurrent query uses its own connection, so this must not exceed the pool size
+RETRIEVAL_CONCURRENCY = int(os.environ.get("RETRIEVAL_CONCURRENCY", "4"))
+
+
+async def _retrieve(
+    engine: "AsyncEngine",
+    corpus_pkey: int,
+    query_id: str,
+    text: str,
+    num_results: int,
+    tag: str,
+) -> str:
+    sql = (
+        select(  # pyright: ignore[reportCallIssue]
+            ORMDocument.id,
+            pdb.score(ORMDocument.pkey).label("score"),  # pyright: ignore[reportArgumentType,reportAttributeAccessIssue]
+        )
+        .where(
+            search.match_any(ORMDocument.text, text),  # pyright: ignore[reportArgumentType]
+            ORMDocument.corpus_pkey == corpus_pkey,
+        )
+        .order_by(desc("score"))
+        .order_by(ORMDocument.pkey)
+        .limit(num_results)
+    )
+    async with engine.connect() as connection:
+        ranking = (await connection.execute(sql)).all()
+    return format_run_lines(query_id, ranking, tag)
+
+
+async def iter_bm25_run(
+    engine: "AsyncEngine",
+    corpus_pkey: int,
+    queries: "Iterable[tuple[str, str]]",
+    num_results: int,
+    tag: str,
+    concurrency: int = RETRIEVAL_CONCURRENCY,
+) -> "AsyncGenerator[str, None]":
+    """Retrieve documents for many queries using BM25 and yield a TREC run.
+
+    The queries are executed concurrently, each on a connection from the pool. The
+    ranking of a query is yielded as soon as it is complete, so the queries of the run
+    are not in order. New queries are only started while the output is consumed.
+
+    :param engine: The engine whose connection pool is used.
+    :param corpus_pkey: The corpus to retrieve documents from.
+    :param queries: The IDs and texts of the queries.
+    :param num_results: The number of documents to retrieve per query.
+    :param tag: The name of the run.
+    :param concurrency: The maximum number of concurrent queries.
+    :yield: The lines of the run for one query at a time.
+    """
+    queries = iter(queries)
+    pending: set[asyncio.Task[str]] = set()
+    try:
+        while True:
+            for query_id, text in queries:
+                pending.add(
+                    asyncio.create_task(
+                        _retrieve(engine, corpus_pkey, query_id, text, num_results, tag)
+                    )
+                )
+                if len(pending) >= concurrency:
+                    break
+            if not pending:
+                return
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,196 @@
+"""Statistics for comparing runs, computed with NumPy.
+
+This module has no dependencies on the app, so that its functions can be executed by
+worker processes.
+"""
+
+import math
+
+import numpy as np
+
+# the maximum number of elements of intermediate arrays
+_MAX_CHUNK_ELEMENTS = 1 << 22
+
+
+def _regularized_incomplete_beta(a: float, b: float, x: float) -> float:
+    # continued fraction (modified Lentz's method), which converges quickly for
+    # x < (a + 1) / (a + b + 2), otherwise the symmetry relation is used
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    if x > (a + 1) / (a + b + 2):
+        return 1.0 - _regularized_incomplete_beta(b, a, 1.0 - x)
+
+    tiny = 1e-300
+    log_front = (
+        math.lgamma(a + b)
+        - math.lgamma(a)
+        - math.lgamma(b)
+        + a * math.log(x)
+        + b * math.log1p(-x)
+    )
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, 1000):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= c * d
+        if abs(c * d - 1.0) < 1e-15:
+            break
+    return math.exp(log_front) * result / a
+
+
+def paired_t_test(deltas: np.ndarray) -> tuple[float | None, float]:
+    """Perform a two-sided paired t-test.
+
+    :param deltas: The differences between the paired values.
+    :return: The t statistic (None if it is undefined) and the p-value.
+    """
+    num_values = len(deltas)
+    mean = float(deltas.mean()) if num_values > 0 else 0.0
+    std = float(deltas.std(ddof=1)) if num_values > 1 else 0.0
+    if std == 0.0:
+        return None, 1.0 if mean == 0.0 else 0.0
+    t = mean / (std / math.sqrt(num_values))
+    df = num_values - 1
+    return t, _regularized_incomplete_beta(df / 2, 0.5, df / (df + t * t))
+
+
+def count_randomized(deltas: np.ndarray, num_permutations: int, seed: int) -> int:
+    """Count random sign flips of paired differences with an extreme mean.
+
+    This is one part of a two-sided randomization test, which swaps the paired values
+    at random.
+
+    :param deltas: The differences between the paired values.
+    :param num_permutations: The number of random permutations.
+    :param seed: The seed of the random number generator.
+    :return: The number of permutations whose absolute mean is at least the observed
+        one.
+    """
+    rng = np.random.default_rng(seed)
+    total = deltas.sum()
+    threshold = abs(total) * (1 - 1e-9)
+    batch_size = max(1, _MAX_CHUNK_ELEMENTS // max(len(deltas), 1))
+    count = 0
+    for start in range(0, num_permutations, batch_size):
+        size = min(batch_size, num_permutations - start)
+        flipped = rng.integers(0, 2, (size, len(deltas)), dtype=np.int8)
+        count += int((np.abs(total - 2 * (flipped @ deltas)) >= threshold).sum())
+    return count
+
+
+def count_bootstrapped(deltas: np.ndarray, num_samples: int, seed: int) -> int:
+    """Count bootstrap samples of centered paired differences with an extreme mean.
+
+    This is one part of a two-sided bootstrap test, which resamples the differences
+    after shifting their mean to zero.
+
+    :param deltas: The differences between the paired values.
+    :param num_samples: The number of bootstrap samples.
+    :param seed: The seed of the random number generator.
+    :return: The number of samples whose absolute mean is at least the observed one.
+    """
+    rng = np.random.default_rng(seed)
+    total = deltas.sum()
+    threshold = abs(total) * (1 - 1e-9)
+    centered = deltas - deltas.mean()
+    batch_size = max(1, _MAX_CHUNK_ELEMENTS // max(len(deltas), 1))
+    count = 0
+    for start in range(0, num_samples, batch_size):
+        size = min(batch_size, num_samples - start)
+        samples = centered[rng.integers(0, len(deltas), (size, len(deltas)))]
+        count += int((np.abs(samples.sum(axis=1)) >= threshold).sum())
+    return count
+
+
+def rank_correlations(
+    rankings_a: np.ndarray, rankings_b: np.ndarray, persistence: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Compute the rank correlations of the rankings of two runs for many queries.
+
+    Kendall's tau (tau-a) is computed for the documents that are in both rankings.
+    Rank-biased overlap is extrapolated from the lengths of the rankings (Webber et
+    al., 2010), so identical rankings have an overlap of one.
+
+    :param rankings_a: The documents of the first run, one row per query, ordered by
+        rank and padded with -1.
+    :param rankings_b: The documents of the second run, with the same shape.
+    :param persistence: The persistence of rank-biased overlap, in (0, 1).
+    :return: Kendall's tau and rank-biased overlap of each query, NaN if a query is
+        not ranked by both runs or tau is undefined.
+    """
+    num_queries, depth = rankings_a.shape
+    tau = np.full(num_queries, np.nan)
+    rbo = np.full(num_queries, np.nan)
+    if depth == 0:
+        return tau, rbo
+
+    upper = np.triu(np.ones((depth, depth), bool), 1)
+    depths = np.arange(1, depth + 1)
+    weights = persistence**depths / depths
+    chunk_size = max(1, _MAX_CHUNK_ELEMENTS // depth**2)
+    for start in range(0, num_queries, chunk_size):
+        a = rankings_a[start : start + chunk_size]
+        b = rankings_b[start : start + chunk_size]
+        matches = (a[:, :, None] == b[:, None, :]) & (a[:, :, None] >= 0)
+        is_common = matches.any(axis=2)
+        # the rank in b of each document of a, in the order of a
+        ranks_b = matches.argmax(axis=2).astype(np.int16)
+
+        # the common documents have distinct ranks, so each pair (ordered by the
+        # ranks in a) is either concordant or discordant
+        pairs = is_common[:, :, None] & is_common[:, None, :] & upper
+        pairs &= ranks_b[:, :, None] < ranks_b[:, None, :]
+        num_common = is_common.sum(axis=1)
+        num_pairs = num_common * (num_common - 1) // 2
+        tau[start : start + len(a)] = np.divide(
+            2 * pairs.sum(axis=(1, 2)) - num_pairs,
+            num_pairs,
+            out=np.full(len(a), np.nan),
+            where=num_pairs > 0,
+        )
+
+        # a common document is in both prefixes from the larger of its ranks on,
+        # the overlap at each depth is the cumulative count
+        both_ranks = np.maximum(np.arange(depth), ranks_b)
+        rows = np.repeat(np.arange(len(a)), depth) * depth
+        overlap = (
+            np.bincount(
+                (rows + both_ranks.ravel())[is_common.ravel()],
+                minlength=len(a) * depth,
+            )
+            .reshape(len(a), depth)
+            .cumsum(axis=1)
+        )
+        # the overlap of the longer ranking with all documents of the shorter one
+        # is extrapolated with the proportion at the length of the shorter one
+        lengths_a, lengths_b = (a >= 0).sum(axis=1), (b >= 0).sum(axis=1)
+        short = np.maximum(np.minimum(lengths_a, lengths_b), 1)[:, None]
+        long = np.maximum(np.maximum(lengths_a, lengths_b), 1)[:, None]
+        overlap_short = np.take_along_axis(overlap, short - 1, axis=1)
+        overlap_long = np.take_along_axis(overlap, long - 1, axis=1)
+        summed = np.where(depths <= long, overlap * weights, 0.0).sum(axis=1)
+        summed += np.where(
+            (depths > short) & (depths <= long),
+            overlap_short * (depths - short) / short * weights,
+            0.0,
+        ).sum(axis=1)
+        extrapolated = (
+            (overlap_long - overlap_short) / long + overlap_short / short
+        ) * persistence**long
+        is_ranked = (a[:, 0] >= 0) & (b[:, 0] >= 0)
+        rbo[start : start + len(a)] = np.where(
+            is_ranked,
+            (1 - persistence) / persistence * summed + extrapolated[:, 0],
+            np.nan,
+        )
+    return tau, rbo
@@ -0,0 +1,202 @@
+from typing import TYPE_CHECKING
+
+import numpy as np
+from db.schema import ORMDocument, ORMQuery, ORMRun, ORMRunRanking
+from ingest import copy_records
+from sqlalchemy import (
+    ARRAY,
+    Column,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    and_,
+    func,
+    insert,
+    literal,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from runs import format_run_lines
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, Iterable
+
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+# the number of rankings that are exported at once
+RUN_EXPORT_BATCH_SIZE = 1000
+
+RUN_STAGING_TABLE = Table(
+    "run_staging",
+    MetaData(),
+    Column("query_id", String, nullable=False),
+    Column("document_id", String, nullable=False),
+    Column("score", Float(precision=24), nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
+def decode_ranking(
+    document_pkeys: bytes, scores: bytes
+) -> tuple[np.ndarray, np.ndarray]:
+    """Decode a ranking stored in `ORMRunRanking`.
+
+    :param document_pkeys: The stored document primary keys.
+    :param scores: The stored scores.
+    :return: The document primary keys and scores, ordered by rank.
+    """
+    return np.frombuffer(document_pkeys, ">i4"), np.frombuffer(scores, ">f4")
+
+
+async def stage_run(
+    db_transaction: "AsyncSession", lines: "Iterable[tuple[str, str, float]]"
+) -> int:
+    """Insert lines of a run into a temporary staging table using COPY.
+
+    The staging table only exists until the end of the transaction.
+
+    :param db_transaction: A DB transaction.
+    :param lines: The query ID, document ID, and score of each line.
+    :return: The number of staged lines.
+    """
+    connection = await db_transaction.connection()
+    await connection.run_sync(RUN_STAGING_TABLE.create, checkfirst=True)
+    return await copy_records(
+        db_transaction, RUN_STAGING_TABLE, RUN_STAGING_TABLE.c, lines
+    )
+
+
+async def resolve_staged_run(
+    db_transaction: "AsyncSession", run_pkey: int, dataset_pkey: int, corpus_pkey: int
+) -> tuple[int, int]:
+    """Store the rankings of all staged lines whose query and document exist.
+
+    Query and document IDs are resolved using a single join, lines that cannot be
+    resolved are skipped. The documents of each query are ranked by their scores and
+    aggregated into a single row, without passing through the application. The
+    numbers of queries and documents of the run are updated.
+
+    :param db_transaction: A DB transaction.
+    :param run_pkey: The primary key of the run.
+    :param dataset_pkey: The primary key of the dataset of the run.
+    :param corpus_pkey: The primary key of the corpus of the dataset.
+    :return: The number of stored lines and the number of ranked queries.
+    """
+    # temporary tables are not analyzed automatically, the planner needs statistics
+    # to choose a hash join
+    await db_transaction.execute(text(f"ANALYZE {RUN_STAGING_TABLE.name}"))
+
+    staging = RUN_STAGING_TABLE.c
+    # the send functions return the binary representations (big-endian)
+    rank_order = (staging.score.desc(), ORMDocument.pkey)
+    sql_insert = insert(ORMRunRanking).from_select(
+        ["run_pkey", "query_pkey", "document_pkeys", "scores"],
+        select(
+            literal(run_pkey),
+            ORMQuery.pkey,
+            func.string_agg(
+                func.int4send(ORMDocument.pkey),
+                aggregate_order_by(literal(b""), *rank_order),
+            ),
+            func.string_agg(
+                func.float4send(staging.score),
+                aggregate_order_by(literal(b""), *rank_order),
+            ),
+        )
+        .select_from(RUN_STAGING_TABLE)
+        .join(
+            ORMQuery,
+            and_(
+                ORMQuery.id == staging.query_id,
+                ORMQuery.dataset_pkey == dataset_pkey,
+            ),
+        )
+        .join(
+            ORMDocument,
+            and_(
+                ORMDocument.id == staging.document_id,
+                ORMDocument.corpus_pkey == corpus_pkey,
+            ),
+        )
+        .group_by(ORMQuery.pkey),
+    )
+    cte_inserted = sql_insert.returning(
+        func.octet_length(ORMRunRanking.document_pkeys).op("/")(4).label("num_items")
+    ).cte("inserted")
+    sql = (
+        update(ORMRun)
+        .where(ORMRun.pkey == run_pkey)
+        .values(
+            num_queries=select(func.count())
+            .select_from(cte_inserted)
+            .scalar_subquery(),
+            num_items=select(
+                func.coalesce(func.sum(cte_inserted.c.num_items), 0)
+            ).scalar_subquery(),
+        )
+        .returning(ORMRun.num_items, ORMRun.num_queries)
+    )
+    num_items, num_queries = (await db_transaction.execute(sql)).one()
+    return num_items, num_queries
+
+
+async def iter_run_export(
+    engine: "AsyncEngine", run_pkey: int, dataset_pkey: int, corpus_pkey: int, tag: str
+) -> "AsyncGenerator[str, None]":
+    """Export a run in the TREC format.
+
+    The rankings are streamed from the database in batches. The document IDs of each
+    batch are resolved with a single query, so that no row per ranked document is
+    created.
+
+    :param engine: The engine whose connection pool is used.
+    :param run_pkey: The primary key of the run.
+    :param dataset_pkey: The primary key of the dataset of the run.
+    :param corpus_pkey: The primary key of the corpus of the dataset.
+    :param tag: The name of the run.
+    :yield: The lines of the run for a batch of queries at a time.
+    """
+    sql = (
+        select(ORMQuery.id, ORMRunRanking.document_pkeys, ORMRunRanking.scores)
+        .join(ORMQuery, ORMQuery.pkey == ORMRunRanking.query_pkey)
+        .where(
+            ORMRunRanking.run_pkey == run_pkey,
+            ORMQuery.dataset_pkey == dataset_pkey,
+        )
+        .order_by(ORMRunRanking.query_pkey)
+    )
+    async with engine.connect() as connection:
+        result = await connection.stream(
+            sql, execution_options={"yield_per": RUN_EXPORT_BATCH_SIZE}
+        )
+        async for partition in result.partitions():
+            rankings = [
+                (query_id, *decode_ranking(document_pkeys, scores))
+                for query_id, document_pkeys, scores in partition
+            ]
+            unique_pkeys = np.unique(
+                np.concatenate([pkeys for _, pkeys, _ in rankings])
+            )
+            sql_ids = select(ORMDocument.pkey, ORMDocument.id).where(
+                ORMDocument.corpus_pkey == corpus_pkey,
+                ORMDocument.pkey
+                == func.any(literal(unique_pkeys.tolist(), ARRAY(Integer))),
+            )
+            document_ids = dict((await connection.execute(sql_ids)).tuples().all())
+            yield "".join(
+                format_run_lines(
+                    query_id,
+                    zip(
+                        (document_ids[pkey] for pkey in pkeys.tolist()),
+                        scores.tolist(),
+                    ),
+                    tag,
+                )
+                for query_id, pkeys, scores in rankings
+            )
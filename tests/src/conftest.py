@@ -1,10 +1,12 @@
 import os
+import subprocess
 
 import pytest
 from testcontainers.compose import DockerCompose
 
 BACKEND_HOST = os.environ.get("BACKEND_HOST", "localhost")
 BACKEND_PORT = os.environ.get("BACKEND_PORT", "8203")
+BACKEND_SQLITE_PORT = os.environ.get("BACKEND_SQLITE_PORT", "8204")
 
 
 @pytest.fixture(scope="module", autouse=True)
@@ -14,8 +16,32 @@ def setup_stack(request):
     )
     stack.start()
     request.addfinalizer(stack.stop)
+    return stack
+
+
+@pytest.fixture(scope="module")
+def kill_backend(setup_stack):
+    """Return a function that kills the backend and waits until it has restarted.
+
+    The backend is killed without shutting down, like after a crash.
+    """
+
+    def kill():
+        for command in (["kill", "backend"], ["up", "--wait", "backend"]):
+            subprocess.run(
+                [*setup_stack.compose_command_property, *command],
+                cwd=setup_stack.context,
+                check=True,
+            )
+
+    return kill
 
 
 @pytest.fixture(scope="module", autouse=True)
 def api():
     yield f"http://{BACKEND_HOST}:{BACKEND_PORT}"
+
+
+@pytest.fixture(scope="module")
+def api_sqlite():
+    yield f"http://{BACKEND_HOST}:{BACKEND_SQLITE_PORT}"
@@ -1,7 +1,14 @@
 """Integration tests for adding and removing data."""
 
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
+# pulled by the test stack
+TEST_MODEL_NAME = "smollm2:135m"
+
 
 def test_corpora(api):
     num_corpora = len(requests.get(f"{api}/get_corpora").json())
@@ -17,6 +24,7 @@ def test_corpora(api):
         "language": "English",
         "num_datasets": 0,
         "num_documents": 0,
+        "text_size": 0,
     } in requests.get(f"{api}/get_corpora").json()
 
     # name exists, should fail
@@ -86,6 +94,8 @@ def test_datasets(api):
             "min_relevance": 2,
             "max_relevance": 3,
             "num_queries": 0,
+            "num_qrels": 0,
+            "relevance_histogram": {},
         }
     ]
 
@@ -155,20 +165,26 @@ def test_queries_documents(api):
         == 201
     )
 
-    requests.post(
-        f"{api}/add_documents",
-        params={"corpus_name": "test_corpus_queries_documents"},
-        json=[
-            {"id": "d1", "title": "title 1", "text": "text 1"},
-            {"id": "d2", "title": "title 2", "text": "text 2"},
-        ],
+    assert (
+        requests.post(
+            f"{api}/add_documents",
+            params={"corpus_name": "test_corpus_queries_documents"},
+            json=[
+                {"id": "d1", "title": "title 1", "text": "text 1"},
+                {"id": "d2", "title": "title 2", "text": "text 2"},
+            ],
+        ).json()["num_items"]
+        == 2
     )
 
     # document exists, should fail
-    requests.post(
-        f"{api}/add_documents",
-        params={"corpus_name": "test_corpus_queries_documents"},
-        json=[{"id": "d1", "title": "title 1", "text": "text 1"}],
+    assert (
+        requests.post(
+            f"{api}/add_documents",
+            params={"corpus_name": "test_corpus_queries_documents"},
+            json=[{"id": "d1", "title": "title 1", "text": "text 1"}],
+        ).status_code
+        == 409
     )
 
     assert (
@@ -183,16 +199,19 @@ def test_queries_documents(api):
         == 201
     )
 
-    requests.post(
-        f"{api}/add_queries",
-        params={
-            "corpus_name": "test_corpus_queries_documents",
-            "dataset_name": "test_dataset",
-        },
-        json=[
-            {"id": "q1", "text": "text 1", "description": "description 1"},
-            {"id": "q2", "text": "text 2", "description": "description 2"},
-        ],
+    assert (
+        requests.post(
+            f"{api}/add_queries",
+            params={
+                "corpus_name": "test_corpus_queries_documents",
+                "dataset_name": "test_dataset",
+            },
+            json=[
+                {"id": "q1", "text": "text 1", "description": "description 1"},
+                {"id": "q2", "text": "text 2", "description": "description 2"},
+            ],
+        ).json()["num_items"]
+        == 2
     )
 
     # query exists, should fail
@@ -228,6 +247,22 @@ def test_queries_documents(api):
             {"query_id": "q2", "document_id": "d1", "relevance": 3},
         ],
     )
+
+    # unknown query or document, should be skipped
+    result = requests.post(
+        f"{api}/add_qrels",
+        params={
+            "corpus_name": "test_corpus_queries_documents",
+            "dataset_name": "test_dataset",
+        },
+        json=[
+            {"query_id": "q1", "document_id": "d3", "relevance": 1},
+            {"query_id": "q3", "document_id": "d2", "relevance": 1},
+            {"query_id": "q2", "document_id": "d2", "relevance": 0},
+        ],
+    ).json()
+    assert result["num_items"] == 1
+    assert result["num_unresolved"] == 2
     assert (
         requests.get(
             f"{api}/get_documents",
@@ -265,6 +300,16 @@ def test_queries_documents(api):
         == 409
     )
 
+    document_params = {
+        "corpus_name": "test_corpus_queries_documents",
+        "document_id": "d1",
+    }
+    assert (
+        requests.get(f"{api}/get_document", params=document_params).json()[
+            "num_relevant_queries"
+        ]
+        == 2
+    )
     requests.delete(
         f"{api}/remove_dataset",
         params={
@@ -272,6 +317,12 @@ def test_queries_documents(api):
             "dataset_name": "test_dataset",
         },
     )
+    assert (
+        requests.get(f"{api}/get_document", params=document_params).json()[
+            "num_relevant_queries"
+        ]
+        == 0
+    )
     assert (
         requests.delete(
             f"{api}/remove_corpus",
@@ -306,3 +357,955 @@ def test_queries_documents(api):
         ).json()["total_num_items"]
         == 0
     )
+
+
+def test_ndjson(api):
+    requests.post(
+        f"{api}/create_corpus",
+        json={"name": "test_corpus_ndjson", "language": "English"},
+    )
+    requests.post(
+        f"{api}/create_dataset",
+        json={
+            "name": "test_dataset",
+            "corpus_name": "test_corpus_ndjson",
+            "relevance_threshold": 1,
+        },
+    )
+
+    def ndjson(items):
+        # send the body in chunks that split lines
+        body = "".join(json.dumps(item) + "\n" for item in items).encode()
+        for i in range(0, len(body), 7):
+            yield body[i : i + 7]
+
+    assert (
+        requests.post(
+            f"{api}/add_documents_ndjson",
+            params={"corpus_name": "test_corpus_ndjson"},
+            data=ndjson(
+                [
+                    {"id": f"d{i}", "title": f"title {i}", "text": f"text {i}"}
+                    for i in range(100)
+                ]
+            ),
+        ).json()["num_items"]
+        == 100
+    )
+    assert (
+        requests.post(
+            f"{api}/add_queries_ndjson",
+            params={
+                "corpus_name": "test_corpus_ndjson",
+                "dataset_name": "test_dataset",
+            },
+            data=ndjson(
+                [
+                    {"id": f"q{i}", "text": f"text {i}", "description": None}
+                    for i in range(10)
+                ]
+            ),
+        ).json()["num_items"]
+        == 10
+    )
+    assert (
+        requests.post(
+            f"{api}/add_qrels_ndjson",
+            params={
+                "corpus_name": "test_corpus_ndjson",
+                "dataset_name": "test_dataset",
+            },
+            data=ndjson(
+                [
+                    {"query_id": f"q{i}", "document_id": f"d{i}", "relevance": 1}
+                    for i in range(10)
+                ]
+            ),
+        ).json()["num_items"]
+        == 10
+    )
+    assert (
+        requests.get(
+            f"{api}/get_documents", params={"corpus_name": "test_corpus_ndjson"}
+        ).json()["total_num_items"]
+        == 100
+    )
+
+    # malformed line, should fail
+    assert (
+        requests.post(
+            f"{api}/add_documents_ndjson",
+            params={"corpus_name": "test_corpus_ndjson"},
+            data=ndjson([{"id": "d100", "text": 1}]),
+        ).status_code
+        == 400
+    )
+
+    # line longer than INGEST_MAX_LINE_LENGTH (1 MiB in the test setup), should fail
+    response = requests.post(
+        f"{api}/add_documents_ndjson",
+        params={"corpus_name": "test_corpus_ndjson"},
+        data=(
+            json.dumps({"id": "d100", "title": None, "text": "text"}).encode()
+            + b"\n"
+            + json.dumps({"id": "d101", "title": None, "text": "x" * 2**20}).encode()
+        ),
+    )
+    assert response.status_code == 400
+    assert response.json()["extra"]["line_number"] == 2
+
+    requests.delete(
+        f"{api}/remove_dataset",
+        params={"corpus_name": "test_corpus_ndjson", "dataset_name": "test_dataset"},
+    )
+    requests.delete(
+        f"{api}/remove_corpus", params={"corpus_name": "test_corpus_ndjson"}
+    )
+
+
+def test_defer_indexes(api):
+    for corpus_name in ("test_corpus_defer_1", "test_corpus_defer_2"):
+        requests.post(
+            f"{api}/create_corpus", json={"name": corpus_name, "language": "English"}
+        )
+    requests.post(
+        f"{api}/add_documents",
+        params={"corpus_name": "test_corpus_defer_2"},
+        json=[{"id": "d0", "title": "title 0", "text": "deferred text"}],
+    )
+    body = "".join(
+        json.dumps({"id": f"d{i}", "title": f"title {i}", "text": "deferred text"})
+        + "\n"
+        for i in range(100)
+    ).encode()
+
+    def search(corpus_name):
+        return requests.get(
+            f"{api}/search_documents",
+            params={"q": "deferred", "corpus_name": [corpus_name]},
+        ).json()["total_num_items"]
+
+    response = requests.post(
+        f"{api}/add_documents_ndjson",
+        params={"corpus_name": "test_corpus_defer_1", "defer_indexes": True},
+        data=body,
+    )
+    assert response.status_code == 201
+    assert response.json()["num_items"] == 100
+
+    # the partition has been attached again with its indexes, other corpora are
+    # unaffected
+    assert search("test_corpus_defer_1") == 100
+    assert search("test_corpus_defer_2") == 1
+    assert all(
+        status["status"] == "ready"
+        for status in requests.get(f"{api}/get_index_status").json()
+    )
+
+    # the corpus is not empty anymore, should fail
+    for corpus_name in ("test_corpus_defer_1", "test_corpus_defer_2"):
+        assert (
+            requests.post(
+                f"{api}/add_documents_ndjson",
+                params={"corpus_name": corpus_name, "defer_indexes": True},
+                data=body,
+            ).status_code
+            == 409
+        )
+    assert search("test_corpus_defer_1") == 100
+
+    # malformed line, the empty partition is attached again
+    requests.post(
+        f"{api}/create_corpus",
+        json={"name": "test_corpus_defer_3", "language": "English"},
+    )
+    assert (
+        requests.post(
+            f"{api}/add_documents_ndjson",
+            params={"corpus_name": "test_corpus_defer_3", "defer_indexes": True},
+            data=body + b'{"id": "d100", "text": 1}\n',
+        ).status_code
+        == 400
+    )
+    assert (
+        requests.post(
+            f"{api}/add_documents_ndjson",
+            params={"corpus_name": "test_corpus_defer_3"},
+            data=body,
+        ).json()["num_items"]
+        == 100
+    )
+    assert search("test_corpus_defer_3") == 100
+
+    # queries of an empty dataset
+    requests.post(
+        f"{api}/create_dataset",
+        json={
+            "name": "test_dataset",
+            "corpus_name": "test_corpus_defer_1",
+            "relevance_threshold": 1,
+        },
+    )
+    assert (
+        requests.post(
+            f"{api}/add_queries_ndjson",
+            params={
+                "corpus_name": "test_corpus_defer_1",
+                "dataset_name": "test_dataset",
+                "defer_indexes": True,
+            },
+            data="".join(
+                json.dumps({"id": f"q{i}", "text": f"text {i}", "description": None})
+                + "\n"
+                for i in range(10)
+            ).encode(),
+        ).json()["num_items"]
+        == 10
+    )
+    assert (
+        requests.get(
+            f"{api}/get_queries",
+            params={
+                "corpus_name": "test_corpus_defer_1",
+                "dataset_name": "test_dataset",
+            },
+        ).json()["total_num_items"]
+        == 10
+    )
+
+    # background jobs only defer the indexes of an empty corpus
+    requests.post(
+        f"{api}/create_corpus",
+        json={"name": "test_corpus_defer_4", "language": "English"},
+    )
+    for corpus_name, status in (
+        ("test_corpus_defer_4", "completed"),
+        ("test_corpus_defer_2", "failed"),
+    ):
+        job = requests.post(
+            f"{api}/ingest_jobs",
+            params={
+                "kind": "documents",
+                "corpus_name": corpus_name,
+                "defer_indexes": True,
+            },
+            data=body,
+        ).json()
+        for _ in range(100):
+            job = requests.get(f"{api}/ingest_jobs/{job['id']}").json()
+            if job["status"] not in ("pending", "running", "indexing"):
+                break
+            time.sleep(0.1)
+        assert job["status"] == status
+    assert search("test_corpus_defer_4") == 100
+    assert search("test_corpus_defer_2") == 1
+
+    requests.delete(
+        f"{api}/remove_dataset",
+        params={"corpus_name": "test_corpus_defer_1", "dataset_name": "test_dataset"},
+    )
+    for i in range(1, 5):
+        requests.delete(
+            f"{api}/remove_corpus", params={"corpus_name": f"test_corpus_defer_{i}"}
+        )
+
+
+def test_ingest_jobs(api):
+    requests.post(
+        f"{api}/create_corpus",
+        json={"name": "test_corpus_ingest_jobs", "language": "English"},
+    )
+    body = "".join(
+        json.dumps({"id": f"d{i}", "title": f"title {i}", "text": f"text {i}"}) + "\n"
+        for i in range(100)
+    )
+
+    response = requests.post(
+        f"{api}/ingest_jobs",
+        params={"kind": "documents", "corpus_name": "test_corpus_ingest_jobs"},
+        data=body.encode(),
+    )
+    assert response.status_code == 201
+    job = response.json()
+    assert job["num_items"] == 100
+
+    for _ in range(100):
+        job = requests.get(f"{api}/ingest_jobs/{job['id']}").json()
+        if job["status"] not in ("pending", "running"):
+            break
+        time.sleep(0.1)
+    assert job["status"] == "completed"
+    assert job["num_processed"] == 100
+    assert job["eta"] == 0
+    assert (
+        requests.get(
+            f"{api}/get_documents", params={"corpus_name": "test_corpus_ingest_jobs"}
+        ).json()["total_num_items"]
+        == 100
+    )
+
+    # dataset missing, should fail
+    assert (
+        requests.post(
+            f"{api}/ingest_jobs",
+            params={"kind": "queries", "corpus_name": "test_corpus_ingest_jobs"},
+            data=b"",
+        ).status_code
+        == 400
+    )
+    assert requests.get(f"{api}/ingest_jobs/0").status_code == 404
+
+    # only failed jobs can be retried
+    assert requests.post(f"{api}/ingest_jobs/{job['id']}/retry").status_code == 409
+    assert requests.post(f"{api}/ingest_jobs/0/retry").status_code == 404
+
+    # the corpus is not empty, so the job fails, but its items are kept
+    failed_job = requests.post(
+        f"{api}/ingest_jobs",
+        params={
+            "kind": "documents",
+            "corpus_name": "test_corpus_ingest_jobs",
+            "defer_indexes": True,
+        },
+        data=body.encode(),
+    ).json()
+    for retry in (False, True):
+        if retry:
+            response = requests.post(f"{api}/ingest_jobs/{failed_job['id']}/retry")
+            assert response.status_code == 201
+            assert response.json()["error"] is None
+        for _ in range(100):
+            failed_job = requests.get(f"{api}/ingest_jobs/{failed_job['id']}").json()
+            if failed_job["status"] not in ("pending", "running", "indexing"):
+                break
+            time.sleep(0.1)
+        assert failed_job["status"] == "failed"
+
+    # finished jobs are removed with their items, which does not evict cached responses
+    requests.get(f"{api}/get_corpora")
+    num_hits = requests.get(f"{api}/get_cache_statistics").json()["num_hits"]
+    for removed_job in (job, failed_job):
+        url = f"{api}/ingest_jobs/{removed_job['id']}"
+        assert requests.delete(url).status_code == 204
+        assert requests.get(url).status_code == 404
+        assert requests.delete(url).status_code == 404
+        assert requests.post(f"{url}/retry").status_code == 404
+    requests.get(f"{api}/get_corpora")
+    statistics = requests.get(f"{api}/get_cache_statistics").json()
+    assert statistics["num_hits"] == num_hits + 1
+
+    requests.delete(
+        f"{api}/remove_corpus", params={"corpus_name": "test_corpus_ingest_jobs"}
+    )
+
+
+def test_ingest_job_resume(api, kill_backend):
+    requests.post(
+        f"{api}/create_corpus",
+        json={"name": "test_corpus_ingest_resume", "language": "English"},
+    )
+    body = "".join(
+        json.dumps({"id": f"d{i}", "title": f"title {i}", "text": f"text {i}"}) + "\n"
+        for i in range(20000)
+    )
+    job = requests.post(
+        f"{api}/ingest_jobs",
+        params={"kind": "documents", "corpus_name": "test_corpus_ingest_resume"},
+        data=body.encode(),
+    ).json()
+
+    # kill the backend after the first checkpoint, the job is resumed from there
+    for _ in range(100):
+        job = requests.get(f"{api}/ingest_jobs/{job['id']}").json()
+        if job["num_processed"] > 0 or job["status"] != "pending":
+            break
+        time.sleep(0.05)
+    kill_backend()
+
+    for _ in range(300):
+        job = requests.get(f"{api}/ingest_jobs/{job['id']}").json()
+        if job["status"] not in ("pending", "running"):
+            break
+        time.sleep(0.1)
+    assert job["status"] == "completed"
+    assert job["num_processed"] == 20000
+
+    # each document is ingested and counted once
+    corpus = next(
+        corpus
+        for corpus in requests.get(f"{api}/get_corpora").json()
+        if corpus["name"] == "test_corpus_ingest_resume"
+    )
+    assert corpus["num_documents"] == 20000
+    assert (
+        requests.get(
+            f"{api}/get_documents", params={"corpus_name": "test_corpus_ingest_resume"}
+        ).json()["total_num_items"]
+        == 20000
+    )
+
+    requests.delete(
+        f"{api}/remove_corpus", params={"corpus_name": "test_corpus_ingest_resume"}
+    )
+
+
+def _wait_for_summary_job(api, job, statuses=("completed", "failed")):
+    for _ in range(600):
+        job = requests.get(f"{api}/summary_jobs/{job['id']}").json()
+        if job["status"] in statuses:
+            break
+        time.sleep(0.1)
+    return job
+
+
+def test_summaries(api, kill_backend):
+    requests.post(
+        f"{api}/create_corpus",
+        json={"name": "test_corpus_summaries", "language": "English"},
+    )
+    requests.post(
+        f"{api}/add_documents",
+        params={"corpus_name": "test_corpus_summaries"},
+        json=[
+            {"id": f"d{i}", "title": f"title {i}", "text": f"The number is {i}."}
+            for i in range(8)
+        ],
+    )
+    summary_params = {
+        "corpus_name": "test_corpus_summaries",
+        "document_id": "d0",
+        "model_name": TEST_MODEL_NAME,
+    }
+    response = requests.get(f"{api}/get_document_summary", params=summary_params)
+    assert response.status_code == 200
+    summary = response.text
+    assert summary
+
+    job_params = {"corpus_name": "test_corpus_summaries", "model_name": TEST_MODEL_NAME}
+    response = requests.post(f"{api}/summary_jobs", params=job_params)
+    assert response.status_code == 201
+
+    # kill the backend while the job runs, it is resumed after the restart
+    job = _wait_for_summary_job(api, response.json(), ("running", "completed"))
+    kill_backend()
+    job = _wait_for_summary_job(api, job)
+    assert job["status"] == "completed"
+    assert job["num_items"] == 8
+    assert job["num_processed"] == 8
+    assert job["num_failed"] == 0
+
+    # the stored summary is served (the response cache was lost with the restart)
+    assert (
+        requests.get(f"{api}/get_document_summary", params=summary_params).text
+        == summary
+    )
+
+    # all documents have been summarized, so another job has nothing to do
+    job = requests.post(f"{api}/summary_jobs", params=job_params).json()
+    job = _wait_for_summary_job(api, job)
+    assert job["status"] == "completed"
+    assert job["num_items"] == job["num_processed"] == 8
+
+    requests.delete(
+        f"{api}/remove_corpus", params={"corpus_name": "test_corpus_summaries"}
+    )
+
+
+def test_cache_invalidation(api):
+    for corpus_name in ("test_corpus_cache_1", "test_corpus_cache_2"):
+        requests.post(
+            f"{api}/create_corpus", json={"name": corpus_name, "language": "English"}
+        )
+        # cache the empty responses
+        assert (
+            requests.get(
+                f"{api}/get_documents", params={"corpus_name": corpus_name}
+            ).json()["total_num_items"]
+            == 0
+        )
+    requests.get(f"{api}/get_corpora")
+
+    requests.post(
+        f"{api}/add_documents",
+        params={"corpus_name": "test_corpus_cache_1"},
+        json=[{"id": "d1", "title": "title", "text": "text"}],
+    )
+    for corpus_name, num_documents in (
+        ("test_corpus_cache_1", 1),
+        ("test_corpus_cache_2", 0),
+    ):
+        assert (
+            requests.get(
+                f"{api}/get_documents", params={"corpus_name": corpus_name}
+            ).json()["total_num_items"]
+            == num_documents
+        )
+    assert {
+        "name": "test_corpus_cache_1",
+        "language": "English",
+        "num_datasets": 0,
+        "num_documents": 1,
+        "text_size": 4,
+    } in requests.get(f"{api}/get_corpora").json()
+
+    for corpus_name in ("test_corpus_cache_1", "test_corpus_cache_2"):
+        requests.delete(f"{api}/remove_corpus", params={"corpus_name": corpus_name})
+
+
+def test_sqlite_cache(api_sqlite):
+    for corpus_name in ("test_corpus_sqlite_1", "test_corpus_sqlite_2"):
+        requests.post(
+            f"{api_sqlite}/create_corpus",
+            json={"name": corpus_name, "language": "English"},
+        )
+        requests.post(
+            f"{api_sqlite}/add_documents",
+            params={"corpus_name": corpus_name},
+            json=[{"id": "d1", "title": "title 1", "text": "text 1"}],
+        )
+
+    def get_documents(corpus_name, offset=0):
+        requests.get(
+            f"{api_sqlite}/get_documents",
+            params={"corpus_name": corpus_name, "offset": offset},
+        )
+
+    def get_statistics():
+        return requests.get(f"{api_sqlite}/get_cache_statistics").json()
+
+    # the first request misses, the second one hits
+    statistics = get_statistics()
+    for corpus_name in ("test_corpus_sqlite_1", "test_corpus_sqlite_2"):
+        get_documents(corpus_name)
+        get_documents(corpus_name)
+    new_statistics = get_statistics()
+    assert new_statistics["num_misses"] - statistics["num_misses"] == 2
+    assert new_statistics["num_hits"] - statistics["num_hits"] == 2
+    assert new_statistics["num_entries"] > 0
+
+    # only the responses of the modified corpus are evicted
+    requests.post(
+        f"{api_sqlite}/add_documents",
+        params={"corpus_name": "test_corpus_sqlite_1"},
+        json=[{"id": "d2", "title": "title 2", "text": "text 2"}],
+    )
+    statistics = get_statistics()
+    get_documents("test_corpus_sqlite_1")
+    get_documents("test_corpus_sqlite_2")
+    new_statistics = get_statistics()
+    assert new_statistics["num_misses"] - statistics["num_misses"] == 1
+    assert new_statistics["num_hits"] - statistics["num_hits"] == 1
+
+    # exceed the size limit, the least recently used responses are evicted
+    for offset in range(1, 200):
+        get_documents("test_corpus_sqlite_2", offset)
+        # keep the first response recently used
+        get_documents("test_corpus_sqlite_2")
+    statistics = get_statistics()
+    assert statistics["num_evictions"] > 0
+    assert statistics["size"] <= statistics["max_size"]
+    get_documents("test_corpus_sqlite_2")
+    get_documents("test_corpus_sqlite_1")
+    new_statistics = get_statistics()
+    assert new_statistics["num_hits"] - statistics["num_hits"] == 1
+    assert new_statistics["num_misses"] - statistics["num_misses"] == 1
+
+    for corpus_name in ("test_corpus_sqlite_1", "test_corpus_sqlite_2"):
+        requests.delete(
+            f"{api_sqlite}/remove_corpus", params={"corpus_name": corpus_name}
+        )
+
+
+def test_search_ranking(api):
+    # more hits than the cached ranking holds (SEARCH_RANKING_SIZE, 1000 by default)
+    requests.post(
+        f"{api}/create_corpus",
+        json={"name": "test_corpus_ranking", "language": "English"},
+    )
+    requests.post(
+        f"{api}/add_documents",
+        params={"corpus_name": "test_corpus_ranking"},
+        json=[
+            {
+                "id": f"d{i}",
+                "title": f"title {i}",
+                "text": "needle " + "hay " * (i % 50),
+            }
+            for i in range(1100)
+        ],
+    )
+
+    def search(offset, num_results, **params):
+        return requests.get(
+            f"{api}/search_documents",
+            params={
+                "q": "needle",
+                "corpus_name": ["test_corpus_ranking"],
+                "offset": offset,
+                "num_results": num_results,
+                **params,
+            },
+        ).json()
+
+    def sort_ties(items):
+        return sorted(items, key=lambda item: (-item["score"], item["id"]))
+
+    # the ranking is computed without counting, the count is added when needed
+    page = search(0, 10, count_mode="none")
+    assert page["total_num_items"] is None
+    assert not page["is_exact"]
+    page = search(0, 10, count_mode="capped")
+    assert page["total_num_items"] == 1100
+    assert page["is_exact"]
+
+    # pages within the ranking are the same as pages computed without it
+    pages = [search(offset, 100) for offset in range(0, 1000, 100)]
+    uncached = search(0, 1001)
+    assert len(uncached["items"]) == 1001
+    assert sort_ties([item for page in pages for item in page["items"]]) == sort_ties(
+        uncached["items"][:1000]
+    )
+
+    # the ranking includes the number of all hits, not only of its own
+    assert all(page["total_num_items"] == 1100 for page in pages)
+    assert uncached["total_num_items"] == 1100
+    assert search(0, 10, count_mode="none")["total_num_items"] is None
+
+    # adding documents evicts the ranking, a page that has not been requested before
+    # is computed from a new one
+    requests.post(
+        f"{api}/add_documents",
+        params={"corpus_name": "test_corpus_ranking"},
+        json=[{"id": "d1100", "title": "title 1100", "text": "needle"}],
+    )
+    assert search(10, 10)["total_num_items"] == 1101
+
+    requests.delete(
+        f"{api}/remove_corpus", params={"corpus_name": "test_corpus_ranking"}
+    )
+
+
+def test_coalescing(api):
+    requests.post(
+        f"{api}/create_corpus",
+        json={"name": "test_corpus_coalescing", "language": "English"},
+    )
+    requests.post(
+        f"{api}/add_documents",
+        params={"corpus_name": "test_corpus_coalescing"},
+        json=[
+            {"id": f"d{i}", "title": f"title {i}", "text": f"text {i}"}
+            for i in range(100)
+        ],
+    )
+
+    def get_documents(_):
+        return requests.get(
+            f"{api}/get_documents",
+            params={"corpus_name": "test_corpus_coalescing", "num_results": 100},
+        )
+
+    def get_statistics():
+        return requests.get(f"{api}/get_cache_statistics").json()
+
+    # concurrent requests wait for the first one instead of computing the response,
+    # so all but the first one are served from the cache
+    statistics = get_statistics()
+    with ThreadPoolExecutor(max_workers=20) as executor:
+        responses = list(executor.map(get_documents, range(20)))
+    new_statistics = get_statistics()
+    assert all(response.status_code == 200 for response in responses)
+    assert all(response.json() == responses[0].json() for response in responses)
+    assert responses[0].json()["total_num_items"] == 100
+    assert new_statistics["num_hits"] - statistics["num_hits"] == 19
+
+    requests.delete(
+        f"{api}/remove_corpus", params={"corpus_name": "test_corpus_coalescing"}
+    )
+
+
+def test_stale_while_revalidate(api, api_sqlite):
+    # changes through the first backend do not evict the responses cached by the
+    # second one, which expire after two seconds
+    def create_corpus(text):
+        requests.post(
+            f"{api}/create_corpus",
+            json={"name": "test_corpus_stale", "language": "English"},
+        )
+        requests.post(
+            f"{api}/add_documents",
+            params={"corpus_name": "test_corpus_stale"},
+            json=[{"id": "d0", "title": "title 0", "text": text}],
+        )
+
+    def remove_corpus():
+        requests.delete(
+            f"{api}/remove_corpus", params={"corpus_name": "test_corpus_stale"}
+        )
+
+    def get_text():
+        response = requests.get(
+            f"{api_sqlite}/get_document",
+            params={"corpus_name": "test_corpus_stale", "document_id": "d0"},
+        )
+        return response.status_code, response.json().get("text")
+
+    def wait_for_text(text):
+        for _ in range(50):
+            result = get_text()
+            if result == (200, text):
+                break
+            time.sleep(0.1)
+        return result
+
+    create_corpus("text 0")
+    assert get_text() == (200, "text 0")
+
+    # a failed refresh (the document no longer exists) keeps the expired response
+    remove_corpus()
+    assert get_text() == (200, "text 0")
+    time.sleep(2.5)
+    assert get_text() == (200, "text 0")
+    time.sleep(0.5)
+    assert get_text() == (200, "text 0")
+
+    # the expired response is served once more, while it is refreshed
+    create_corpus("text 1")
+    assert get_text() == (200, "text 0")
+    assert wait_for_text("text 1") == (200, "text 1")
+
+    remove_corpus()
+
+
+def test_etag(api):
+    response = requests.get(f"{api}/get_corpora")
+    etag = response.headers["etag"]
+    assert (
+        requests.get(f"{api}/get_corpora", headers={"If-None-Match": etag}).status_code
+        == 304
+    )
+
+    requests.post(
+        f"{api}/create_corpus", json={"name": "test_corpus_etag", "language": "English"}
+    )
+    response = requests.get(f"{api}/get_corpora", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+    # streamed responses have no ETag and are not answered with 304
+    response = requests.get(
+        f"{api}/get_document_summary",
+        params={
+            "corpus_name": "test_corpus_etag",
+            "document_id": "d1",
+            "model_name": TEST_MODEL_NAME,
+        },
+        headers={"If-None-Match": "*"},
+    )
+    assert response.status_code != 304
+    assert "etag" not in response.headers
+
+    requests.delete(f"{api}/remove_corpus", params={"corpus_name": "test_corpus_etag"})
+
+
+def test_runs(api):
+    requests.post(
+        f"{api}/create_corpus",
+        json={"name": "test_corpus_runs", "language": "English"},
+    )
+    requests.post(
+        f"{api}/create_dataset",
+        json={
+            "name": "test_dataset",
+            "corpus_name": "test_corpus_runs",
+            "relevance_threshold": 1,
+        },
+    )
+    requests.post(
+        f"{api}/add_documents_ndjson",
+        params={"corpus_name": "test_corpus_runs"},
+        data="".join(
+            json.dumps({"id": f"d{i}", "title": None, "text": f"text {i}"}) + "\n"
+            for i in range(10)
+        ).encode(),
+    )
+    requests.post(
+        f"{api}/add_queries_ndjson",
+        params={"corpus_name": "test_corpus_runs", "dataset_name": "test_dataset"},
+        data="".join(
+            json.dumps({"id": f"q{i}", "text": f"text {i}", "description": None}) + "\n"
+            for i in range(2)
+        ).encode(),
+    )
+    requests.post(
+        f"{api}/add_qrels_ndjson",
+        params={"corpus_name": "test_corpus_runs", "dataset_name": "test_dataset"},
+        data="".join(
+            json.dumps(
+                {"query_id": query_id, "document_id": document_id, "relevance": 1}
+            )
+            + "\n"
+            for query_id, document_id in [("q0", "d3"), ("q0", "d2"), ("q1", "d4")]
+        ).encode(),
+    )
+    params = {
+        "corpus_name": "test_corpus_runs",
+        "dataset_name": "test_dataset",
+        "run_name": "test_run",
+    }
+    run = "\n".join(
+        [
+            "q0 Q0 d1 2 1.5 test",
+            "q0 Q0 d3 1 2.5 test",
+            "q0 Q0 d2 3 0.5 test",
+            "q1 Q0 d4 1 1.0 test",
+            # unknown query and document, skipped
+            "q2 Q0 d1 1 1.0 test",
+            "q1 Q0 d10 2 0.5 test",
+        ]
+    )
+
+    result = requests.post(f"{api}/add_run", params=params, data=run.encode()).json()
+    assert result["num_items"] == 4
+    assert result["num_queries"] == 2
+    assert result["num_unresolved"] == 2
+    assert requests.get(
+        f"{api}/get_runs",
+        params={"corpus_name": "test_corpus_runs", "dataset_name": "test_dataset"},
+    ).json() == [
+        {
+            "name": "test_run",
+            "corpus_name": "test_corpus_runs",
+            "dataset_name": "test_dataset",
+            "num_queries": 2,
+            "num_items": 4,
+        }
+    ]
+
+    # documents are ranked by their scores
+    assert requests.get(
+        f"{api}/get_run_ranking", params={**params, "query_id": "q0"}
+    ).json() == {
+        "query_id": "q0",
+        "items": [
+            {"id": "d3", "score": 2.5},
+            {"id": "d1", "score": 1.5},
+            {"id": "d2", "score": 0.5},
+        ],
+    }
+    assert requests.get(
+        f"{api}/get_run_ranking",
+        params={**params, "query_id": "q0", "num_results": 1},
+    ).json()["items"] == [{"id": "d3", "score": 2.5}]
+    assert (
+        requests.get(
+            f"{api}/get_run_ranking", params={**params, "query_id": "q2"}
+        ).status_code
+        == 404
+    )
+
+    assert sorted(
+        requests.get(f"{api}/export_run", params=params).text.splitlines()
+    ) == [
+        "q0 Q0 d1 2 1.5 test_run",
+        "q0 Q0 d2 3 0.5 test_run",
+        "q0 Q0 d3 1 2.5 test_run",
+        "q1 Q0 d4 1 1.0 test_run",
+    ]
+
+    requests.post(
+        f"{api}/add_run",
+        params={**params, "run_name": "test_run_2"},
+        data=b"q0 Q0 d1 1 2.0 test\nq0 Q0 d3 2 1.0 test\nq1 Q0 d5 1 2.0 test\n"
+        b"q1 Q0 d4 2 1.0 test\n",
+    )
+    compare_params = {
+        "corpus_name": "test_corpus_runs",
+        "dataset_name": "test_dataset",
+        "run_names": ["test_run", "test_run_2"],
+        "metric": "mrr",
+        "num_permutations": 100,
+    }
+    result = requests.get(f"{api}/compare_runs", params=compare_params).json()
+    assert result["num_queries"] == 2
+    assert result["metrics"] == {"test_run": 1.0, "test_run_2": 0.5}
+    assert result["query_metrics"]["q0"] == {"test_run": 1.0, "test_run_2": 0.5}
+    [comparison] = result["comparisons"]
+    assert comparison["run_name"] == "test_run_2"
+    assert comparison["mean_delta"] == -0.5
+    assert (comparison["num_wins"], comparison["num_ties"]) == (0, 0)
+    assert comparison["num_losses"] == 2
+    # the differences are constant
+    assert comparison["t_statistic"] is None
+    assert 0 < comparison["randomization_p_value"] <= 1
+    assert 0 < comparison["bootstrap_p_value"] <= 1
+    # q0 ranks the common documents in reverse order, q1 has only one
+    assert comparison["kendall_tau"] == -1.0
+
+    # identical rankings that are shorter than the cutoff overlap completely
+    requests.post(
+        f"{api}/add_run",
+        params={**params, "run_name": "test_run_copy"},
+        data=run.encode(),
+    )
+    [comparison] = requests.get(
+        f"{api}/compare_runs",
+        params={**compare_params, "run_names": ["test_run", "test_run_copy"]},
+    ).json()["comparisons"]
+    assert abs(comparison["rank_biased_overlap"] - 1.0) < 1e-9
+
+    # single run, should fail
+    assert (
+        requests.get(
+            f"{api}/compare_runs", params={**compare_params, "run_names": ["test_run"]}
+        ).status_code
+        == 400
+    )
+
+    # cutoff or number of permutations too large, should fail
+    for extra_params in ({"cutoff": 1_000_000}, {"num_permutations": 100_000_000}):
+        assert (
+            requests.get(
+                f"{api}/compare_runs", params={**compare_params, **extra_params}
+            ).status_code
+            == 400
+        )
+
+    # run does not exist, should fail
+    assert (
+        requests.get(
+            f"{api}/compare_runs",
+            params={**compare_params, "run_names": ["test_run", "test_run_3"]},
+        ).status_code
+        == 404
+    )
+
+    # name exists, should fail
+    assert (
+        requests.post(f"{api}/add_run", params=params, data=run.encode()).status_code
+        == 409
+    )
+
+    # invalid line, should fail
+    assert (
+        requests.post(
+            f"{api}/add_run",
+            params={**params, "run_name": "test_run_invalid"},
+            data=b"q0 Q0 d1 1",
+        ).status_code
+        == 400
+    )
+
+    # line longer than INGEST_MAX_LINE_LENGTH (1 MiB in the test setup), should fail
+    response = requests.post(
+        f"{api}/add_run",
+        params={**params, "run_name": "test_run_invalid"},
+        data=b"q0 Q0 d1 1 1.0 test\nq0 Q0 " + b"d" * 2**20 + b" 2 0.5 test\n",
+    )
+    assert response.status_code == 400
+    assert response.json()["extra"]["line_number"] == 2
+
+    assert requests.delete(f"{api}/remove_run", params=params).status_code == 204
+    assert requests.get(f"{api}/export_run", params=params).status_code == 404
+
+    requests.delete(f"{api}/remove_corpus", params={"corpus_name": "test_corpus_runs"})
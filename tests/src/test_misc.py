@@ -1,5 +1,8 @@
 """Integration tests for miscellaneous functionality."""
 
+import json
+import time
+
 import requests
 
 
@@ -17,3 +20,68 @@ def test_available_options(api):
 
 def test_corpora(api):
     assert requests.get(f"{api}/get_corpora").json() == []
+
+
+def test_index_status(api):
+    statuses = requests.get(f"{api}/get_index_status").json()
+    assert {status["name"] for status in statuses} >= {
+        "ix_documents_search",
+        "ix_queries_search",
+    }
+    assert all(status["status"] == "ready" for status in statuses)
+    assert all(status["partition_name"] is None for status in statuses)
+
+
+def test_index_status_deferred(api):
+    requests.post(
+        f"{api}/create_corpus",
+        json={"name": "test_corpus_index_status", "language": "English"},
+    )
+    body = "".join(
+        json.dumps({"id": f"d{i}", "title": f"title {i}", "text": f"text {i}"}) + "\n"
+        for i in range(20000)
+    )
+    job = requests.post(
+        f"{api}/ingest_jobs",
+        params={
+            "kind": "documents",
+            "corpus_name": "test_corpus_index_status",
+            "defer_indexes": True,
+        },
+        data=body.encode(),
+    ).json()
+
+    # the detached partition is listed with its missing indexes while the job runs
+    detached_statuses = set()
+    for _ in range(600):
+        job = requests.get(f"{api}/ingest_jobs/{job['id']}").json()
+        if job["status"] not in ("pending", "running", "indexing"):
+            break
+        for status in requests.get(f"{api}/get_index_status").json():
+            if status["partition_name"] is not None:
+                assert status["table_name"] == "documents"
+                assert status["partition_name"].startswith("documents_")
+                assert status["size"] == 0
+                detached_statuses.add(status["status"])
+        time.sleep(0.05)
+    assert job["status"] == "completed"
+    assert detached_statuses
+    assert detached_statuses <= {"missing", "building"}
+
+    # the partition has been attached again with its indexes
+    statuses = requests.get(f"{api}/get_index_status").json()
+    assert all(status["status"] == "ready" for status in statuses)
+    assert all(status["partition_name"] is None for status in statuses)
+
+    requests.delete(
+        f"{api}/remove_corpus", params={"corpus_name": "test_corpus_index_status"}
+    )
+
+
+def test_cache_statistics(api):
+    requests.get(f"{api}/get_corpora")
+    statistics = requests.get(f"{api}/get_cache_statistics").json()
+    requests.get(f"{api}/get_corpora")
+    new_statistics = requests.get(f"{api}/get_cache_statistics").json()
+    assert new_statistics["num_hits"] == statistics["num_hits"] + 1
+    assert 0 < new_statistics["size"] <= new_statistics["max_size"]
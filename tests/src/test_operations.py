@@ -133,12 +133,14 @@ def test_get_corpora(api):
                 "language": "English",
                 "num_datasets": 2,
                 "num_documents": 4,
+                "text_size": 40,
             },
             {
                 "name": "c2",
                 "language": "English",
                 "num_datasets": 1,
                 "num_documents": 4,
+                "text_size": 40,
             },
         ],
     )
@@ -155,6 +157,8 @@ def test_get_datasets(api):
                 "min_relevance": 0,
                 "max_relevance": 3,
                 "num_queries": 4,
+                "num_qrels": 6,
+                "relevance_histogram": {"0": 1, "1": 2, "2": 1, "3": 2},
             },
             {
                 "name": "c1-ds2",
@@ -163,6 +167,8 @@ def test_get_datasets(api):
                 "min_relevance": 0,
                 "max_relevance": 3,
                 "num_queries": 4,
+                "num_qrels": 7,
+                "relevance_histogram": {"0": 2, "1": 2, "2": 1, "3": 2},
             },
         ],
     )
@@ -177,6 +183,8 @@ def test_get_datasets(api):
                 "min_relevance": 0,
                 "max_relevance": 2,
                 "num_queries": 2,
+                "num_qrels": 2,
+                "relevance_histogram": {"2": 2},
             },
         ],
     )
@@ -713,6 +721,77 @@ def test_get_qrels(api):
     )
 
 
+@pytest.mark.parametrize(
+    ("endpoint", "params"),
+    [
+        ("get_documents", {"corpus_name": "c1"}),
+        ("get_documents", {"corpus_name": "c1", "order_by": "relevant_queries"}),
+        (
+            "get_documents",
+            {"corpus_name": "c1", "order_by": "length", "order_by_desc": False},
+        ),
+        ("get_queries", {"corpus_name": "c1", "dataset_name": "c1-ds1"}),
+        ("get_qrels", {"corpus_name": "c1", "order_by": "relevance"}),
+    ],
+)
+def test_cursor_pagination(api, endpoint, params):
+    expected = requests.get(
+        f"{api}/{endpoint}", params={**params, "num_results": 100}
+    ).json()["items"]
+
+    items, cursor = [], None
+    while True:
+        page = requests.get(
+            f"{api}/{endpoint}",
+            params={**params, "num_results": 2}
+            | ({} if cursor is None else {"cursor": cursor}),
+        ).json()
+        items.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert items == expected
+
+    # invalid cursor, should fail
+    assert (
+        requests.get(
+            f"{api}/{endpoint}", params={**params, "cursor": "invalid"}
+        ).status_code
+        == 400
+    )
+
+
+@pytest.mark.parametrize(
+    ("endpoint", "params"),
+    [
+        ("get_documents", {"corpus_name": "c1"}),
+        ("get_queries", {"corpus_name": "c1", "dataset_name": "c1-ds1"}),
+        ("get_qrels", {"corpus_name": "c1"}),
+        ("search_documents", {"q": "abc def"}),
+    ],
+)
+def test_count_mode(api, endpoint, params):
+    exact = requests.get(f"{api}/{endpoint}", params=params).json()
+    assert exact["total_num_items"] > 0
+    assert exact["is_exact"]
+
+    # below the limit, these are exact as well
+    for count_mode in ("estimate", "capped"):
+        page = requests.get(
+            f"{api}/{endpoint}", params={**params, "count_mode": count_mode}
+        ).json()
+        assert page["total_num_items"] == exact["total_num_items"]
+        assert page["is_exact"]
+
+    # the same page, without the total number of items
+    page = requests.get(
+        f"{api}/{endpoint}", params={**params, "count_mode": "none"}
+    ).json()
+    assert page["total_num_items"] is None
+    assert not page["is_exact"]
+    assert page["items"] == exact["items"]
+
+
 def test_get_answer(api):
     base_params = {"model_name": "test-model", "q": "test question"}
 
@@ -779,6 +858,36 @@ def test_get_document_summary(api):
     )
 
 
+def test_summary_jobs(api):
+    base_params = {"model_name": "missing-model", "corpus_name": "c1"}
+
+    # corpus or dataset does not exist
+    for params in (
+        {**base_params, "corpus_name": "missing-corpus"},
+        {**base_params, "dataset_name": "missing-dataset"},
+    ):
+        assert requests.post(f"{api}/summary_jobs", params=params).status_code == 404
+
+    # invalid concurrency
+    assert (
+        requests.post(
+            f"{api}/summary_jobs", params={**base_params, "concurrency": 0}
+        ).status_code
+        == 400
+    )
+
+    # requested model does not exist
+    assert (
+        requests.post(
+            f"{api}/summary_jobs", params={**base_params, "dataset_name": "c1-ds1"}
+        ).status_code
+        == 503
+    )
+
+    assert requests.get(f"{api}/summary_jobs").status_code == 200
+    assert requests.get(f"{api}/summary_jobs/0").status_code == 404
+
+
 def test_search_documents(api):
     results_all_corpora = requests.get(
         f"{api}/search_documents",
@@ -850,3 +959,111 @@ def test_search_documents(api):
         ],
         ignore_keys={"score", "snippet"},
     )
+
+
+def test_retrieve_run(api):
+    run = requests.post(
+        f"{api}/retrieve_run",
+        params={"corpus_name": "c1", "dataset_name": "c1-ds1", "num_results": 2},
+    ).text
+    lines = [line.split() for line in run.splitlines()]
+    assert sorted(line[0] for line in lines) == [
+        "c1-ds1-q1",
+        "c1-ds1-q1",
+        "c1-ds1-q2",
+        "c1-ds1-q2",
+        "c1-ds1-q3",
+        "c1-ds1-q3",
+        "c1-ds1-q4",
+        "c1-ds1-q4",
+    ]
+    for query_id, q0, document_id, rank, score, tag in lines:
+        assert q0 == "Q0"
+        assert document_id.startswith("c1-d")
+        assert rank in ("1", "2")
+        assert float(score) > 0
+        assert tag == "bm25"
+
+    # queries in the request body
+    run = requests.post(
+        f"{api}/retrieve_run",
+        params={"corpus_name": "c1", "num_results": 2, "tag": "test"},
+        json=[{"id": "q", "text": "abc def"}],
+    ).text
+    assert [line.split()[:4] for line in run.splitlines()] == [
+        ["q", "Q0", "c1-d1", "1"],
+        ["q", "Q0", "c1-d2", "2"],
+    ]
+
+    # neither or both of dataset and queries, should fail
+    assert (
+        requests.post(f"{api}/retrieve_run", params={"corpus_name": "c1"}).status_code
+        == 400
+    )
+    assert (
+        requests.post(
+            f"{api}/retrieve_run",
+            params={"corpus_name": "c1", "dataset_name": "c1-ds1"},
+            json=[{"id": "q", "text": "abc def"}],
+        ).status_code
+        == 400
+    )
+
+    # dataset does not exist, should fail
+    assert (
+        requests.post(
+            f"{api}/retrieve_run",
+            params={"corpus_name": "c1", "dataset_name": "c1-ds3"},
+        ).status_code
+        == 404
+    )
+
+
+def test_evaluate_run(api):
+    run = "\n".join(
+        [
+            "c1-ds1-q1 Q0 c1-d4 1 3.0 test",
+            "c1-ds1-q1 Q0 c1-d2 3 1.0 test",
+            "c1-ds1-q1 Q0 c1-d3 2 2.0 test",
+            # unknown queries are ignored
+            "c1-ds1-q5 Q0 c1-d1 1 1.0 test",
+        ]
+    )
+    result = requests.post(
+        f"{api}/evaluate_run",
+        params={"corpus_name": "c1", "dataset_name": "c1-ds1", "cutoff": 2},
+        data=run,
+    ).json()
+
+    # q1 is ranked perfectly, q2 is missing from the run
+    assert result["cutoff"] == 2
+    assert result["num_queries"] == 2
+    assert result["query_metrics"]["c1-ds1-q1"] == pytest.approx(
+        {"ndcg": 1.0, "map": 1.0, "mrr": 1.0, "precision": 1.0, "recall": 2 / 3}
+    )
+    assert result["query_metrics"]["c1-ds1-q2"] == pytest.approx(
+        {"ndcg": 0.0, "map": 0.0, "mrr": 0.0, "precision": 0.0, "recall": 0.0}
+    )
+    assert result["metrics"] == pytest.approx(
+        {"ndcg": 0.5, "map": 0.5, "mrr": 0.5, "precision": 0.5, "recall": 1 / 3}
+    )
+
+    # invalid line, should fail
+    assert (
+        requests.post(
+            f"{api}/evaluate_run",
+            params={"corpus_name": "c1", "dataset_name": "c1-ds1"},
+            data="c1-ds1-q1 Q0 c1-d4 1",
+        ).status_code
+        == 400
+    )
+
+    # dataset does not exist, should fail
+    assert (
+        requests.post(
+            f"{api}/evaluate_run",
+            params={"corpus_name": "c1", "dataset_name": "c1-ds3"},
+            data=run,
+        ).status_code
+        == 404
+    )